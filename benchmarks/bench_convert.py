@@ -0,0 +1,71 @@
+"""
+转换分派的微基准：比较每个块按 getattr 查找转换函数（旧）与查转换表（新）的开销
+
+    python benchmarks/bench_convert.py [-n 次数]
+
+使用 tests/test_convert 中的 test.note、test.json 作为输入
+"""
+
+import argparse
+import json
+import timeit
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from youdaonote_pull.convert import JsonConvert, XmlElementConvert
+
+FIXTURES = Path(__file__).parent.parent / "tests" / "test_convert"
+
+
+def xml_getattr_dispatch(elements):
+    for element in elements:
+        name = element.tag.replace("{http://note.youdao.com}", "").replace("-", "_")
+        getattr(XmlElementConvert, "convert_{}_func".format(name), None)
+
+
+def xml_table_dispatch(elements):
+    for element in elements:
+        XmlElementConvert.get_handler(element.tag)
+
+
+def json_getattr_dispatch(contents):
+    for content in contents:
+        type = content.get("6")
+        if type:
+            convert_func = getattr(JsonConvert(), "convert_{}_func".format(type), None)
+            if not convert_func:
+                JsonConvert().convert_text_func
+        else:
+            JsonConvert().convert_text_func
+
+
+def json_table_dispatch(contents):
+    converter = JsonConvert()
+    for content in contents:
+        converter._handlers.get(content.get("6"), JsonConvert.convert_text_func)
+
+
+def bench(label: str, func, blocks: list, number: int):
+    seconds = min(timeit.repeat(lambda: func(blocks), number=number, repeat=5))
+    per_block = seconds / number / len(blocks) * 1e9
+    print(f"{label:<24}{per_block:>10.1f} ns/块")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", "--number", type=int, default=2000, help="每轮次数")
+    args = parser.parse_args()
+
+    elements = list(ET.parse(FIXTURES / "test.note").getroot()[1])
+    with open(FIXTURES / "test.json", encoding="utf-8") as fp:
+        contents = json.load(fp)["5"]
+
+    print(f"XML {len(elements)} 块，JSON {len(contents)} 块")
+    bench("xml getattr (before)", xml_getattr_dispatch, elements, args.number)
+    bench("xml registry (after)", xml_table_dispatch, elements, args.number)
+    bench("json getattr (before)", json_getattr_dispatch, contents, args.number)
+    bench("json registry (after)", json_table_dispatch, contents, args.number)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+端到端拉取基准测试：在本地模拟的有道云笔记服务上运行 YoudaoNotePull.pull_recursively
+
+    python benchmarks/bench_pull.py [--depth 2] [--dirs 3] [--notes 10] [--latency 0.01] [-j 4]
+
+依次测量首次全量导出、部分笔记更新后的增量导出、无更新时的增量导出，
+报告耗时、笔记/s 和每篇笔记的请求数。在临时目录中运行，不访问真实服务
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+from fake_server import FakeYoudaoServer, TreeSpec
+from synthetic import NoteSpec
+
+
+def setup(base: str, work_dir: str):
+    """在 work_dir 中准备 cookies 并将接口地址指向模拟服务，返回 core 模块"""
+    os.chdir(work_dir)
+    os.makedirs("config", exist_ok=True)
+    with open(os.path.join("config", "cookies.txt"), "w") as fp:
+        fp.write("YNOTE_CSTK=bench; YNOTE_SESS=bench")
+
+    # 首次使用 CONFIG 时读取当前目录下的配置，YoudaoNotePull 创建时读取 cookies
+    from youdaonote_pull import api
+
+    for name in ("ROOT_ID_URL", "DIR_MES_URL", "FILE_URL"):
+        url = getattr(api, name).replace("https://note.youdao.com", base)
+        setattr(api, name, url)
+
+    from youdaonote_pull import core
+
+    return core
+
+
+def run_once(core, server: FakeYoudaoServer, label: str, args) -> dict:
+    server.requests.clear()
+    core.METRICS.reset()
+    pull_class = core.AsyncYoudaoNotePull if args.use_async else core.YoudaoNotePull
+    start = time.perf_counter()
+    pull_class(full=args.full).pull_recursively()
+    seconds = time.perf_counter() - start
+    requests = dict(server.requests)
+    total = sum(v for k, v in requests.items() if k != "error")
+    return {
+        "label": label,
+        "seconds": seconds,
+        "notes_per_s": server.note_count / seconds,
+        "requests": total,
+        "requests_per_note": total / server.note_count,
+        "detail": requests,
+        "metrics": core.METRICS.summary(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--depth", type=int, default=2, help="目录层数")
+    parser.add_argument("--dirs", type=int, default=3, help="每个目录下的子目录数")
+    parser.add_argument("--notes", type=int, default=10, help="每个目录下的笔记数")
+    parser.add_argument("--images", type=int, default=2, help="每篇笔记的图片数")
+    parser.add_argument("--scale", type=float, default=1, help="笔记内容大小倍数")
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="每个请求的延迟（秒）"
+    )
+    parser.add_argument("--error-rate", type=float, default=0.0, help="注入错误的比例")
+    parser.add_argument("--changed", type=int, default=5, help="增量导出前更新的笔记数")
+    parser.add_argument("-j", "--max-workers", type=int, default=1, help="并发数")
+    parser.add_argument("--image-workers", type=int, default=4)
+    parser.add_argument("--convert-processes", type=int, default=0)
+    parser.add_argument("--skip-unchanged-dirs", action="store_true")
+    parser.add_argument("--async", dest="use_async", action="store_true")
+    parser.add_argument("--full", action="store_true", help="增量导出时忽略同步清单")
+    parser.add_argument(
+        "--progress", action="store_true", help="先扫描目录再下载，并统计进度"
+    )
+    parser.add_argument(
+        "--metrics", action="store_true", help="输出每次导出的各阶段耗时等运行指标"
+    )
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    note = NoteSpec(paragraphs=50, lists=20, tables=2, code_blocks=2).scaled(args.scale)
+    note.images = args.images
+    spec = TreeSpec(
+        depth=args.depth,
+        dirs_per_dir=args.dirs,
+        notes_per_dir=args.notes,
+        note=note,
+        latency=args.latency,
+        error_rate=args.error_rate,
+    )
+    server = FakeYoudaoServer(spec).start()
+    cwd = os.getcwd()
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            core = setup(server.base, work_dir)
+            core.CONFIG.local_dir = os.path.join(work_dir, "notes")
+            core.CONFIG.max_workers = args.max_workers
+            core.CONFIG.image_workers = args.image_workers
+            core.CONFIG.convert_processes = args.convert_processes
+            core.CONFIG.skip_unchanged_dirs = args.skip_unchanged_dirs
+            core.CONFIG.progress = args.progress
+
+            results = [run_once(core, server, "full", args)]
+            server.touch(args.changed)
+            results.append(run_once(core, server, f"{args.changed} changed", args))
+            results.append(run_once(core, server, "unchanged", args))
+            os.chdir(cwd)
+    finally:
+        server.stop()
+
+    print(f"{server.note_count} 篇笔记，{len(server.dirs)} 个目录")
+    print(
+        f"{'sync':<14}{'seconds':>9}{'notes/s':>10}{'requests':>10}{'req/note':>10}"
+        "  detail"
+    )
+    for r in results:
+        print(
+            f"{r['label']:<14}{r['seconds']:>9.2f}{r['notes_per_s']:>10.1f}"
+            f"{r['requests']:>10}{r['requests_per_note']:>10.2f}  {r['detail']}"
+        )
+    if args.metrics:
+        for r in results:
+            print(f"\n[{r['label']}]")
+            for line in r["metrics"]:
+                print(f"  {line}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+启动耗时基准测试：在空的临时目录中多次启动新的 Python 进程，测量导入与 --help 的耗时
+
+    python benchmarks/bench_startup.py [--runs 20] [--importtime 15]
+
+报告每个场景的最短与中位耗时（毫秒），以不做任何事的 `python -c pass` 为基准；
+--importtime 列出各场景中累计导入耗时最多的模块（python -X importtime）
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+# 场景名与 python 参数
+SCENARIOS: Dict[str, List[str]] = {
+    "python": ["-c", "pass"],
+    "import package": ["-c", "import youdaonote_pull"],
+    "--help": ["-m", "youdaonote_pull", "--help"],
+    "import core": ["-c", "import youdaonote_pull.core"],
+}
+
+
+def run(args: List[str], cwd: str, env: dict) -> Tuple[float, str]:
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, *args], cwd=cwd, env=env, capture_output=True, text=True
+    )
+    seconds = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"{args} 运行失败：{proc.stderr}")
+    return seconds, proc.stderr
+
+
+def import_times(stderr: str, top: int) -> List[Tuple[int, str]]:
+    """解析 -X importtime 的输出，返回累计耗时（微秒）最多的模块"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        rows.append((int(cumulative), name.rstrip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20, help="每个场景的运行次数")
+    parser.add_argument(
+        "--importtime", type=int, default=0, metavar="N", help="列出导入最慢的 N 个模块"
+    )
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYTHONPATH=os.path.abspath(SRC_DIR))
+    with tempfile.TemporaryDirectory() as work_dir:
+        print(f"{'scenario':<16}{'min ms':>9}{'median ms':>11}")
+        for name, scenario in SCENARIOS.items():
+            # 第一次运行预热磁盘缓存与 .pyc，不计入结果
+            run(scenario, work_dir, env)
+            times = [run(scenario, work_dir, env)[0] * 1000 for _ in range(args.runs)]
+            print(f"{name:<16}{min(times):>9.1f}{statistics.median(times):>11.1f}")
+
+        # 导入与 --help 不应在当前目录下创建 config/、logs/ 等文件
+        created = os.listdir(work_dir)
+        if created:
+            print(f"警告：启动时创建了 {created}")
+
+        if args.importtime:
+            for name, scenario in SCENARIOS.items():
+                _, stderr = run(["-X", "importtime", *scenario], work_dir, env)
+                print(f"\n[{name}]")
+                for cumulative, module in import_times(stderr, args.importtime):
+                    print(f"{cumulative / 1000:>9.1f} ms  {module}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+转换基准测试：XML、JSON、HTML 笔记转换为 MarkDown，以及图片链接迁移的吞吐量
+
+    python benchmarks/bench_suite.py [--scale 1] [--save result.json] [--compare baseline.json]
+
+输入为 synthetic.py 生成的合成笔记，报告 MB/s（按输入大小）与块/s。
+--compare 与之前 --save 的结果比较，吞吐量下降超过 --tolerance 时以非零状态退出
+"""
+
+import argparse
+import json
+import logging
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict
+
+from synthetic import NoteSpec, make_html_note, make_json_note, make_xml_note
+
+from youdaonote_pull.convert import YoudaoNoteConvert
+from youdaonote_pull.image import ImagePull
+
+
+class LocalImagePull(ImagePull):
+    """不下载，图片链接直接映射为本地路径，只测量链接收集与替换"""
+
+    def __init__(self):
+        super().__init__(None, "", True)
+
+    def _resolve_image_url(self, file_path, image_url) -> str:
+        return "images/" + image_url.rsplit("/", 1)[-1] + ".png"
+
+
+def bench(func: Callable[[], object], min_time: float) -> float:
+    """重复执行至少 min_time 秒，返回单次最短耗时"""
+    best = float("inf")
+    total = 0.0
+    while total < min_time:
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = min(best, elapsed)
+        total += elapsed
+    return best
+
+
+def run(spec: NoteSpec, min_time: float) -> Dict[str, dict]:
+    xml = make_xml_note(spec)
+    json_bytes = make_json_note(spec)
+    html = make_html_note(spec)
+    markdown = YoudaoNoteConvert.xml_to_markdown(xml)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        note_path = Path(tmp_dir, "note.md").as_posix()
+        image_pull = LocalImagePull()
+
+        def migrate():
+            with open(note_path, "w", encoding="utf-8") as fp:
+                fp.write(markdown)
+            image_pull.migration_ydnote_url(note_path)
+
+        cases = {
+            "xml": (len(xml), lambda: YoudaoNoteConvert.xml_to_markdown(xml)),
+            "json": (
+                len(json_bytes),
+                lambda: YoudaoNoteConvert.json_to_markdown(json_bytes),
+            ),
+            "html": (len(html), lambda: YoudaoNoteConvert.html_to_markdown(html)),
+            "image_links": (len(markdown.encode("utf-8")), migrate),
+        }
+        results = {}
+        for name, (size, func) in cases.items():
+            seconds = bench(func, min_time)
+            results[name] = {
+                "bytes": size,
+                "blocks": spec.blocks,
+                "seconds": seconds,
+                "mb_per_s": size / seconds / 1e6,
+                "blocks_per_s": spec.blocks / seconds,
+            }
+    return results
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float):
+    """返回吞吐量下降超过 tolerance 的项"""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result["mb_per_s"] / baseline[name]["mb_per_s"]
+        if ratio < 1 - tolerance:
+            regressions.append(f"{name}: {ratio:.0%} of baseline")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scale", type=float, default=1, help="合成笔记大小倍数")
+    parser.add_argument("--min-time", type=float, default=1, help="每项最少运行秒数")
+    parser.add_argument("--save", help="保存结果到 JSON 文件")
+    parser.add_argument("--compare", help="与之前保存的结果比较")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2, help="允许的吞吐量下降比例"
+    )
+    args = parser.parse_args()
+    # 不输出每篇笔记的转换日志
+    logging.disable(logging.INFO)
+
+    spec = NoteSpec().scaled(args.scale)
+    results = run(spec, args.min_time)
+
+    print(f"{'case':<14}{'MB':>8}{'blocks':>9}{'MB/s':>10}{'blocks/s':>12}")
+    for name, r in results.items():
+        print(
+            f"{name:<14}{r['bytes'] / 1e6:>8.2f}{r['blocks']:>9}"
+            f"{r['mb_per_s']:>10.2f}{r['blocks_per_s']:>12.0f}"
+        )
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as fp:
+            json.dump(results, fp, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fp:
+            regressions = compare(results, json.load(fp), args.tolerance)
+        if regressions:
+            print("性能下降：\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
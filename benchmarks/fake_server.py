@@ -0,0 +1,195 @@
+"""
+本地模拟的有道云笔记服务，实现 ROOT_ID_URL、DIR_MES_URL、FILE_URL 与图片资源链接
+
+目录树形状、笔记大小、延迟和错误率可配置，并统计各类请求次数，用于端到端基准测试
+"""
+
+import json
+import random
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib.parse import parse_qs, urlparse
+
+from synthetic import NoteSpec, make_json_note, make_xml_note
+
+# 笔记中的图片链接须包含 note.youdao.com 才会被迁移，以此为路径前缀
+RESOURCE_PREFIX = "/note.youdao.com/res/"
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 16
+
+
+@dataclass
+class TreeSpec:
+    # 目录层数（不含根目录）与每个目录下的子目录数、笔记数
+    depth: int = 2
+    dirs_per_dir: int = 3
+    notes_per_dir: int = 10
+    # 每篇笔记的内容，图片数为 note.images
+    note: NoteSpec = field(
+        default_factory=lambda: NoteSpec(
+            paragraphs=50, lists=20, tables=2, code_blocks=2, images=2
+        )
+    )
+    # 每个请求的延迟（秒）
+    latency: float = 0.0
+    # 笔记下载与图片请求返回 500 的比例
+    error_rate: float = 0.0
+    seed: int = 0
+
+
+class FakeYoudaoServer:
+    def __init__(self, spec: TreeSpec):
+        self.spec = spec
+        self.requests = Counter()
+        self._lock = threading.Lock()
+        self._random = random.Random(spec.seed)
+        # 目录 ID 与其子项（fileEntry）的对应
+        self.dirs: Dict[str, List[dict]] = {}
+        # 笔记 ID 与内容模板的对应，模板中的图片链接在请求时替换为本服务地址
+        self.notes: Dict[str, bytes] = {}
+        self._note_templates = [make_xml_note(spec.note), make_json_note(spec.note)]
+        self._build("root", spec.depth)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self.base = f"http://127.0.0.1:{self._server.server_port}"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def note_count(self) -> int:
+        return len(self.notes)
+
+    def _build(self, dir_id: str, depth: int):
+        entries = []
+        for i in range(self.spec.notes_per_dir):
+            note_id = f"{dir_id}-n{i}"
+            self.notes[note_id] = self._note_templates[i % 2]
+            entry = self._entry(note_id, f"笔记 {i}.note", False)
+            entry["fileSize"] = len(self.notes[note_id])
+            entries.append(entry)
+        if depth > 0:
+            for i in range(self.spec.dirs_per_dir):
+                sub_id = f"{dir_id}-d{i}"
+                entries.append(self._entry(sub_id, f"目录 {i}", True))
+                self._build(sub_id, depth - 1)
+        self.dirs[dir_id] = entries
+
+    @staticmethod
+    def _entry(id: str, name: str, is_dir: bool) -> dict:
+        return {
+            "id": id,
+            "name": name,
+            "dir": is_dir,
+            "createTimeForSort": 1_600_000_000,
+            "modifyTimeForSort": 1_600_000_000,
+        }
+
+    def touch(self, count: int) -> List[str]:
+        """修改前 count 篇笔记及其所在目录的修改时间，模拟云端更新"""
+        changed = []
+        for dir_id, entries in self.dirs.items():
+            for entry in entries:
+                if len(changed) < count and not entry["dir"]:
+                    entry["modifyTimeForSort"] += 1
+                    changed.append(entry["id"])
+        # 祖先目录的修改时间一并更新
+        for note_id in changed:
+            parts = note_id.split("-")[:-1]
+            for i in range(1, len(parts)):
+                parent, child = "-".join(parts[:i]), "-".join(parts[: i + 1])
+                for entry in self.dirs[parent]:
+                    if entry["id"] == child:
+                        entry["modifyTimeForSort"] += 1
+        return changed
+
+    def note_content(self, note_id: str) -> bytes:
+        """图片链接指向本服务，每篇笔记的图片链接与文件名不同"""
+        prefix = f"{self.base}{RESOURCE_PREFIX}{note_id}/"
+        content = self.notes[note_id].replace(
+            b"https://note.youdao.com/yws/res/", prefix.encode()
+        )
+        return content.replace(b"/WEBRESOURCE", f"/{note_id}-WEBRESOURCE".encode())
+
+    def _count(self, kind: str) -> bool:
+        """计数并返回本次请求是否注入错误"""
+        if self.spec.latency:
+            time.sleep(self.spec.latency)
+        with self._lock:
+            self.requests[kind] += 1
+            if kind in ("file", "resource") and self.spec.error_rate:
+                if self._random.random() < self.spec.error_rate:
+                    self.requests["error"] += 1
+                    return True
+        return False
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # 响应头与内容分两次发送，避免与延迟确认叠加产生约 40ms 的等待
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status: int, body: bytes, content_type="application/json"):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                if url.path.startswith(RESOURCE_PREFIX):
+                    if server._count("resource"):
+                        return self._reply(500, b"")
+                    return self._reply(200, PNG, "image/png")
+                if query.get("method") == ["listPageByParentId"]:
+                    server._count("dir")
+                    entries = server.dirs.get(url.path.rsplit("/", 1)[-1], [])
+                    length = int(query["len"][0])
+                    start = 0
+                    if "lastId" in query:
+                        ids = [entry["id"] for entry in entries]
+                        start = ids.index(query["lastId"][0]) + 1
+                    body = {
+                        "count": len(entries),
+                        "entries": [
+                            {"fileEntry": entry}
+                            for entry in entries[start : start + length]
+                        ],
+                    }
+                    return self._reply(200, json.dumps(body).encode())
+                self._reply(404, b"")
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                length = int(self.headers.get("Content-Length", 0))
+                form = parse_qs(self.rfile.read(length).decode())
+                if query.get("method") == ["getByPath"]:
+                    server._count("root")
+                    body = {"fileEntry": {"id": "root", "name": "ROOT", "dir": True}}
+                    return self._reply(200, json.dumps(body).encode())
+                if query.get("method") == ["download"] and form.get("fileId"):
+                    if server._count("file"):
+                        return self._reply(500, b"")
+                    content = server.note_content(form["fileId"][0])
+                    return self._reply(200, content, "application/octet-stream")
+                self._reply(404, b"")
+
+        return Handler
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,157 @@
+"""
+生成用于基准测试的合成笔记，格式与 tests/test_convert 中的样例一致
+
+块按段落、列表、表格、代码块、图片依次交错排列，数量由 NoteSpec 指定
+"""
+
+import json
+from dataclasses import dataclass
+from itertools import zip_longest
+from typing import List
+from xml.sax.saxutils import escape
+
+TEXT = "有道云笔记导出到本地 Markdown，Export Youdao notes to Markdown."
+CODE = [
+    "def main():",
+    '    print("Hello, World!")',
+    "",
+    'if __name__ == "__main__":',
+    "    main()",
+]
+
+
+@dataclass
+class NoteSpec:
+    paragraphs: int = 1000
+    lists: int = 500
+    tables: int = 50
+    code_blocks: int = 50
+    images: int = 100
+    # 表格行数、列数
+    table_rows: int = 10
+    table_cols: int = 4
+
+    @property
+    def blocks(self) -> int:
+        return (
+            self.paragraphs + self.lists + self.tables + self.code_blocks + self.images
+        )
+
+    def scaled(self, factor: float) -> "NoteSpec":
+        return NoteSpec(
+            paragraphs=int(self.paragraphs * factor),
+            lists=int(self.lists * factor),
+            tables=int(self.tables * factor),
+            code_blocks=int(self.code_blocks * factor),
+            images=int(self.images * factor),
+            table_rows=self.table_rows,
+            table_cols=self.table_cols,
+        )
+
+
+def image_url(i: int) -> str:
+    """有道云笔记图片链接，ImagePull 会将其迁移到本地"""
+    return f"https://note.youdao.com/yws/res/{i}/WEBRESOURCE{i:032x}"
+
+
+def _interleave(*groups: List[str]) -> List[str]:
+    return [block for row in zip_longest(*groups) for block in row if block]
+
+
+def _cell(row: int, col: int) -> str:
+    return f"第 {row} 行第 {col} 列"
+
+
+def make_xml_note(spec: NoteSpec) -> bytes:
+    para = "<para><text>{}</text><inline-styles/><styles/></para>"
+    list_item = (
+        '<list-item level="1" list-id="list-{}"><text>{}</text>'
+        "<inline-styles/><styles/></list-item>"
+    )
+    table_content = {
+        "widths": [100] * spec.table_cols,
+        "cells": [
+            {"value": _cell(row, col)}
+            for row in range(spec.table_rows)
+            for col in range(spec.table_cols)
+        ],
+    }
+    table = "<table><resource-list/><content>{}</content></table>".format(
+        escape(json.dumps(table_content, ensure_ascii=False))
+    )
+    code = "<code><text>{}</text><language>python</language></code>".format(
+        escape("\n".join(CODE))
+    )
+    image = "<image><source>{}</source><text>图片 {}</text></image>"
+
+    body = _interleave(
+        [para.format(f"{i} {escape(TEXT)}") for i in range(spec.paragraphs)],
+        [list_item.format(i % 2, f"列表 {i}") for i in range(spec.lists)],
+        [table] * spec.tables,
+        [code] * spec.code_blocks,
+        [image.format(image_url(i), i) for i in range(spec.images)],
+    )
+    head = (
+        '<head><list id="list-0" type="unordered"/>'
+        '<list id="list-1" type="ordered"/></head>'
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<note xmlns="http://note.youdao.com" file-version="0" schema-version="1.0.3">'
+        f"{head}<body>{''.join(body)}</body></note>"
+    ).encode("utf-8")
+
+
+def _json_text(text: str) -> dict:
+    return {"5": [{"2": "2", "7": [{"8": text}]}]}
+
+
+def make_json_note(spec: NoteSpec) -> bytes:
+    def list_item(i):
+        lt = "ordered" if i % 2 else "unordered"
+        return {"4": {"ll": 1, "lt": lt}, **_json_text(f"列表 {i}"), "6": "l"}
+
+    table = {
+        "5": [
+            {
+                "5": [
+                    {"5": [_json_text(_cell(row, col))], "6": "tc"}
+                    for col in range(spec.table_cols)
+                ],
+                "6": "tr",
+            }
+            for row in range(spec.table_rows)
+        ],
+        "6": "t",
+    }
+    code = {
+        "4": {"la": "python"},
+        "5": [{**_json_text(line), "6": "cl"} for line in CODE],
+        "6": "cd",
+    }
+    contents = _interleave(
+        [_json_text(f"{i} {TEXT}") for i in range(spec.paragraphs)],
+        [list_item(i) for i in range(spec.lists)],
+        [table] * spec.tables,
+        [code] * spec.code_blocks,
+        [{"4": {"u": image_url(i)}, "6": "im"} for i in range(spec.images)],
+    )
+    return json.dumps({"5": contents}, ensure_ascii=False).encode("utf-8")
+
+
+def make_html_note(spec: NoteSpec) -> bytes:
+    rows = "".join(
+        "<tr>{}</tr>".format(
+            "".join(f"<td>{_cell(row, col)}</td>" for col in range(spec.table_cols))
+        )
+        for row in range(spec.table_rows)
+    )
+    code = "<pre><code>{}</code></pre>".format(escape("\n".join(CODE)))
+    body = _interleave(
+        [f"<p>{i} {escape(TEXT)}</p>" for i in range(spec.paragraphs)],
+        [f"<ul><li>列表 {i}</li></ul>" for i in range(spec.lists)],
+        [f"<table>{rows}</table>"] * spec.tables,
+        [code] * spec.code_blocks,
+        [f'<div><img src="{image_url(i)}"/></div>' for i in range(spec.images)],
+    )
+    return f"<div>{''.join(body)}</div>".encode("utf-8")
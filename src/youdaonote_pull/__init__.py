@@ -1,6 +1,2 @@
-from . import log
-
 __author__ = "Depp Wang (deppwxq@gmail.com)"
 __github__ = "https//github.com/DeppWang/youdaonote-pull"
-
-log.init()
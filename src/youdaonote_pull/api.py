@@ -1,8 +1,16 @@
+import json
+import logging
 import os.path as osp
+import time
+from typing import AsyncIterator, Dict, Iterator, Mapping, NamedTuple, Optional, Tuple
 
-from requests import Session
+from requests import Response, Session
+from requests.adapters import HTTPAdapter
+from requests.exceptions import HTTPError
 
-from .config import CONFIG_DIR
+from .config import CONFIG, CONFIG_DIR
+from .metrics import METRICS
+from .ratelimit import RETRY_EXCEPTIONS, RetryPolicy
 
 cookies_path = osp.join(CONFIG_DIR, "cookies.txt")
 
@@ -11,6 +19,21 @@ def cvt_cookies_to_dict(cookies_str: str):
     return dict(line.split("=", 1) for line in cookies_str.split("; "))
 
 
+def load_cookies(path: str = cookies_path) -> Tuple[Dict[str, str], str]:
+    """
+    读取 Cookies 文件
+    :param path: cookies.txt 路径
+    :return: cookies, cstk
+    """
+    with open(path) as fp:
+        cookies = cvt_cookies_to_dict(fp.read())
+
+    # cstk 用于请求时接口验证
+    if "YNOTE_CSTK" not in cookies:
+        raise ValueError("YNOTE_CSTK 字段为空")
+    return cookies, cookies["YNOTE_CSTK"]
+
+
 """
 有道云笔记 API 封装
 原理：https://depp.wang/2020/06/11/how-to-find-the-api-of-a-website-eg-note-youdao-com/
@@ -19,9 +42,12 @@ def cvt_cookies_to_dict(cookies_str: str):
 ROOT_ID_URL = "https://note.youdao.com/yws/api/personal/file?method=getByPath&keyfrom=web&cstk={cstk}"
 DIR_MES_URL = (
     "https://note.youdao.com/yws/api/personal/file/{dir_id}"
-    "?all=true&f=true&len=1000&sort=1"
+    "?all=true&f=true&len={length}&sort=1"
     "&isReverse=false&method=listPageByParentId&keyfrom=web&cstk={cstk}"
 )
+# 分页时在 DIR_MES_URL 后追加上一页最后一项的 ID
+DIR_MES_LAST_ID = "&lastId={last_id}"
+DIR_PAGE_SIZE = 1000
 FILE_URL = (
     "https://note.youdao.com/yws/api/personal/sync"
     "?method=download&_system=macos&_systemVersion="
@@ -30,50 +56,142 @@ FILE_URL = (
     "&_cityCode=110000&_cityName=&sev=j1&keyfrom=web&cstk={cstk}"
 )
 
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/100.0.4896.88 Safari/537.36",
+    "Accept": "*/*",
+    "Accept-Encoding": "gzip, deflate",
+    "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
+    "sec-ch-ua": '" Not A;Brand";v="99", "Chromium";v="100", "Google Chrome";v="100"',
+    "sec-ch-ua-mobile": "?0",
+    "sec-ch-ua-platform": '"macOS"',
+}
+
+
+# 连接池缓存的主机数（有道云笔记接口与图片、附件所在的几个主机）
+POOL_CONNECTIONS = 10
+# 每个主机保持的默认连接数，与 requests 默认值相同
+DEFAULT_POOL_MAXSIZE = 10
+
+
+def mount_pool(session: Session, pool_maxsize: int):
+    """
+    设置 session 的连接池大小
+    :param session:
+    :param pool_maxsize: 每个主机保持的最大连接数，应不小于同时请求的线程数，否则多出的连接用完即关闭
+    :return:
+    """
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=pool_maxsize)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+
+def create_session(
+    pool_maxsize: int = DEFAULT_POOL_MAXSIZE, keep_alive: bool = True
+) -> Session:
+    """
+    创建设置了连接池大小与 keep-alive 的 requests.Session
+    :param pool_maxsize: 每个主机保持的最大连接数
+    :param keep_alive: 为 False 时每个请求后关闭连接
+    :return: Session
+    """
+    session = Session()
+    mount_pool(session, pool_maxsize)
+    if not keep_alive:
+        session.headers["Connection"] = "close"
+    return session
+
+
+def config_timeout() -> Tuple[float, float]:
+    """CONFIG 中的 (连接超时, 读取超时)，用于所有请求"""
+    return CONFIG.connect_timeout, CONFIG.read_timeout
+
 
 class YoudaoNoteSession:
-    def __init__(self):
-        with open(cookies_path) as fp:
-            cookies = cvt_cookies_to_dict(fp.read())
-
-        self._session = Session()  # 使用 session 维持有道云笔记的登陆状态
-        self._session.headers.update(
-            {
-                "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) "
-                "Chrome/100.0.4896.88 Safari/537.36",
-                "Accept": "*/*",
-                "Accept-Encoding": "gzip, deflate",
-                "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
-                "sec-ch-ua": '" Not A;Brand";v="99", "Chromium";v="100", "Google Chrome";v="100"',
-                "sec-ch-ua-mobile": "?0",
-                "sec-ch-ua-platform": '"macOS"',
-            }
+    def __init__(
+        self,
+        cookies_path: str = cookies_path,
+        retry_policy: Optional[RetryPolicy] = None,
+        timeout: Optional[Tuple[float, float]] = None,
+    ):
+        """
+        :param cookies_path: cookies.txt 路径
+        :param retry_policy: 限速与重试策略，不指定则按 CONFIG 创建
+        :param timeout: (连接超时, 读取超时) 秒数，不指定则使用 CONFIG 中的设置
+        """
+        cookies, self._cstk = load_cookies(cookies_path)
+        self.cookies_path = cookies_path
+        self.retry_policy = retry_policy or RetryPolicy.from_config(CONFIG)
+        self.timeout = timeout or config_timeout()
+
+        # 使用 session 维持有道云笔记的登陆状态，并复用连接
+        self._session = create_session(
+            CONFIG.pool_maxsize or DEFAULT_POOL_MAXSIZE, CONFIG.keep_alive
         )
+        self._session.headers.update(HEADERS)
         self._session.cookies.update(cookies)
 
-        # cstk 用于请求时接口验证
-        if "YNOTE_CSTK" in cookies:
-            self._cstk = cookies["YNOTE_CSTK"]
-        else:
-            raise ValueError("YNOTE_CSTK 字段为空")
+    def resize_pool(self, pool_maxsize: int):
+        """
+        调整连接池大小，需在请求前调用
+        :param pool_maxsize: 每个主机保持的最大连接数
+        """
+        mount_pool(self._session, pool_maxsize)
 
-    def http_post(self, url, data=None, files=None):
+    def _request(self, method: str, url: str, **kwargs) -> Response:
+        """
+        发送请求，按 retry_policy 限速，限流、服务端错误和网络错误（含超时）时退避重试
+        重试次数用完后返回最后一次的响应，或抛出最后一次的异常
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        policy = self.retry_policy
+        attempt = 0
+        while True:
+            wait = policy.breaker.wait_time()
+            while wait > 0:
+                time.sleep(wait)
+                wait = policy.breaker.wait_time()
+            time.sleep(policy.limiter.reserve())
+            METRICS.incr("api.requests")
+            try:
+                resp = self._session.request(method, url, **kwargs)
+            except RETRY_EXCEPTIONS:
+                delay = policy.on_error(attempt)
+                if delay is None:
+                    raise
+            else:
+                retry_after = resp.headers.get("Retry-After")
+                delay = policy.on_response(attempt, resp.status_code, retry_after)
+                if delay is None:
+                    # 流式响应的字节数在保存时统计
+                    if not kwargs.get("stream"):
+                        METRICS.incr("bytes.downloaded", len(resp.content))
+                    return resp
+                resp.close()
+            METRICS.incr("api.retries")
+            time.sleep(delay)
+            attempt += 1
+
+    def http_post(self, url, data=None, files=None, stream=False):
         """
         封装 post 请求
         :param url:
         :param data:
         :param files:
+        :param stream: 为 True 时不立即读取响应体，用于流式下载
         :return: response
         """
-        return self._session.post(url, data=data, files=files)
+        return self._request("POST", url, data=data, files=files, stream=stream)
 
-    def http_get(self, url):
+    def http_get(self, url, stream=False, headers=None):
         """
         封装 get 请求
         :param url:
+        :param stream: 为 True 时不立即读取响应体，用于流式下载
+        :param headers: 额外的请求头，如 Range
         :return: response
         """
-        return self._session.get(url)
+        return self._request("GET", url, stream=stream, headers=headers)
 
     def get_root_dir_info_id(self) -> dict:
         """
@@ -99,21 +217,254 @@ class YoudaoNoteSession:
             ]
         }
         """
-        url = DIR_MES_URL.format(dir_id=dir_id, cstk=self._cstk)
-        return self.http_get(url).json()
+        url = _dir_page_url(dir_id, self._cstk, DIR_PAGE_SIZE, None)
+        with METRICS.timer("api.dir_list"):
+            return self.http_get(url).json()
 
-    def get_file_by_id(self, file_id):
+    def iter_dir_entries(
+        self, dir_id, page_size: int = DIR_PAGE_SIZE
+    ) -> Iterator[dict]:
+        """
+        分页获取目录下所有文件信息，每取到一页即逐个返回，不受单页 1000 条的限制
+        :param dir_id:
+        :param page_size: 每页条数
+        :return: fileEntry 迭代器，{'id': 'test_note_id', 'name': 'test_note', 'dir': false, ...}
+        """
+        last_id, fetched, seen = None, 0, set()
+        while True:
+            url = _dir_page_url(dir_id, self._cstk, page_size, last_id)
+            with METRICS.timer("api.dir_list"):
+                dir_info = self.http_get(url).json()
+            entries = _dir_page_entries(dir_info)
+            if _page_repeated(dir_id, entries, seen):
+                return
+            fetched += len(entries)
+            for entry in entries:
+                yield entry["fileEntry"]
+            last_id = _next_last_id(dir_info, page_size, fetched)
+            if last_id is None:
+                return
+
+    def get_file_by_id(self, file_id, stream=False):
         """
         根据文件 ID 获取文件内容
         :param file_id:
+        :param stream: 为 True 时不立即读取响应体，用于流式下载
         :return: response，内容为笔记字节码
+        :raise HTTPError: 重试后仍下载失败
         """
         url = FILE_URL.format(cstk=self._cstk)
-        data = {
-            "fileId": file_id,
-            "version": -1,
-            "convert": "true",
-            "editorType": 1,
-            "cstk": self._cstk,
-        }
-        return self.http_post(url, data=data)
+        data = _file_form_data(file_id, self._cstk)
+        with METRICS.timer("api.note_download"):
+            resp = self.http_post(url, data=data, stream=stream)
+        if resp.status_code >= 400:
+            resp.close()
+            raise HTTPError(f"下载文件「{file_id}」失败，状态码 {resp.status_code}")
+        return resp
+
+
+def _dir_page_url(dir_id, cstk: str, page_size: int, last_id: Optional[str]) -> str:
+    url = DIR_MES_URL.format(dir_id=dir_id, length=page_size, cstk=cstk)
+    if last_id is not None:
+        url += DIR_MES_LAST_ID.format(last_id=last_id)
+    return url
+
+
+def _dir_page_entries(dir_info: dict) -> list:
+    try:
+        return dir_info["entries"]
+    except KeyError:
+        raise RuntimeError("有道云笔记修改了接口地址，此脚本暂时不能使用！请提 issue")
+
+
+def _page_repeated(dir_id, entries: list, seen: set) -> bool:
+    """
+    服务端忽略 lastId 时会重复返回同一页，且不一定带 count，按每页最后一项的 ID 判断
+    :param seen: 已取到的各页最后一项的 ID，未重复时加入本页的
+    :return: 本页已取到过时为 True
+    """
+    if not entries:
+        return False
+    page_last_id = entries[-1]["fileEntry"]["id"]
+    if page_last_id in seen:
+        logging.warning("目录「%s」的分页重复，停止获取该目录的后续分页", dir_id)
+        return True
+    seen.add(page_last_id)
+    return False
+
+
+def _next_last_id(dir_info: dict, page_size: int, fetched: int) -> Optional[str]:
+    """下一页的 lastId，已取完时返回 None"""
+    entries = dir_info["entries"]
+    if len(entries) < page_size or fetched >= dir_info.get("count", float("inf")):
+        return None
+    return entries[-1]["fileEntry"]["id"]
+
+
+def _file_form_data(file_id, cstk: str) -> dict:
+    return {
+        "fileId": file_id,
+        "version": -1,
+        "convert": "true",
+        "editorType": 1,
+        "cstk": cstk,
+    }
+
+
+class AsyncResponse(NamedTuple):
+    """已读取完毕的 aiohttp 响应，属性与 requests.Response 同名"""
+
+    status_code: int
+    headers: Mapping[str, str]
+    url: str
+    content: bytes
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class AsyncYoudaoNoteSession:
+    """
+    YoudaoNoteSession 的 asyncio 版本，基于 aiohttp（可选依赖）
+    所有请求共用一个连接池，limit 为最大连接数
+
+    async with AsyncYoudaoNoteSession() as session:
+        dir_info = await session.get_dir_info_by_id(dir_id)
+    """
+
+    def __init__(
+        self,
+        cookies_path: str = cookies_path,
+        limit: int = 8,
+        retry_policy: Optional[RetryPolicy] = None,
+    ):
+        self._cookies, self._cstk = load_cookies(cookies_path)
+        self._limit = limit
+        self.retry_policy = retry_policy or RetryPolicy.from_config(CONFIG)
+        self.timeout = config_timeout()
+        self._session = None
+        self._retry_exceptions = RETRY_EXCEPTIONS
+
+    async def __aenter__(self):
+        # asyncio 与 aiohttp 只在异步模式下导入
+        import asyncio
+
+        try:
+            import aiohttp
+        except ImportError:
+            raise RuntimeError("异步模式需要安装 aiohttp：pip install aiohttp")
+
+        self._session = aiohttp.ClientSession(
+            headers=HEADERS,
+            cookies=self._cookies,
+            connector=aiohttp.TCPConnector(
+                limit=self._limit, force_close=not CONFIG.keep_alive
+            ),
+            timeout=aiohttp.ClientTimeout(
+                sock_connect=self.timeout[0], sock_read=self.timeout[1]
+            ),
+        )
+        self._retry_exceptions = (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._session.close()
+        self._session = None
+
+    @staticmethod
+    async def _read(resp) -> AsyncResponse:
+        content = await resp.read()
+        return AsyncResponse(resp.status, resp.headers, str(resp.url), content)
+
+    async def _request(self, method: str, url: str, **kwargs) -> AsyncResponse:
+        """发送请求，限速与重试同 YoudaoNoteSession._request"""
+        import asyncio
+
+        policy = self.retry_policy
+        attempt = 0
+        while True:
+            wait = policy.breaker.wait_time()
+            while wait > 0:
+                await asyncio.sleep(wait)
+                wait = policy.breaker.wait_time()
+            await asyncio.sleep(policy.limiter.reserve())
+            METRICS.incr("api.requests")
+            try:
+                async with self._session.request(method, url, **kwargs) as resp:
+                    resp = await self._read(resp)
+            except self._retry_exceptions:
+                delay = policy.on_error(attempt)
+                if delay is None:
+                    raise
+            else:
+                retry_after = resp.headers.get("Retry-After")
+                delay = policy.on_response(attempt, resp.status_code, retry_after)
+                if delay is None:
+                    METRICS.incr("bytes.downloaded", len(resp.content))
+                    return resp
+            METRICS.incr("api.retries")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def http_post(self, url, data=None) -> AsyncResponse:
+        """
+        封装 post 请求
+        :param url:
+        :param data:
+        :return: response，响应体已读取
+        """
+        return await self._request("POST", url, data=data)
+
+    async def http_get(self, url) -> AsyncResponse:
+        """
+        封装 get 请求
+        :param url:
+        :return: response，响应体已读取
+        """
+        return await self._request("GET", url)
+
+    async def get_root_dir_info_id(self) -> dict:
+        """获取有道云笔记根目录信息，同 YoudaoNoteSession.get_root_dir_info_id"""
+        data = {"path": "/", "entire": "true", "purge": "false", "cstk": self._cstk}
+        resp = await self.http_post(ROOT_ID_URL.format(cstk=self._cstk), data=data)
+        return resp.json()
+
+    async def get_dir_info_by_id(self, dir_id) -> dict:
+        """根据目录 ID 获取目录下所有文件信息，同 YoudaoNoteSession.get_dir_info_by_id"""
+        url = _dir_page_url(dir_id, self._cstk, DIR_PAGE_SIZE, None)
+        with METRICS.timer("api.dir_list"):
+            resp = await self.http_get(url)
+        return resp.json()
+
+    async def iter_dir_entries(
+        self, dir_id, page_size: int = DIR_PAGE_SIZE
+    ) -> AsyncIterator[dict]:
+        """分页获取目录下所有文件信息，同 YoudaoNoteSession.iter_dir_entries"""
+        last_id, fetched, seen = None, 0, set()
+        while True:
+            url = _dir_page_url(dir_id, self._cstk, page_size, last_id)
+            with METRICS.timer("api.dir_list"):
+                dir_info = (await self.http_get(url)).json()
+            entries = _dir_page_entries(dir_info)
+            if _page_repeated(dir_id, entries, seen):
+                return
+            fetched += len(entries)
+            for entry in entries:
+                yield entry["fileEntry"]
+            last_id = _next_last_id(dir_info, page_size, fetched)
+            if last_id is None:
+                return
+
+    async def get_file_by_id(self, file_id) -> bytes:
+        """
+        根据文件 ID 获取文件内容
+        :param file_id:
+        :return: 笔记字节码
+        :raise HTTPError: 重试后仍下载失败
+        """
+        url = FILE_URL.format(cstk=self._cstk)
+        with METRICS.timer("api.note_download"):
+            resp = await self.http_post(url, data=_file_form_data(file_id, self._cstk))
+        if resp.status_code >= 400:
+            raise HTTPError(f"下载文件「{file_id}」失败，状态码 {resp.status_code}")
+        return resp.content
@@ -0,0 +1,138 @@
+import dataclasses
+import logging
+import os.path as osp
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from .api import YoudaoNoteSession
+from .config import CONFIG, CONFIG_DIR
+from .core import AsyncYoudaoNotePull, PullExecutors, YoudaoNotePull
+from .ratelimit import RetryPolicy
+
+"""
+多账号批量导出：在一个进程中导出多个有道云笔记账号
+- 每个账号使用各自的 cookies、会话、限速与熔断状态和同步清单
+- 所有账号共用下载、图片、转换的线程池/进程池，一个账号的目录遍历较慢时其他账号的文件可继续下载
+- 一个账号失败不影响其他账号
+"""
+
+ACCOUNTS_FILE = osp.join(CONFIG_DIR, "accounts.toml")
+# 账号名用于默认的本地目录与同步清单文件名
+REGEX_ACCOUNT_NAME = re.compile(r"^[\w.-]+$")
+
+
+@dataclass
+class Account:
+    # 账号名，不能重复
+    name: str
+    # cookies.txt 路径
+    cookies: str
+    # 本地目录，默认为 local_dir（或 youdaonote）下以账号名命名的目录
+    local_dir: Optional[str] = field(default=None)
+    # 只导出有道云笔记中的此目录，默认为 ydnote_dir
+    ydnote_dir: Optional[str] = field(default=None)
+    # 此账号每秒最多请求数，默认为 rate_limit
+    rate_limit: Optional[float] = field(default=None)
+
+    @property
+    def manifest_path(self) -> str:
+        return osp.join(CONFIG_DIR, f"manifest-{self.name}.jsonl")
+
+
+def load_accounts(path: str = ACCOUNTS_FILE) -> List[Account]:
+    """
+    读取账号列表
+
+        [[accounts]]
+        name = "alice"
+        cookies = "config/alice-cookies.txt"
+        local_dir = "notes/alice"
+
+    :param path: accounts.toml 路径
+    :return: 账号列表
+    :raise ValueError: 账号名为空、含特殊字符或重复
+    """
+    import rtoml
+    from mashumaro.codecs.basic import decode
+
+    with open(path, encoding="utf-8") as fp:
+        content = rtoml.load(fp)
+    accounts = decode(content.get("accounts", []), List[Account])
+    names = set()
+    for account in accounts:
+        if not REGEX_ACCOUNT_NAME.match(account.name):
+            raise ValueError(f"账号名「{account.name}」只能包含字母、数字、_、-、.")
+        if account.name in names:
+            raise ValueError(f"账号名「{account.name}」重复")
+        names.add(account.name)
+    return accounts
+
+
+def _account_local_dir(account: Account) -> str:
+    if account.local_dir:
+        return account.local_dir
+    return osp.join(CONFIG.local_dir or "youdaonote", account.name).replace("\\", "/")
+
+
+def pull_account(
+    account: Account,
+    executors: PullExecutors,
+    full: bool = False,
+    use_async: bool = False,
+):
+    """
+    导出一个账号
+    :param account:
+    :param executors: 所有账号共享的线程池/进程池
+    :param full: 为 True 时忽略同步清单
+    :param use_async: 使用 asyncio 请求目录与笔记
+    """
+    config = CONFIG
+    if account.rate_limit is not None:
+        config = dataclasses.replace(CONFIG, rate_limit=account.rate_limit)
+    session = YoudaoNoteSession(account.cookies, RetryPolicy.from_config(config))
+    pull_class = AsyncYoudaoNotePull if use_async else YoudaoNotePull
+    pull_class(
+        full=full,
+        session=session,
+        executors=executors,
+        local_dir=_account_local_dir(account),
+        ydnote_dir=account.ydnote_dir,
+        manifest_path=account.manifest_path,
+    ).pull_recursively()
+
+
+def pull_accounts(
+    accounts: List[Account], full: bool = False, use_async: bool = False
+) -> Dict[str, Optional[BaseException]]:
+    """
+    批量导出，同时导出 max_accounts 个账号
+    :param accounts: 账号列表
+    :param full: 为 True 时忽略同步清单
+    :param use_async: 使用 asyncio 请求目录与笔记
+    :return: {账号名: 异常}，成功的账号为 None
+    """
+    executors = PullExecutors.from_config(CONFIG)
+    results: Dict[str, Optional[BaseException]] = {}
+
+    def run(account: Account):
+        logging.info("开始导出账号「%s」", account.name)
+        try:
+            pull_account(account, executors, full, use_async)
+        except Exception as err:
+            logging.warning("账号「%s」导出失败！错误提示：%r", account.name, err)
+            results[account.name] = err
+        else:
+            logging.info("账号「%s」导出完成", account.name)
+            results[account.name] = None
+
+    try:
+        with ThreadPoolExecutor(
+            max_workers=max(1, CONFIG.max_accounts), thread_name_prefix="account"
+        ) as account_executor:
+            list(account_executor.map(run, accounts))
+    finally:
+        executors.shutdown()
+    return {account.name: results[account.name] for account in accounts}
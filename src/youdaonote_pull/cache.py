@@ -0,0 +1,123 @@
+import hashlib
+import json
+import logging
+import os
+import os.path as osp
+import shutil
+import threading
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional
+
+from .download import read_json_lines
+
+"""
+图片/附件的内容寻址缓存
+同一资源 URL 只下载一次，内容相同的文件只保存一份，各笔记目录下的文件为其硬链接（不支持硬链接时复制）
+
+缓存目录结构：
+    blobs/ab/abcdef...  以 sha256 命名的文件内容
+    index.jsonl         URL 与内容、文件名的对应关系，每行一条，后出现的覆盖先出现的
+"""
+
+RESOURCE_CACHE_DIR = ".resources"
+INDEX_FILE = "index.jsonl"
+
+
+@dataclass
+class CachedResource:
+    url: str
+    digest: str
+    file_name: str
+
+
+def file_digest(file_path: str, chunk_size=64 * 1024) -> str:
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+class ResourceCache:
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self.deduplicated = 0
+        self._resources: Dict[str, CachedResource] = {}
+        self._lock = threading.Lock()
+
+        os.makedirs(osp.join(cache_dir, "blobs"), exist_ok=True)
+        index_path = osp.join(cache_dir, INDEX_FILE)
+        if osp.exists(index_path):
+            # 中断时写了一半的行被丢弃，对应的资源下次重新下载
+            for line in read_json_lines(index_path):
+                resource = CachedResource(**line)
+                self._resources[resource.url] = resource
+        self._fp = open(index_path, "a", encoding="utf-8")
+
+    def _blob_path(self, digest: str) -> str:
+        return osp.join(self.cache_dir, "blobs", digest[:2], digest)
+
+    @staticmethod
+    def _link(src: str, dst: str):
+        """将 dst 替换为 src 的硬链接，不支持硬链接时复制"""
+        if osp.exists(dst) and osp.samefile(src, dst):
+            return
+        tmp_path = f"{dst}.tmp"
+        if osp.exists(tmp_path):
+            os.remove(tmp_path)
+        try:
+            os.link(src, tmp_path)
+        except OSError:
+            shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, dst)
+
+    def get(self, url: str) -> Optional[CachedResource]:
+        """查找已缓存的 URL，并计入命中 / 未命中次数"""
+        resource = self._resources.get(url)
+        if resource is not None and not osp.exists(self._blob_path(resource.digest)):
+            resource = None
+        with self._lock:
+            if resource is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return resource
+
+    def link_to(self, resource: CachedResource, file_path: str):
+        """将缓存内容放到 file_path"""
+        self._link(self._blob_path(resource.digest), file_path)
+
+    def add(self, url: str, file_path: str) -> CachedResource:
+        """
+        将已下载的文件加入缓存，内容已存在时 file_path 改为指向已有内容
+        :param url: 资源 URL
+        :param file_path: 已下载的文件
+        :return: CachedResource
+        """
+        digest = file_digest(file_path)
+        blob_path = self._blob_path(digest)
+        resource = CachedResource(url, digest, osp.basename(file_path))
+        with self._lock:
+            if osp.exists(blob_path):
+                self._link(blob_path, file_path)
+                self.deduplicated += 1
+            else:
+                os.makedirs(osp.dirname(blob_path), exist_ok=True)
+                self._link(file_path, blob_path)
+            if self._resources.get(url) != resource:
+                self._resources[url] = resource
+                self._fp.write(json.dumps(asdict(resource), ensure_ascii=False) + "\n")
+                self._fp.flush()
+        return resource
+
+    def log_stats(self):
+        logging.info(
+            f"图片/附件缓存：命中 {self.hits} 次，未命中 {self.misses} 次，"
+            f"内容重复 {self.deduplicated} 个"
+        )
+
+    def close(self):
+        with self._lock:
+            self._fp.close()
@@ -1,23 +1,140 @@
+import argparse
 import logging
 import sys
 import time
 import traceback
+from functools import partial
+from typing import Optional
 
-from requests.exceptions import ConnectionError, ProxyError
+from . import log
+from .metrics import METRICS
 
-from .core import YoudaoNotePull
 
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="youdaonote-pull", description="导出有道云笔记到本地"
+    )
+    parser.add_argument(
+        "-j",
+        "--max-workers",
+        type=int,
+        default=None,
+        help="并发下载的线程数，不指定则使用 config.toml 中的 max_workers",
+    )
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="使用 asyncio 并发请求目录与笔记（需安装 aiohttp），并发数为 max_workers",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="忽略同步清单，按本地文件修改时间重新检查所有文件",
+    )
+    parser.add_argument(
+        "--progress",
+        action="store_true",
+        help="先扫描目录统计文件数与大小，下载时定期输出进度、速度与预计剩余时间",
+    )
+    parser.add_argument(
+        "--accounts",
+        nargs="?",
+        const="",
+        default=None,
+        metavar="PATH",
+        help="批量导出 accounts.toml 中的多个账号，不指定路径则使用 config/accounts.toml",
+    )
+    parser.add_argument(
+        "--log-level",
+        type=str.upper,
+        choices=log.LOG_LEVELS,
+        default=None,
+        help="日志级别，不指定则使用 config.toml 中的 log_level（默认为 INFO）",
+    )
+    parser.add_argument(
+        "--log-json",
+        action="store_true",
+        help="另外输出 JSON Lines 格式的结构化日志到 logs/",
+    )
+    parser.add_argument(
+        "--metrics-json",
+        metavar="PATH",
+        default=None,
+        help="运行结束后将各阶段耗时、请求数等指标导出为 JSON 文件",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="用 cProfile 分析本次导出，结果与最耗时的函数写入 logs/",
+    )
+    parser.add_argument(
+        "--profile-top",
+        type=int,
+        default=30,
+        metavar="N",
+        help="性能分析报告中列出的函数数，默认为 30",
+    )
+    return parser.parse_args(argv)
+
+
+def report_metrics(metrics_json: Optional[str] = None):
+    """
+    输出运行指标摘要
+    :param metrics_json: 不为 None 时同时导出为 JSON 文件
+    """
+    lines = METRICS.summary()
+    if lines:
+        logging.info("运行指标：")
+        for line in lines:
+            logging.info(f"  {line}")
+    if metrics_json:
+        METRICS.export_json(metrics_json)
+        logging.info(f"运行指标已导出到「{metrics_json}」")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # 解析参数后才导入 requests、markdownify 等，--help 无需等待
+    from .config import CONFIG
+
+    log.init(args.log_level or CONFIG.log_level, args.log_json or CONFIG.log_json)
+
+    from requests.exceptions import ConnectionError, ProxyError
+
+    from .core import AsyncYoudaoNotePull, YoudaoNotePull
+
+    if args.max_workers is not None:
+        CONFIG.max_workers = args.max_workers
+    if args.progress:
+        CONFIG.progress = True
 
-def main():
     start_time = time.perf_counter()
 
+    # 批量导出时为 {账号名: 异常}
+    results = None
     try:
-        youdaonote_pull = YoudaoNotePull()
+        if args.accounts is not None:
+            from .batch import ACCOUNTS_FILE, load_accounts, pull_accounts
+
+            accounts = load_accounts(args.accounts or ACCOUNTS_FILE)
+            pull = partial(pull_accounts, accounts, args.full, args.use_async)
+        elif args.use_async:
+            pull = AsyncYoudaoNotePull(full=args.full).pull_recursively
+        else:
+            pull = YoudaoNotePull(full=args.full).pull_recursively
         logging.info("正在 pull，请稍后 ...")
-        youdaonote_pull.pull_recursively()
+        if args.profile:
+            from .profiling import profile_run
+
+            with profile_run(args.profile_top):
+                results = pull()
+        else:
+            results = pull()
     except ProxyError:
         logging.info(
-            "请检查网络代理设置；也有可能是调用有道云笔记接口次数达到限制，请等待一段时间后重新运行脚本，"
+            "请检查网络代理设置；也有可能是调用有道云笔记接口次数达到限制且多次重试仍失败，"
+            "请等待一段时间后重新运行脚本，或在配置中调低 rate_limit，"
             "若一直失败，可删除「cookies.json」后重试"
         )
         traceback.print_exc()
@@ -32,10 +149,18 @@ def main():
         sys.exit(1)
     # 链接错误等异常
     except Exception as err:
-        logging.info("Cookies 可能已过期！其他错误：", format(err))
+        logging.info("Cookies 可能已过期！其他错误：%s", err)
         traceback.print_exc()
         logging.info("已终止执行")
         sys.exit(1)
+    finally:
+        # 中途失败时同样输出，便于判断卡在哪个阶段
+        report_metrics(args.metrics_json)
 
     end_time = time.perf_counter()
+    failed_accounts = [name for name, err in (results or {}).items() if err]
+    if failed_accounts:
+        logging.info(f"以下账号导出失败：{'、'.join(failed_accounts)}")
+        logging.info(f"耗时 {end_time - start_time:.3} 秒")
+        sys.exit(1)
     logging.info(f"运行完成！耗时 {end_time - start_time:.3} 秒")
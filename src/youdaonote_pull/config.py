@@ -1,28 +1,78 @@
-import os
 import os.path as osp
 from dataclasses import dataclass, field
 from typing import Optional
 
-import rtoml
-from mashumaro.mixins.toml import DataClassTOMLMixin
-
 CONFIG_DIR = "config"
-if not osp.exists(CONFIG_DIR):
-    os.mkdir(CONFIG_DIR)
+CONFIG_FILE = osp.join(CONFIG_DIR, "config.toml")
 
 
 @dataclass
-class Config(DataClassTOMLMixin):
+class Config:
     local_dir: Optional[str] = field(default=None)
     ydnote_dir: Optional[str] = field(default=None)
     smms_secret_token: Optional[str] = field(default=None)
     is_relative_path: bool = field(default=True)
+    # 并发下载的线程数，1 为逐个下载
+    max_workers: int = field(default=1)
+    # 目录修改时间未变化时跳过整个目录，不再请求其下的目录列表
+    skip_unchanged_dirs: bool = field(default=False)
+    # 图片/附件按 URL 和内容缓存，重复引用不再下载，相同内容只保存一份（硬链接）
+    resource_cache: bool = field(default=True)
+    # 同时下载笔记中图片/附件的线程数，1 为逐个下载
+    image_workers: int = field(default=4)
+    # 转换笔记为 MarkDown 的进程数，0 为在下载线程中转换
+    convert_processes: int = field(default=0)
+    # 每秒最多请求数，被限流时自动降低、之后逐步恢复，0 为不限制（被限流后才限速）
+    rate_limit: float = field(default=0)
+    # 限流、服务端错误或网络错误时单个请求最多重试次数
+    max_retries: int = field(default=5)
+    # 第一次重试前等待的秒数，之后每次加倍并加随机抖动
+    retry_backoff: float = field(default=1)
+    # 连续失败多少次后暂停所有请求（熔断），0 为不熔断
+    circuit_breaker_threshold: int = field(default=10)
+    # 熔断后暂停的秒数，连续熔断时加倍
+    circuit_breaker_cooldown: float = field(default=30)
+    # 每个主机保持的最大连接数，0 为按 max_workers 与 image_workers 自动设置
+    pool_maxsize: int = field(default=0)
+    # 复用连接（HTTP keep-alive），避免每个请求重新建立 TCP/TLS 连接
+    keep_alive: bool = field(default=True)
+    # 连接超时与读取超时（秒），所有请求均设置超时
+    connect_timeout: float = field(default=10)
+    read_timeout: float = field(default=60)
+    # 批量导出多个账号时，同时导出的账号数
+    max_accounts: int = field(default=4)
+    # 日志级别，DEBUG 时输出跳过的文件、每张图片等逐条信息
+    log_level: str = field(default="INFO")
+    # 另外输出 JSON Lines 格式的结构化日志（logs/*.jsonl）
+    log_json: bool = field(default=False)
+    # 先扫描所有目录统计文件数与大小，下载时定期输出进度、速度与预计剩余时间
+    progress: bool = field(default=False)
+    # 输出进度的间隔秒数
+    progress_interval: float = field(default=5)
 
 
-CONFIG_FILE = osp.join(CONFIG_DIR, "config.toml")
-if not osp.exists(CONFIG_FILE):
-    content = {}
-else:
-    with open(CONFIG_FILE, encoding="utf-8") as fp:
-        content = rtoml.load(fp)
-CONFIG = Config.from_dict(content)
+def load_config(path: str = CONFIG_FILE) -> Config:
+    """
+    读取配置文件，文件不存在时使用默认配置
+    rtoml 与 mashumaro 在此时才导入，导入本模块没有额外开销
+    :param path: config.toml 路径
+    :return: Config
+    """
+    import rtoml
+    from mashumaro.codecs.basic import decode
+
+    if not osp.exists(path):
+        content = {}
+    else:
+        with open(path, encoding="utf-8") as fp:
+            content = rtoml.load(fp)
+    return decode(content, Config)
+
+
+def __getattr__(name: str):
+    # 首次访问 CONFIG 时才读取配置文件
+    if name == "CONFIG":
+        global CONFIG
+        CONFIG = load_config()
+        return CONFIG
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
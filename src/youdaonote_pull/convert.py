@@ -1,18 +1,59 @@
+import io
 import json
 import logging
 import os
 import os.path as osp
 import xml.etree.ElementTree as ET
-from typing import Tuple
+from typing import Callable, Dict, Iterator, Optional, Tuple
 
 MARKDOWN_SUFFIX = ".md"
+XML_NAMESPACE = "{http://note.youdao.com}"
+# XML 笔记块之间的分隔，换行 1 行
+XML_BLOCK_SEPARATOR = "\r\n\r\n"
+
+
+def _xml_handler_name(tag: str) -> str:
+    """去掉命名空间，- 替换为 _，如 {http://note.youdao.com}list-item => list_item"""
+    return tag.replace(XML_NAMESPACE, "").replace("-", "_")
 
 
 class XmlElementConvert:
     """
     XML Element 转换规则
+    convert_{name}_func 在类定义后注册到转换表，也可通过 register 注册自定义转换函数
     """
 
+    # 标签名（见 _xml_handler_name）与转换函数的对应
+    _handlers: Dict[str, Callable] = {}
+    # 元素标签与转换函数的对应，查找时缓存，注册时清空
+    _tag_handlers: Dict[str, Optional[Callable]] = {}
+
+    @classmethod
+    def register(cls, name: str, func: Optional[Callable] = None):
+        """
+        注册块转换函数，未传 func 时作为装饰器使用
+        :param name: 标签名，可带命名空间，如 para、list-item
+        :param func: func(text=, element=, list_item=) -> str
+        :return:
+        """
+
+        def decorator(func):
+            cls._handlers[_xml_handler_name(name)] = func
+            cls._tag_handlers.clear()
+            return func
+
+        return decorator if func is None else decorator(func)
+
+    @classmethod
+    def get_handler(cls, tag: str) -> Optional[Callable]:
+        """根据元素标签获取转换函数，没有时返回 None"""
+        try:
+            return cls._tag_handlers[tag]
+        except KeyError:
+            handler = cls._handlers.get(_xml_handler_name(tag))
+            cls._tag_handlers[tag] = handler
+            return handler
+
     @staticmethod
     def convert_para_func(**kwargs):
         """正常文本（粗体、斜体、删除线、链接）"""
@@ -170,11 +211,42 @@ class XmlElementConvert:
         return original_text
 
 
+for _name in dir(XmlElementConvert):
+    if _name.startswith("convert_") and _name.endswith("_func"):
+        XmlElementConvert.register(
+            _name[len("convert_") : -len("_func")], getattr(XmlElementConvert, _name)
+        )
+
+
 class JsonConvert:
     """
     json 转换规则
+    convert_{type}_func 在类定义后注册到转换表，也可通过 register 注册自定义转换函数
     """
 
+    # 块类型代码与转换函数的对应，转换函数的参数为 (JsonConvert 实例, 块内容)
+    _handlers: Dict[str, Callable[["JsonConvert", dict], str]] = {}
+
+    @classmethod
+    def register(cls, type_code: str, func: Optional[Callable] = None):
+        """
+        注册块转换函数，未传 func 时作为装饰器使用
+        :param type_code: 块类型代码，如 h、im
+        :param func: func(converter, content) -> str
+        :return:
+        """
+
+        def decorator(func):
+            cls._handlers[type_code] = func
+            return func
+
+        return decorator if func is None else decorator(func)
+
+    def convert(self, content: dict) -> str:
+        """根据块类型转换，无类型或类型没有对应转换函数的，只保留文字"""
+        handler = self._handlers.get(content.get("6"), JsonConvert.convert_text_func)
+        return handler(self, content)
+
     def _get_common_text(self, content: dict) -> Tuple[list, str]:
         """获取通常文本
         :return
@@ -345,11 +417,31 @@ class JsonConvert:
         return table_lines
 
 
+for _name in dir(JsonConvert):
+    if _name.startswith("convert_") and _name.endswith("_func"):
+        JsonConvert.register(
+            _name[len("convert_") : -len("_func")], getattr(JsonConvert, _name)
+        )
+
+
 class YoudaoNoteConvert:
     """
     有道云笔记 note 内容转换为 markdown 内容
+    html_to_markdown、xml_to_markdown、json_to_markdown 在内存中转换，不读写文件
     """
 
+    @staticmethod
+    def html_to_markdown(content: bytes) -> str:
+        """
+        转换 HTML 为 MarkDown
+        :param content: 笔记内容
+        :return: MarkDown 内容
+        """
+        from markdownify import markdownify as md
+
+        # 如果换行符丢失，使用 md(content_str.replace('<br>', '<br><br>').replace('</div>', '</div><br><br>')).rstrip()
+        return md(content.decode("utf-8"))
+
     @staticmethod
     def covert_html_to_markdown(file_path):
         """
@@ -358,44 +450,73 @@ class YoudaoNoteConvert:
         :return:
         """
         with open(file_path, "rb") as f:
-            content_str = f.read().decode("utf-8")
-        from markdownify import markdownify as md
-
-        # 如果换行符丢失，使用 md(content_str.replace('<br>', '<br><br>').replace('</div>', '</div><br><br>')).rstrip()
-        new_content = md(content_str)
+            new_content = YoudaoNoteConvert.html_to_markdown(f.read())
         base = osp.splitext(file_path)[0]
         new_file_path = "".join([base, MARKDOWN_SUFFIX])
         os.rename(file_path, new_file_path)
         with open(new_file_path, "wb") as f:
             f.write(new_content.encode())
 
+    @staticmethod
+    def xml_to_markdown(content: bytes) -> str:
+        """
+        转换 XML 为 MarkDown
+        :param content: 笔记内容，为空时返回空字符串
+        :return: MarkDown 内容
+        """
+        if not content:
+            return ""
+        blocks = YoudaoNoteConvert.iter_xml_markdown_blocks(io.BytesIO(content))
+        return XML_BLOCK_SEPARATOR.join(blocks)
+
     @staticmethod
     def _covert_xml_to_markdown_content(file_path):
-        # 使用 xml.etree.ElementTree 将 xml 文件转换为对象
-        element_tree = ET.parse(file_path)
-        note_element = element_tree.getroot()  # note Element
+        blocks = YoudaoNoteConvert.iter_xml_markdown_blocks(file_path)
+        return XML_BLOCK_SEPARATOR.join(blocks)
 
-        # list_item 的 id 与 type 的对应
+    @staticmethod
+    def iter_xml_markdown_blocks(source) -> Iterator[str]:
+        """
+        使用 iterparse 逐块转换 XML 笔记，body 下的元素解析完成即转换并释放，
+        内存占用取决于最大的单个块，而非整个笔记
+        :param source: 文件路径或以二进制模式打开的文件对象
+        :return: 每个块的 MarkDown 内容
+        """
+        # note 下第一个元素为 head，第二个为 body
+        depth = 0
+        section_index = -1
+        section = None
+        # list_item 的 id 与 type 的对应，head 在 body 之前
         list_item = {}
-        for child in note_element[0]:
-            if "list" in child.tag:
-                list_item[child.attrib["id"]] = child.attrib["type"]
+        for event, element in ET.iterparse(source, events=("start", "end")):
+            if event == "start":
+                depth += 1
+                if depth == 2:
+                    section_index += 1
+                    section = element
+                continue
 
-        body_element = note_element[1]  # Element
-        new_content_list = []
-        for element in list(body_element):
-            text = XmlElementConvert.get_text_by_key(list(element))
-            name = element.tag.replace("{http://note.youdao.com}", "").replace("-", "_")
-            convert_func = getattr(
-                XmlElementConvert, "convert_{}_func".format(name), None
-            )
-            # 如果没有转换，只保留文字
-            if not convert_func:
-                new_content_list.append(text)
+            depth -= 1
+            if depth != 2:
                 continue
-            line_content = convert_func(text=text, element=element, list_item=list_item)
-            new_content_list.append(line_content)
-        return "\r\n\r\n".join(new_content_list)  # 换行 1 行
+            if section_index == 0:
+                if "list" in element.tag:
+                    list_item[element.attrib["id"]] = element.attrib["type"]
+            elif section_index == 1:
+                yield YoudaoNoteConvert._covert_xml_element_to_markdown(
+                    element, list_item
+                )
+            # 已处理的块从树中移除
+            section.remove(element)
+
+    @staticmethod
+    def _covert_xml_element_to_markdown(element: ET.Element, list_item: dict) -> str:
+        text = XmlElementConvert.get_text_by_key(list(element))
+        convert_func = XmlElementConvert.get_handler(element.tag)
+        # 如果没有转换，只保留文字
+        if not convert_func:
+            return text
+        return convert_func(text=text, element=element, list_item=list_item)
 
     @staticmethod
     def covert_xml_to_markdown(file_path) -> bool:
@@ -411,15 +532,42 @@ class YoudaoNoteConvert:
             os.rename(file_path, new_file_path)
             return False
 
-        new_content = YoudaoNoteConvert._covert_xml_to_markdown_content(file_path)
-        os.rename(file_path, new_file_path)
-        with open(new_file_path, "wb") as f:
-            f.write(new_content.encode("utf-8"))
+        # 边解析边写入临时文件，完成后替换，解析失败时保留原文件
+        tmp_path = f"{new_file_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+                blocks = YoudaoNoteConvert.iter_xml_markdown_blocks(file_path)
+                for i, block in enumerate(blocks):
+                    if i:
+                        f.write(XML_BLOCK_SEPARATOR)
+                    f.write(block)
+        except BaseException:
+            if osp.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        os.replace(tmp_path, new_file_path)
+        if file_path != new_file_path:
+            os.remove(file_path)
         return True
 
+    @staticmethod
+    def json_to_markdown(content: bytes) -> str:
+        """
+        转换 Json 为 MarkDown
+        :param content: 笔记内容，为空时返回空字符串
+        :return: MarkDown 内容
+        """
+        if not content:
+            return ""
+        try:
+            json_data = json.loads(content.decode("utf-8"))
+        except Exception as e:
+            logging.error(e)
+            json_data = {}
+        return YoudaoNoteConvert._covert_json_data_to_markdown(json_data)
+
     @staticmethod
     def _covert_json_to_markdown_content(file_path):
-        new_content_list = []
         # 加载 json 文件
         with open(file_path, "r", encoding="utf-8") as f:
             try:
@@ -427,22 +575,16 @@ class YoudaoNoteConvert:
             except Exception as e:
                 logging.error(e)
                 json_data = {}
+        return YoudaoNoteConvert._covert_json_data_to_markdown(json_data)
 
+    @staticmethod
+    def _covert_json_data_to_markdown(json_data: dict) -> str:
+        new_content_list = []
+        converter = JsonConvert()
         json_contents = json_data["5"]  # 3 代表 id，4 代表信息，5 代表内容，6 代表类型
         for content in json_contents:
-            type = content.get("6")
             # 根据类型处理，无类型的为普通文本
-            if type:
-                convert_func = getattr(
-                    JsonConvert(), "convert_{}_func".format(type), None
-                )
-                # 如果类型没有对应转换函数，只保留文字
-                if not convert_func:
-                    line_content = JsonConvert().convert_text_func(content)
-                else:
-                    line_content = convert_func(content)
-            else:
-                line_content = JsonConvert().convert_text_func(content)
+            line_content = converter.convert(content)
 
             # 判断是否有内容
             if line_content:
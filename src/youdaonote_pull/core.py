@@ -1,20 +1,35 @@
 import logging
+import multiprocessing
 import os
 import os.path as osp
 import platform
 import re
+import threading
+import time
 import xml.etree.ElementTree as ET
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from contextlib import contextmanager
 from enum import Enum, auto
-from typing import Optional
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Set
 
-from win32_setctime import setctime
-
-from .api import YoudaoNoteSession
+from . import log
+from .api import DEFAULT_POOL_MAXSIZE, AsyncYoudaoNoteSession, YoudaoNoteSession
 from .config import CONFIG
+from .cache import RESOURCE_CACHE_DIR, ResourceCache
 from .convert import YoudaoNoteConvert
+from .download import path_lock, save_content, save_response
 from .image import ImagePull
+from .manifest import MANIFEST_FILE, DirManifestEntry, ManifestEntry, SyncManifest
+from .metrics import METRICS
+from .progress import MB, Progress
+from .ratelimit import CircuitOpenError
+
+if TYPE_CHECKING:
+    import asyncio
 
 MARKDOWN_SUFFIX = ".md"
+# 需要根据内容判断类型的笔记后缀
+NOTE_SUFFIXES = {".note", ".clip", ""}
 
 
 class FileType(Enum):
@@ -30,20 +45,138 @@ class FileActionEnum(Enum):
     UPDATE = auto()
 
 
-SESSION = YoudaoNoteSession()
+# 日志中显示的文件操作
+FILE_ACTION_LABELS = {
+    FileActionEnum.CONTINUE: "跳过",
+    FileActionEnum.ADD: "新增",
+    FileActionEnum.UPDATE: "更新",
+}
+
+
+class PullExecutors:
+    """
+    下载文件的线程池、下载图片/附件的线程池与转换笔记的进程池
+    可在多个 YoudaoNotePull（多个账号）间共享，由创建者负责关闭
+    """
+
+    def __init__(self, max_workers: int, image_workers: int, convert_processes: int):
+        """
+        :param max_workers: 并发下载文件的线程数，1 为在遍历目录的线程中逐个下载
+        :param image_workers: 同时下载图片/附件的线程数，1 为逐个下载
+        :param convert_processes: 转换笔记的进程数，0 为在下载线程中转换
+        """
+        self.max_workers = max(1, max_workers)
+        self.pull = None
+        if self.max_workers > 1:
+            self.pull = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="pull"
+            )
+        # 同一笔记中的图片/附件共用此线程池并发下载
+        self.image = None
+        if image_workers > 1:
+            self.image = ThreadPoolExecutor(
+                max_workers=image_workers, thread_name_prefix="image"
+            )
+        # 笔记转换为 MarkDown 是 CPU 密集型操作，可交给进程池利用多核
+        # 进程池与其日志队列在首次转换时才创建，没有需要转换的笔记时不启动进程
+        self.convert_processes = max(0, convert_processes)
+        self._convert: Optional[ProcessPoolExecutor] = None
+        self._convert_lock = threading.Lock()
+        if self.convert_processes and self.max_workers == 1:
+            logging.warning(
+                "max_workers 为 1 时下载线程需等待转换完成，convert_processes "
+                "只会增加进程间通信的开销，建议将 max_workers 设为大于 1"
+            )
+
+    @property
+    def convert(self) -> Optional[ProcessPoolExecutor]:
+        """转换笔记的进程池，首次使用时创建，convert_processes 为 0 时为 None"""
+        if not self.convert_processes:
+            return None
+        with self._convert_lock:
+            if self._convert is None:
+                # 此时已有日志、下载等线程，fork 会复制其锁与队列的状态，
+                # 因此使用 spawn 创建，子进程的日志经队列交给主进程写入
+                context = multiprocessing.get_context("spawn")
+                self._convert = ProcessPoolExecutor(
+                    max_workers=self.convert_processes,
+                    mp_context=context,
+                    initializer=log.init_process,
+                    initargs=(log.process_queue(context), logging.getLogger().level),
+                )
+            return self._convert
+
+    @classmethod
+    def from_config(cls, config) -> "PullExecutors":
+        return cls(config.max_workers, config.image_workers, config.convert_processes)
+
+    def shutdown(self):
+        for executor in (self.pull, self.image, self._convert):
+            if executor is not None:
+                executor.shutdown()
 
 
 class YoudaoNotePull:
-    def __init__(self):
-        local_dir = CONFIG.local_dir or "youdaonote"
+    def __init__(
+        self,
+        full: bool = False,
+        session: Optional[YoudaoNoteSession] = None,
+        executors: Optional[PullExecutors] = None,
+        local_dir: Optional[str] = None,
+        ydnote_dir: Optional[str] = None,
+        manifest_path: str = MANIFEST_FILE,
+    ):
+        """
+        :param full: 为 True 时忽略同步清单，按本地文件时间重新检查所有文件
+        :param session: 有道云笔记会话，不指定则读取 cookies 创建
+        :param executors: 共享的线程池/进程池，不指定则按 CONFIG 创建，导出结束时关闭
+        :param local_dir: 本地目录，不指定则使用 CONFIG 中的设置
+        :param ydnote_dir: 有道云笔记目录，不指定则使用 CONFIG 中的设置
+        :param manifest_path: 同步清单路径，多个账号需各自使用不同的清单
+        """
+        logging.info("本次使用 Cookies 登录")
+        self.session = session or YoudaoNoteSession()
+
+        local_dir = local_dir or CONFIG.local_dir or "youdaonote"
         if not osp.exists(local_dir):
             os.makedirs(local_dir, exist_ok=True)
         self.root_local_dir = local_dir
 
-        logging.info("本次使用 Cookies 登录")
-
         self.smms_secret_token = CONFIG.smms_secret_token or ""
         self.is_relative_path = CONFIG.is_relative_path
+        self.max_workers = max(1, CONFIG.max_workers)
+        # 下载线程与图片线程同时请求，连接池不小于总线程数，连接才能全部复用
+        self.session.resize_pool(
+            CONFIG.pool_maxsize
+            or max(DEFAULT_POOL_MAXSIZE, self.max_workers + CONFIG.image_workers)
+        )
+
+        self.full = full
+        self.ydnote_dir = ydnote_dir if ydnote_dir is not None else CONFIG.ydnote_dir
+        self.manifest = SyncManifest(
+            scope={"local_dir": local_dir, "ydnote_dir": self.ydnote_dir or ""},
+            path=manifest_path,
+        )
+        self.skip_unchanged_dirs = CONFIG.skip_unchanged_dirs
+        self._own_executors = executors is None
+        self.executors = executors or PullExecutors.from_config(CONFIG)
+        self.image_executor = self.executors.image
+        self.resource_cache = None
+        if CONFIG.resource_cache:
+            self.resource_cache = ResourceCache(osp.join(local_dir, RESOURCE_CACHE_DIR))
+        # 本次遍历的目录记录，子树全部成功后才写入清单
+        self._pending_dirs: Dict[str, DirManifestEntry] = {}
+        self._failed_dirs: Set[str] = set()
+        # 开启时先扫描目录统计文件数与大小，下载时定期输出进度
+        self.progress = None
+        if CONFIG.progress:
+            self.progress = Progress(local_dir, CONFIG.progress_interval)
+
+    @contextmanager
+    def _lock_path(self, local_file_path: str):
+        """锁定本地文件路径，避免同名文件并发写入，与图片/附件共用 download.path_lock"""
+        with path_lock(local_file_path):
+            yield
 
     def _get_ydnote_dir_id(self, ydnote_dir: Optional[str]) -> str:
         """
@@ -51,29 +184,31 @@ class YoudaoNotePull:
         :param ydnote_dir: 指定有道云笔记指定目录
         :return: dir_id, error_msg
         """
-        root_dir_info = SESSION.get_root_dir_info_id()
+        root_dir_info = self.session.get_root_dir_info_id()
         root_dir_id = root_dir_info["fileEntry"]["id"]
 
         # 如果不指定文件夹，取根目录 ID
         if not ydnote_dir:
             return root_dir_id
 
-        dir_info = SESSION.get_dir_info_by_id(root_dir_id)
-        for entry in dir_info["entries"]:
-            file_entry = entry["fileEntry"]
+        for file_entry in self.session.iter_dir_entries(root_dir_id):
             if file_entry["name"] == ydnote_dir:
                 return file_entry["id"]
 
         raise ValueError(f"「有道云笔记」指定目录不存在：{ydnote_dir}")
 
-    def _judge_type(self, file_id, youdao_file_suffix: str) -> FileType:
-        """判断笔记类型"""
+    @staticmethod
+    def _judge_type(youdao_file_suffix: str, content: Optional[bytes]) -> FileType:
+        """
+        判断笔记类型，只根据已下载的内容判断，不发起请求
+        :param youdao_file_suffix: 笔记后缀
+        :param content: 笔记内容，后缀不在 NOTE_SUFFIXES 中时可为 None
+        :return: FileType
+        """
         # 1、如果文件是 .md 类型
         if youdao_file_suffix == MARKDOWN_SUFFIX:
             return FileType.MARKDOWN
-        elif youdao_file_suffix in {".note", ".clip", ""}:
-            response = SESSION.get_file_by_id(file_id)
-            content = response.content
+        elif youdao_file_suffix in NOTE_SUFFIXES and content is not None:
             # 2、如果文件以 `<?xml` 开头
             if content.startswith(b"<?xml"):
                 return FileType.XML
@@ -93,7 +228,9 @@ class YoudaoNotePull:
         # 如果已经存在，判断是否需要更新
         # 如果有道云笔记文件更新时间小于本地文件时间，说明没有更新，则不下载，跳过
         if modify_time <= osp.getmtime(local_file_path):
-            logging.info(f"此文件「{local_file_path}」不更新，跳过")
+            # 增量导出时绝大多数文件在此跳过，只在 DEBUG 级别输出
+            logging.debug("此文件「%s」不更新，跳过", local_file_path)
+            METRICS.incr("files.skipped")
             return FileActionEnum.CONTINUE
 
         # 同一目录存在同名 md 和 note 文件时，后更新文件将覆盖另一个
@@ -114,138 +251,575 @@ class YoudaoNotePull:
         name = del_regex_symbol.sub("", name)
         return name
 
+    def _skip_by_manifest(self, file_id, file_name, local_dir, modify_time) -> bool:
+        """
+        根据同步清单判断文件是否未更新，未更新时不发起请求、也不访问本地文件
+        云端文件在同一目录下重命名时，将本地文件移动到新路径
+        云端笔记移动到其他目录时重新下载：图片/附件使用相对路径时保存在笔记所在目录下，只移动笔记会使链接失效
+        :return: 是否跳过
+        """
+        entry = self.manifest.get(file_id)
+        if entry is None or self.full:
+            return False
+
+        file_name = self._optimize_file_name(file_name)
+        file_type = FileType[entry.file_type]
+        local_file_path = self._get_local_file_path(local_dir, file_name, file_type)
+        if (
+            self.is_relative_path
+            and file_type != FileType.OTHER
+            and osp.dirname(local_file_path) != osp.dirname(entry.path)
+        ):
+            logging.info(
+                "云端已将「%s」移动到「%s」，重新下载，原文件保留",
+                entry.path,
+                local_dir,
+            )
+            return False
+        if local_file_path != entry.path:
+            with self._lock_path(local_file_path):
+                if osp.exists(entry.path) and not osp.exists(local_file_path):
+                    os.replace(entry.path, local_file_path)
+                    logging.info(
+                        f"云端已重命名，将「{entry.path}」移动为「{local_file_path}」"
+                    )
+            entry = ManifestEntry(
+                file_id, entry.modify_time, local_file_path, entry.file_type
+            )
+            self.manifest.update(entry)
+
+        if modify_time != entry.modify_time:
+            return False
+        logging.debug(
+            "此文件「%s」不更新，跳过",
+            local_file_path,
+            extra={"file_id": file_id, "action": "skip", "path": local_file_path},
+        )
+        METRICS.incr("files.skipped")
+        return True
+
+    def _record_dir(
+        self, dir_id, local_dir: str, modify_time, children: list, subdirs: list
+    ):
+        """记录目录的修改时间和直接子项（文件 ID、目录 ID）"""
+        self.manifest.mark_dir_seen(dir_id)
+        if modify_time is None:
+            return
+        self._pending_dirs[dir_id] = DirManifestEntry(
+            dir_id, modify_time, local_dir, children, subdirs
+        )
+
+    def _skip_dir_by_manifest(self, dir_id, local_dir: str, modify_time) -> bool:
+        """
+        skip_unchanged_dirs 开启时，目录修改时间与上次成功同步时相同则跳过整个目录
+        :return: 是否跳过
+        """
+        if not self.skip_unchanged_dirs or self.full or modify_time is None:
+            return False
+        entry = self.manifest.get_dir(dir_id)
+        if entry is None or entry.modify_time != modify_time or entry.path != local_dir:
+            return False
+        self.manifest.mark_dir_seen(dir_id, recursive=True)
+        logging.debug("此目录「%s」不更新，跳过", local_dir)
+        METRICS.incr("dirs.skipped")
+        return True
+
+    def _finish_manifest(self):
+        """完整遍历后，记录子树全部成功的目录，处理云端已删除的文件，并整理清单"""
+        for entry in self._pending_dirs.values():
+            prefix = f"{entry.path}/"
+            if any(d == entry.path or d.startswith(prefix) for d in self._failed_dirs):
+                continue
+            self.manifest.update_dir(entry)
+
+        for entry in self.manifest.missing():
+            logging.info(f"云端已删除「{entry.path}」，本地文件保留")
+            self.manifest.remove(entry.id)
+        self.manifest.compact()
+
     def pull_recursively(self):
         """
         根据目录 ID 循环遍历下载目录下所有文件
+        :return:
+        """
+        with METRICS.timer("phase.find_dir"):
+            dir_id = self._get_ydnote_dir_id(self.ydnote_dir)
+        try:
+            files = None
+            if self.progress is not None:
+                with METRICS.timer("phase.scan"):
+                    files = self._scan(dir_id)
+                self.progress.start()
+            with METRICS.timer("phase.pull"):
+                self._pull(dir_id, files)
+            # 中途出错时遍历不完整，不能据此判断云端删除
+            with METRICS.timer("phase.finish_manifest"):
+                self._finish_manifest()
+        finally:
+            if self.progress is not None:
+                self.progress.stop()
+            self.manifest.close()
+            if self._own_executors:
+                self.executors.shutdown()
+            if self.resource_cache is not None:
+                self.resource_cache.log_stats()
+                self.resource_cache.close()
+
+    def _scan(self, dir_id: str) -> List[tuple]:
+        """
+        预先遍历所有目录，统计需要检查的文件数与总大小（同步清单中未更新的文件不计入）
+        遍历时已处理目录的创建、跳过与记录，返回的文件列表直接作为下载阶段的任务，目录列表只请求一次
+        :return: [(on_file 的位置参数, 文件大小)]
+        """
+        files = []
+
+        def collect(*args, size=0):
+            self.progress.add(size)
+            files.append((args, size))
+
+        self._walk(dir_id, self.root_local_dir, collect)
+        logging.info(
+            "扫描完成，共 %d 个文件需要检查，%.1f MB",
+            self.progress.total_files,
+            self.progress.total_bytes / MB,
+        )
+        return files
+
+    def _feed(self, dir_id: str, files: Optional[List[tuple]], on_file):
+        """将文件交给 on_file：已预先扫描时使用扫描结果，否则边遍历目录边处理"""
+        if files is None:
+            self._walk(dir_id, self.root_local_dir, on_file)
+            return
+        for args, size in files:
+            on_file(*args, size=size)
+
+    def _pull(self, dir_id: str, files: Optional[List[tuple]] = None):
+        """
+        遍历并下载
+        max_workers 大于 1 时，遍历目录的同时将文件交给线程池并发下载
+        :param files: 预先扫描的文件列表，为 None 时遍历目录
+        """
+        executor = self.executors.pull
+        if executor is None:
+            self._feed(dir_id, files, self._add_or_update_file)
+            return
+
+        futures: List[Future] = []
+        errors: List[BaseException] = []
+
+        def on_done(future: Future):
+            if not future.cancelled() and future.exception() is not None:
+                errors.append(future.exception())
+
+        def submit(*args, **kwargs):
+            # 有文件下载出现未处理的异常（如网络错误）时，不再继续提交
+            if errors:
+                raise errors[0]
+            future = executor.submit(self._add_or_update_file, *args, **kwargs)
+            future.add_done_callback(on_done)
+            futures.append(future)
+
+        try:
+            self._feed(dir_id, files, submit)
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+        finally:
+            # 线程池可能由多个账号共享，只等待本次提交的任务
+            wait(futures)
+
+        if errors:
+            raise errors[0]
+
+    def _walk(self, dir_id: Optional[str], local_dir: str, on_file, modify_time=None):
+        """
+        深度优先遍历目录，目录在当前线程创建，文件交给 on_file 处理
         :param dir_id:
         :param local_dir: 本地目录
-        :return: error_msg
+        :param on_file: (file_id, file_name, local_dir, modify_time, create_time, size=文件大小)
+        :param modify_time: 目录修改时间，根目录为 None
+        :return:
         """
-
-        def inner(dir_id: Optional[str], local_dir: str):
-            dir_info = SESSION.get_dir_info_by_id(dir_id)
-            try:
-                entries = dir_info["entries"]
-            except KeyError:
-                raise RuntimeError(
-                    "有道云笔记修改了接口地址，此脚本暂时不能使用！请提 issue"
+        # 边分页获取边处理，不等待整个目录列表
+        children, subdirs = [], []
+        for file_entry in self.session.iter_dir_entries(dir_id):
+            id = file_entry["id"]
+            name = file_entry["name"]
+            (subdirs if file_entry["dir"] else children).append(id)
+            if file_entry["dir"]:
+                sub_dir = osp.join(local_dir, name).replace("\\", "/")
+                if not osp.exists(sub_dir):
+                    os.mkdir(sub_dir)
+                dir_modify_time = file_entry.get("modifyTimeForSort")
+                if self._skip_dir_by_manifest(id, sub_dir, dir_modify_time):
+                    continue
+                self._walk(id, sub_dir, on_file, dir_modify_time)
+            else:
+                file_modify_time = file_entry["modifyTimeForSort"]
+                create_time = file_entry["createTimeForSort"]
+                self.manifest.mark_seen(id)
+                if self._skip_by_manifest(id, name, local_dir, file_modify_time):
+                    continue
+                on_file(
+                    id,
+                    name,
+                    local_dir,
+                    file_modify_time,
+                    create_time,
+                    size=file_entry.get("fileSize") or 0,
                 )
 
-            for entry in entries:
-                file_entry = entry["fileEntry"]
-                id = file_entry["id"]
-                name = file_entry["name"]
-                if file_entry["dir"]:
-                    sub_dir = osp.join(local_dir, name).replace("\\", "/")
-                    if not osp.exists(sub_dir):
-                        os.mkdir(sub_dir)
-                    inner(id, sub_dir)
-                else:
-                    modify_time = file_entry["modifyTimeForSort"]
-                    create_time = file_entry["createTimeForSort"]
-                    self._add_or_update_file(
-                        id, name, local_dir, modify_time, create_time
-                    )
+        self._record_dir(dir_id, local_dir, modify_time, children, subdirs)
 
-        dir_id = self._get_ydnote_dir_id(CONFIG.ydnote_dir)
-        inner(dir_id, self.root_local_dir)
+    @staticmethod
+    def _get_local_file_path(local_dir: str, file_name: str, file_type: FileType):
+        """获取本地文件路径，「文档」类型本地文件均以 .md 结尾"""
+        if file_type != FileType.OTHER:
+            name, _ = osp.splitext(file_name)
+            file_name = f"{name}{MARKDOWN_SUFFIX}"
+        return osp.join(local_dir, file_name).replace("\\", "/")
 
     def _add_or_update_file(
-        self, file_id, file_name, local_dir, modify_time, create_time
+        self,
+        file_id,
+        file_name,
+        local_dir,
+        modify_time,
+        create_time,
+        content: Optional[bytes] = None,
+        size: int = 0,
     ):
-        file_name = self._optimize_file_name(file_name)
-        youdao_file_suffix = osp.splitext(file_name)[1]  # 笔记后缀
-        original_file_path = osp.join(local_dir, file_name).replace(
-            "\\", "/"
-        )  # 原后缀路径
-
-        # 所有类型文件均下载，不做处理
-        file_type = self._judge_type(file_id, youdao_file_suffix)
-
-        # 「文档」类型本地文件均已 .md 结尾
-        if file_type == FileType.OTHER:
-            local_file_path = original_file_path
-        else:
-            name, _ = osp.splitext(file_name)
-            local_file_path = osp.join(local_dir, f"{name}{MARKDOWN_SUFFIX}").replace(
+        """
+        新增或更新文件
+        :param content: 已下载的文件内容，为 None 时按需下载
+        :param size: 云端文件大小，用于统计进度
+        """
+        try:
+            file_name = self._optimize_file_name(file_name)
+            youdao_file_suffix = osp.splitext(file_name)[1]  # 笔记后缀
+            original_file_path = osp.join(local_dir, file_name).replace(
                 "\\", "/"
-            )
+            )  # 原后缀路径
+
+            # 「笔记」类型需要根据内容判断格式，先下载一次，后续写入复用同一份内容
+            if content is None and youdao_file_suffix in NOTE_SUFFIXES:
+                start = time.perf_counter()
+                try:
+                    content = self.session.get_file_by_id(file_id).content
+                except CircuitOpenError:
+                    raise
+                except Exception as error:
+                    self._file_failed(
+                        file_id, local_dir, original_file_path, "下载", error, start
+                    )
+                    return
 
-        # 如果有有道云笔记是「文档」类型，则提示类型
-        tip = ""
-        if file_type != FileType.OTHER:
-            tip = f"，云笔记原格式为 {file_type.name}"
+            # 所有类型文件均下载，不做处理
+            file_type = self._judge_type(youdao_file_suffix, content)
+            local_file_path = self._get_local_file_path(local_dir, file_name, file_type)
 
-        file_action = self._get_file_action(local_file_path, modify_time)
-        if file_action == FileActionEnum.CONTINUE:
-            return
-        if file_action == FileActionEnum.UPDATE:
-            # 考虑到使用 f.write() 直接覆盖原文件，在 Windows 下报错（WinError 183），先将其删除
-            os.remove(local_file_path)
-        try:
-            self._pull_file(
-                file_id,
-                original_file_path,
-                local_file_path,
-                file_type,
-                youdao_file_suffix,
-            )
-            if file_action == FileActionEnum.CONTINUE:
-                logging.debug(
-                    "{}「{}」{}".format(file_action.value, local_file_path, tip)
-                )
-            else:
-                logging.info(
-                    "{}「{}」{}".format(file_action.value, local_file_path, tip)
+            # 如果有有道云笔记是「文档」类型，则提示类型
+            tip = ""
+            if file_type != FileType.OTHER:
+                tip = f"，云笔记原格式为 {file_type.name}"
+
+            # 并发时同名文件（如同一目录下的 a.md 和 a.note）串行处理
+            with self._lock_path(local_file_path):
+                entry = ManifestEntry(
+                    file_id, modify_time, local_file_path, file_type.name
                 )
+                file_action = self._get_file_action(local_file_path, modify_time)
+                if file_action == FileActionEnum.CONTINUE:
+                    self.manifest.update(entry)
+                    return
+                # 文件均在写入完成后原子替换，更新失败时保留原文件
+                start = time.perf_counter()
+                try:
+                    written = self._pull_file(
+                        file_id,
+                        content,
+                        original_file_path,
+                        local_file_path,
+                        file_type,
+                    )
+                    logging.info(
+                        "%s「%s」%s",
+                        FILE_ACTION_LABELS[file_action],
+                        local_file_path,
+                        tip,
+                        extra={
+                            "file_id": file_id,
+                            "action": file_action.name.lower(),
+                            "path": local_file_path,
+                            "bytes": written,
+                            "duration": round(time.perf_counter() - start, 3),
+                        },
+                    )
 
-            # 本地文件时间设置为有道云笔记的时间
-            if platform.system() == "Windows":
-                setctime(local_file_path, create_time)
-            else:
-                os.utime(local_file_path, (create_time, modify_time))
+                    # 本地文件时间设置为有道云笔记的时间
+                    if platform.system() == "Windows":
+                        from win32_setctime import setctime
+
+                        setctime(local_file_path, create_time)
+                    else:
+                        os.utime(local_file_path, (create_time, modify_time))
+                    self.manifest.update(entry)
+                    METRICS.incr(f"files.{file_action.name.lower()}")
+
+                except CircuitOpenError:
+                    # 多次熔断后服务仍不可用，终止导出
+                    raise
+                except Exception as error:
+                    self._file_failed(
+                        file_id,
+                        local_dir,
+                        original_file_path,
+                        FILE_ACTION_LABELS[file_action],
+                        error,
+                        start,
+                    )
+        finally:
+            if self.progress is not None:
+                self.progress.advance(size)
 
-        except Exception as error:
-            logging.info(
-                "{}「{}」可能失败！请检查文件！错误提示：{}".format(
-                    file_action.value, original_file_path, format(error)
-                )
-            )
+    def _file_failed(self, file_id, local_dir, file_path, label, error, start):
+        """
+        记录单个文件失败，所在目录本次不写入清单，继续处理其他文件
+        :param label: 失败的操作，如「下载」「新增」
+        :param start: 开始处理的时间（time.perf_counter）
+        """
+        self._failed_dirs.add(local_dir)
+        METRICS.incr("files.failed")
+        logging.warning(
+            "%s「%s」可能失败！请检查文件！错误提示：%s",
+            label,
+            file_path,
+            error,
+            extra={
+                "file_id": file_id,
+                "action": "failed",
+                "path": file_path,
+                "duration": round(time.perf_counter() - start, 3),
+            },
+        )
+
+    def _convert(self, convert_func: Callable[[bytes], str], content: bytes) -> str:
+        """
+        转换笔记内容，启用转换进程池时交给其他进程执行，当前线程等待结果期间其他线程可继续下载
+        :param convert_func: YoudaoNoteConvert 中的转换函数，需可被 pickle
+        :param content: 笔记内容
+        :return: MarkDown 内容
+        """
+        convert_executor = self.executors.convert
+        if convert_executor is None:
+            return convert_func(content)
+        return convert_executor.submit(convert_func, content).result()
 
     def _pull_file(
-        self, file_id, file_path, local_file_path, file_type, youdao_file_suffix
+        self,
+        file_id,
+        content: Optional[bytes],
+        file_path,
+        local_file_path,
+        file_type,
     ):
         """
         下载文件
+        「文档」类型在内存中完成下载、转换和链接迁移，只写入一次
         :param file_id:
+        :param content: 已下载的文件内容，为 None 时按需下载
         :param file_path:
         :param local_file_path: 本地
         :param file_type:
-        :param youdao_file_suffix:
-        :return:
+        :return: 写入的字节数
         """
-        # 1、所有的都先下载
-        response = SESSION.get_file_by_id(file_id)
-        with open(file_path, "wb") as f:
-            f.write(response.content)  # response.content 本身就是字节类型
+        # 1、其他类型文件不做处理，未下载的（附件等）流式写入，不占用与文件大小相当的内存
+        if file_type == FileType.OTHER:
+            if content is None:
+                return save_response(
+                    self.session.get_file_by_id(file_id, stream=True), file_path
+                )
+            save_content(content, file_path)
+            return len(content)
+
+        if content is None:
+            content = self.session.get_file_by_id(file_id).content
 
         # 2、如果文件是 note 类型，将其转换为 MarkDown 类型
+        with METRICS.timer(f"convert.{file_type.name.lower()}"):
+            text = self._convert_content(file_type, content)
+
+        # 3、迁移文本文件里面的有道云笔记图片（链接）
+        imagePull = ImagePull(
+            self.session,
+            self.smms_secret_token,
+            self.is_relative_path,
+            self.resource_cache,
+            self.image_executor,
+        )
+        with METRICS.timer("migrate_links"):
+            text = imagePull.migration_ydnote_content(text, local_file_path)
+        data = text.encode("utf-8")
+        save_content(data, local_file_path)
+        return len(data)
+
+    def _convert_content(self, file_type: FileType, content: bytes) -> str:
+        """按笔记类型转换为 MarkDown 内容"""
         if file_type == FileType.XML:
             try:
-                YoudaoNoteConvert.covert_xml_to_markdown(file_path)
+                text = self._convert(YoudaoNoteConvert.xml_to_markdown, content)
             except ET.ParseError:
                 logging.info(
                     "此 note 笔记应该为 17 年以前新建，格式为 html，将转换为 Markdown ..."
                 )
-                YoudaoNoteConvert.covert_html_to_markdown(file_path)
+                text = self._convert(YoudaoNoteConvert.html_to_markdown, content)
             except Exception as e:
-                logging.info("note 笔记转换 MarkDown 失败，将跳过", repr(e))
+                logging.warning("note 笔记转换 MarkDown 失败！错误提示：%r", e)
+                raise
         elif file_type == FileType.JSON:
-            YoudaoNoteConvert.covert_json_to_markdown(file_path)
+            text = self._convert(YoudaoNoteConvert.json_to_markdown, content)
+        else:
+            text = content.decode("utf-8")
+        return text
+
+
+class AsyncYoudaoNotePull(YoudaoNotePull):
+    """
+    基于 asyncio 的拉取：目录列表与笔记下载由 AsyncYoudaoNoteSession 并发请求，
+    max_workers 为同时进行的请求数；格式转换、图片迁移等仍在线程中执行
+    """
+
+    def _pull(self, dir_id: str, files: Optional[List[tuple]] = None):
+        # 只在异步模式下导入 asyncio
+        import asyncio
+
+        asyncio.run(self._pull_async(dir_id, files))
+
+    async def _pull_async(self, dir_id: str, files: Optional[List[tuple]] = None):
+        import asyncio
+
+        # 与同步会话使用同一账号的 cookies 和限速、熔断状态
+        async with AsyncYoudaoNoteSession(
+            self.session.cookies_path,
+            limit=self.max_workers,
+            retry_policy=self.session.retry_policy,
+        ) as session:
+            semaphore = asyncio.Semaphore(self.max_workers)
+            if files is None:
+                await self._walk_async(session, semaphore, dir_id, self.root_local_dir)
+                return
+            # 已预先扫描，直接下载扫描到的文件
+            await asyncio.gather(
+                *(
+                    self._add_or_update_file_async(session, semaphore, *args, size=size)
+                    for args, size in files
+                )
+            )
 
-        # 3、迁移文本文件里面的有道云笔记图片（链接）
-        if file_type != FileType.OTHER or youdao_file_suffix == MARKDOWN_SUFFIX:
-            imagePull = ImagePull(
-                SESSION, self.smms_secret_token, self.is_relative_path
+    async def _walk_async(
+        self,
+        session: AsyncYoudaoNoteSession,
+        semaphore: "asyncio.Semaphore",
+        dir_id: Optional[str],
+        local_dir: str,
+        modify_time=None,
+    ):
+        import asyncio
+
+        # 每取到一页即开始下载，子目录与文件的任务立即调度
+        children, subdirs = [], []
+        tasks = []
+        async for file_entry in session.iter_dir_entries(dir_id):
+            id = file_entry["id"]
+            name = file_entry["name"]
+            (subdirs if file_entry["dir"] else children).append(id)
+            if file_entry["dir"]:
+                sub_dir = osp.join(local_dir, name).replace("\\", "/")
+                if not osp.exists(sub_dir):
+                    os.mkdir(sub_dir)
+                dir_modify_time = file_entry.get("modifyTimeForSort")
+                if self._skip_dir_by_manifest(id, sub_dir, dir_modify_time):
+                    continue
+                task = self._walk_async(
+                    session, semaphore, id, sub_dir, dir_modify_time
+                )
+                tasks.append(asyncio.ensure_future(task))
+            else:
+                self.manifest.mark_seen(id)
+                if self._skip_by_manifest(
+                    id, name, local_dir, file_entry["modifyTimeForSort"]
+                ):
+                    continue
+                task = self._add_or_update_file_async(
+                    session,
+                    semaphore,
+                    id,
+                    name,
+                    local_dir,
+                    file_entry["modifyTimeForSort"],
+                    file_entry["createTimeForSort"],
+                    size=file_entry.get("fileSize") or 0,
+                )
+                tasks.append(asyncio.ensure_future(task))
+        await asyncio.gather(*tasks)
+        self._record_dir(dir_id, local_dir, modify_time, children, subdirs)
+
+    async def _add_or_update_file_async(
+        self,
+        session: AsyncYoudaoNoteSession,
+        semaphore: "asyncio.Semaphore",
+        file_id,
+        file_name,
+        local_dir,
+        modify_time,
+        create_time,
+        size: int = 0,
+    ):
+        """异步下载笔记内容，再交给 _add_or_update_file 写入"""
+        import asyncio
+
+        optimized_name = self._optimize_file_name(file_name)
+        youdao_file_suffix = osp.splitext(optimized_name)[1]
+
+        content = None
+        if youdao_file_suffix in NOTE_SUFFIXES:
+            start = time.perf_counter()
+            try:
+                async with semaphore:
+                    content = await session.get_file_by_id(file_id)
+            except CircuitOpenError:
+                raise
+            except Exception as error:
+                file_path = osp.join(local_dir, optimized_name).replace("\\", "/")
+                self._file_failed(file_id, local_dir, file_path, "下载", error, start)
+                if self.progress is not None:
+                    self.progress.advance(size)
+                return
+        else:
+            # 非笔记类型不需要内容即可确定本地路径，未更新的跳过下载
+            # 需要下载的在线程中流式写入磁盘，避免大附件整个读入内存
+            file_type = self._judge_type(youdao_file_suffix, None)
+            local_file_path = self._get_local_file_path(
+                local_dir, optimized_name, file_type
             )
-            imagePull.migration_ydnote_url(local_file_path)
+            entry = ManifestEntry(file_id, modify_time, local_file_path, file_type.name)
+            file_action = self._get_file_action(local_file_path, modify_time)
+            if file_action == FileActionEnum.CONTINUE:
+                self.manifest.update(entry)
+                if self.progress is not None:
+                    self.progress.advance(size)
+                return
+
+        # 与同步模式一样在共享的下载线程池中写入，多个账号共用同一组线程
+        await asyncio.get_running_loop().run_in_executor(
+            self.executors.pull,
+            self._add_or_update_file,
+            file_id,
+            file_name,
+            local_dir,
+            modify_time,
+            create_time,
+            content,
+            size,
+        )
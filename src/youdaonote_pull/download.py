@@ -0,0 +1,276 @@
+import hashlib
+import json
+import logging
+import os
+import os.path as osp
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from requests import Response
+
+from .metrics import METRICS
+
+# 流式下载每次读取的大小
+CHUNK_SIZE = 64 * 1024
+# 写入中的临时文件后缀
+TMP_SUFFIX = ".tmp"
+# 可续传下载的未完成文件后缀
+PART_SUFFIX = ".part"
+# 不小于此大小（Content-Length）的文件才可续传，小文件重新下载的代价低于记录续传信息
+RESUMABLE_MIN_SIZE = 1024 * 1024
+
+
+class _PathLock:
+    """一个本地路径的写入锁，users 为持有与等待此锁的次数"""
+
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.users = 0
+
+
+# 本地路径与其写入锁的对应，进程内所有下载线程共用，无人使用时删除，不随导出的文件数增长
+_path_locks: Dict[str, _PathLock] = {}
+_path_locks_guard = threading.Lock()
+
+
+@contextmanager
+def path_lock(file_path: str):
+    """
+    锁定本地文件路径，同一路径同时只允许一个线程写入
+    多篇笔记引用同一图片/附件时会写入同一路径，共用 .tmp、.part 临时文件，需串行
+    同一线程可重复锁定
+    """
+    with _path_locks_guard:
+        entry = _path_locks.get(file_path)
+        if entry is None:
+            entry = _path_locks[file_path] = _PathLock()
+        entry.users += 1
+    try:
+        with entry.lock:
+            yield
+    finally:
+        with _path_locks_guard:
+            entry.users -= 1
+            if not entry.users:
+                del _path_locks[file_path]
+
+
+def save_response(response: Response, file_path: str, chunk_size=CHUNK_SIZE) -> int:
+    """
+    流式保存响应内容，内存占用与文件大小无关
+    先写入临时文件，完成后原子替换，写入失败不会覆盖已有文件
+    :param response: 以 stream=True 请求的响应
+    :param file_path: 保存路径
+    :param chunk_size:
+    :return: 写入的字节数
+    """
+    tmp_path = f"{file_path}{TMP_SUFFIX}"
+    size = 0
+    with path_lock(file_path):
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size):
+                    f.write(chunk)
+                    size += len(chunk)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            if osp.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        finally:
+            response.close()
+    METRICS.incr("bytes.downloaded", size)
+    return size
+
+
+def save_content(content: bytes, file_path: str):
+    """
+    保存已下载的内容，同样先写入临时文件再原子替换
+    :param content:
+    :param file_path:
+    :return:
+    """
+    tmp_path = f"{file_path}{TMP_SUFFIX}"
+    with path_lock(file_path):
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            if osp.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+def read_json_lines(path: str) -> List[dict]:
+    """
+    读取只追加写入的 JSON Lines 文件
+    写入中断时最后一行可能不完整，跳过无法解析的行并重写文件，使之后追加的行仍各占一行
+    :param path: 文件路径，须已存在
+    :return: 各行解析后的内容
+    """
+    with open(path, encoding="utf-8", errors="replace") as fp:
+        text = fp.read()
+    rows, lines, torn = [], [], False
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        try:
+            rows.append(json.loads(line))
+        except ValueError:
+            logging.warning("「%s」中有不完整的行，已丢弃：%.80s", path, line)
+            torn = True
+            continue
+        lines.append(line)
+    if torn or (text and not text.endswith("\n")):
+        save_content("".join(f"{line}\n" for line in lines).encode("utf-8"), path)
+    return rows
+
+
+def _part_info_path(file_dir: str, url: str) -> str:
+    """续传信息文件，以 URL 的摘要命名，请求前即可按 URL 找到"""
+    digest = hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+    return osp.join(file_dir, f".{digest}{PART_SUFFIX}.json")
+
+
+def _load_part_info(info_path: str) -> Optional[dict]:
+    if not osp.exists(info_path):
+        return None
+    try:
+        with open(info_path, encoding="utf-8") as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return None
+
+
+def _remove_part(part_path: str, info_path: str):
+    for path in (part_path, info_path):
+        if osp.exists(path):
+            os.remove(path)
+
+
+def partial_download_path(file_dir: str, url: str) -> Optional[str]:
+    """
+    查找 url 在 file_dir 中上次中断、未下载完的文件
+    :param file_dir: 保存文件的目录
+    :param url: 请求的 URL
+    :return: 保存路径，没有可续传的文件时为 None
+    """
+    part_info = _load_part_info(_part_info_path(file_dir, url))
+    if not part_info or part_info.get("url") != url:
+        return None
+    file_path = osp.join(file_dir, part_info["name"]).replace("\\", "/")
+    part_path = f"{file_path}{PART_SUFFIX}"
+    if (
+        not osp.exists(part_path)
+        or not 0 < osp.getsize(part_path) < part_info["length"]
+    ):
+        return None
+    return file_path
+
+
+def _write_part(
+    url: str, response: Response, file_path: str, length: int, offset: int, chunk_size
+) -> int:
+    """将响应内容写入 .part 文件（offset 不为 0 时追加），大小与 length 相符后替换为 file_path"""
+    part_path = f"{file_path}{PART_SUFFIX}"
+    info_path = _part_info_path(osp.dirname(file_path), url)
+    size = 0
+    try:
+        with open(part_path, "ab" if offset else "wb") as f:
+            for chunk in response.iter_content(chunk_size):
+                f.write(chunk)
+                size += len(chunk)
+    finally:
+        # 中断时保留 .part 文件，下次继续
+        response.close()
+        METRICS.incr("bytes.downloaded", size)
+
+    if osp.getsize(part_path) != length:
+        _remove_part(part_path, info_path)
+        raise IOError(f"「{url}」下载的文件大小与预期（{length}）不符")
+    os.replace(part_path, file_path)
+    os.remove(info_path)
+    return size
+
+
+def save_response_resumable(
+    url: str, response: Response, file_path: str, chunk_size=CHUNK_SIZE
+) -> int:
+    """
+    保存响应内容，大文件可断点续传
+    Content-Length 不小于 RESUMABLE_MIN_SIZE 时，下载中的内容保存在 .part 文件中，
+    同目录下以 URL 摘要命名的 .part.json 记录 URL、文件名、文件大小和校验信息（ETag / Last-Modified），
+    中断后由 resume_download 从已下载的位置继续；其他文件同 save_response
+    :param url: 请求的 URL
+    :param response: 以 stream=True 请求 url 的完整响应
+    :param file_path: 保存路径
+    :param chunk_size:
+    :return: 本次写入的字节数
+    """
+    headers = response.headers
+    length = int(headers["Content-Length"]) if "Content-Length" in headers else None
+    # 压缩传输时 Content-Length 与解压后的大小不符，也无法按字节续传
+    if (
+        length is None
+        or length < RESUMABLE_MIN_SIZE
+        or headers.get("Content-Encoding", "identity") != "identity"
+    ):
+        return save_response(response, file_path, chunk_size)
+
+    # 同一路径的 .part、.part.json 同时只由一个线程读写
+    with path_lock(file_path):
+        part_info = {
+            "url": url,
+            "name": osp.basename(file_path),
+            "length": length,
+            "validator": headers.get("ETag") or headers.get("Last-Modified"),
+        }
+        with open(
+            _part_info_path(osp.dirname(file_path), url), "w", encoding="utf-8"
+        ) as fp:
+            json.dump(part_info, fp)
+        return _write_part(url, response, file_path, length, 0, chunk_size)
+
+
+def resume_download(
+    youdaonote_api, url: str, file_path: str, chunk_size=CHUNK_SIZE
+) -> Optional[int]:
+    """
+    直接发送 Range 请求，继续下载 partial_download_path 找到的文件，不再先请求完整内容
+    服务器不支持 Range 或内容已变化时返回完整内容，从头写入
+    :param youdaonote_api: 需支持 http_get(url, stream, headers)
+    :param url: 请求的 URL
+    :param file_path: partial_download_path 返回的保存路径
+    :param chunk_size:
+    :return: 本次写入的字节数；已没有可续传的部分或请求失败时为 None，需重新下载
+    """
+    with path_lock(file_path):
+        # 等待锁期间其他线程可能已下载完成
+        file_dir = osp.dirname(file_path)
+        if partial_download_path(file_dir, url) != file_path:
+            return None
+        part_path = f"{file_path}{PART_SUFFIX}"
+        info_path = _part_info_path(file_dir, url)
+        part_info = _load_part_info(info_path)
+        offset = osp.getsize(part_path)
+        range_headers = {"Range": f"bytes={offset}-"}
+        if part_info["validator"]:
+            range_headers["If-Range"] = part_info["validator"]
+        response = youdaonote_api.http_get(url, stream=True, headers=range_headers)
+
+        content_range = response.headers.get("Content-Range", "")
+        if response.status_code == 206 and content_range.startswith(f"bytes {offset}-"):
+            return _write_part(
+                url, response, file_path, part_info["length"], offset, chunk_size
+            )
+        if response.status_code == 200:
+            # 不支持 Range 或内容已变化，响应为完整内容
+            _remove_part(part_path, info_path)
+            return save_response_resumable(url, response, file_path, chunk_size)
+        response.close()
+        _remove_part(part_path, info_path)
+        return None
@@ -1,12 +1,25 @@
 import logging
 import os
 import re
-from typing import Tuple
+import threading
+from concurrent.futures import Executor
+from typing import Optional, Tuple
 from urllib import parse
 from urllib.parse import urlparse
 
 import requests
 
+from .api import config_timeout, create_session
+from .cache import ResourceCache
+from .config import CONFIG
+from .download import (
+    partial_download_path,
+    path_lock,
+    resume_download,
+    save_response_resumable,
+)
+from .metrics import METRICS
+
 REGEX_IMAGE_URL = re.compile(r"!\[.*?\]\((.*?note\.youdao\.com.*?)\)")
 REGEX_ATTACH = re.compile(r"\[(.*?)\]\(((http|https)://note\.youdao\.com.*?)\)")
 # 有道云笔记的图片地址
@@ -21,10 +34,18 @@ class ImagePull:
         youdaonote_api,
         smms_secret_token: str,
         is_relative_path: bool,
+        resource_cache: Optional[ResourceCache] = None,
+        executor: Optional[Executor] = None,
     ):
+        """
+        :param resource_cache: 图片/附件缓存
+        :param executor: 并发下载同一笔记中图片/附件的线程池，为 None 时逐个下载
+        """
         self.youdaonote_api = youdaonote_api
         self.smms_secret_token = smms_secret_token
         self.is_relative_path = is_relative_path
+        self.resource_cache = resource_cache
+        self.executor = executor
 
     @classmethod
     def _url_encode(cls, file_path: str):
@@ -36,7 +57,7 @@ class ImagePull:
 
     def migration_ydnote_url(self, file_path):
         """
-        迁移有道云笔记文件 URL
+        迁移有道云笔记文件 URL，文件只读写一次
         :param file_path:
         :return:
         """
@@ -44,53 +65,96 @@ class ImagePull:
         # 文件内容为空，也下载到本地
         with open(file_path, "rb") as f:
             content = f.read().decode("utf-8")
+        new_content = self.migration_ydnote_content(content, file_path)
+        if new_content == content:
+            return
+        with open(file_path, "wb") as f:
+            f.write(new_content.encode())
+        return
 
-        # 图片
-        image_urls = REGEX_IMAGE_URL.findall(content)
+    def migration_ydnote_content(self, content: str, file_path) -> str:
+        """
+        迁移笔记内容中的有道云笔记 URL，不读写笔记文件
+        先收集并下载全部图片、附件链接（有线程池时并发下载），再一次性替换
+        :param content: 笔记内容
+        :param file_path: 笔记的本地路径，图片/附件保存在其所在目录下
+        :return: 替换后的内容
+        """
+        # 图片，同一链接只处理一次
+        image_urls = list(dict.fromkeys(REGEX_IMAGE_URL.findall(content)))
         if len(image_urls) > 0:
-            logging.info(
-                "正在转换有道云笔记「{}」中的有道云图片链接...".format(file_path)
-            )
-        for image_url in image_urls:
-            try:
-                image_path = self._get_new_image_path(file_path, image_url)
-            except Exception as error:
-                logging.info(
-                    "下载图片「{}」可能失败！请检查图片！错误提示：{}".format(
-                        image_url, format(error)
-                    )
-                )
-            if image_url == image_path:
-                continue
-            # 将绝对路径替换为相对路径，实现满足 Obsidian 格式要求
-            # 将 image_path 路径中 images 之前的路径去掉，只保留以 images 开头的之后的路径
-            if self.is_relative_path and not self.smms_secret_token:
-                image_path = image_path[image_path.find(IMAGES) :]
-
-            image_path = self._url_encode(image_path)
-            content = content.replace(image_url, image_path)
-
-        # 附件
-        attach_name_and_url_list = REGEX_ATTACH.findall(content)
-        if len(attach_name_and_url_list) > 0:
-            logging.info(
-                "正在转换有道云笔记「{}」中的有道云附件链接...".format(file_path)
-            )
-        for attach_name_and_url in attach_name_and_url_list:
-            attach_url = attach_name_and_url[1]
-            attach_path = self._download_ydnote_url(
-                file_path, attach_url, attach_name_and_url[0]
+            logging.debug("正在转换有道云笔记「%s」中的有道云图片链接...", file_path)
+
+        # 附件，图片链接也符合附件的格式，需排除
+        attach_urls = {}
+        image_url_set = set(image_urls)
+        for attach_name, attach_url, _ in REGEX_ATTACH.findall(content):
+            if attach_url not in image_url_set:
+                attach_urls.setdefault(attach_url, attach_name)
+        if len(attach_urls) > 0:
+            logging.debug("正在转换有道云笔记「%s」中的有道云附件链接...", file_path)
+
+        def resolve(url):
+            if url in attach_urls:
+                return self._resolve_attach_url(file_path, url, attach_urls[url])
+            return self._resolve_image_url(file_path, url)
+
+        urls = image_urls + list(attach_urls)
+        if self.executor is None:
+            paths = map(resolve, urls)
+        else:
+            paths = self.executor.map(resolve, urls)
+        replacements = {url: path for url, path in zip(urls, paths) if path}
+
+        if not replacements:
+            return content
+        return self._replace_urls(content, replacements)
+
+    @staticmethod
+    def _replace_urls(content: str, replacements: dict) -> str:
+        """一次扫描替换全部链接，较长的链接优先匹配"""
+        urls = sorted(replacements, key=len, reverse=True)
+        pattern = re.compile("|".join(re.escape(url) for url in urls))
+        return pattern.sub(lambda match: replacements[match.group(0)], content)
+
+    def _resolve_image_url(self, file_path, image_url) -> str:
+        """
+        下载或上传图片，返回替换后的链接，失败时返回空字符串
+        :param file_path:
+        :param image_url:
+        :return:
+        """
+        try:
+            image_path = self._get_new_image_path(file_path, image_url)
+        except Exception as error:
+            logging.warning(
+                "下载图片「%s」可能失败！请检查图片！错误提示：%s", image_url, error
             )
-            if not attach_path:
-                continue
-            # 将 attach_path 路径中 attachments 之前的路径去掉，只保留以 attachments 开头的之后的路径
-            if self.is_relative_path:
-                attach_path = attach_path[attach_path.find(ATTACH) :]
-            content = content.replace(attach_url, attach_path)
+            return ""
+        if image_url == image_path:
+            return ""
+        # 将绝对路径替换为相对路径，实现满足 Obsidian 格式要求
+        # 将 image_path 路径中 images 之前的路径去掉，只保留以 images 开头的之后的路径
+        if self.is_relative_path and not self.smms_secret_token:
+            image_path = image_path[image_path.find(IMAGES) :]
 
-        with open(file_path, "wb") as f:
-            f.write(content.encode())
-        return
+        return self._url_encode(image_path)
+
+    def _resolve_attach_url(self, file_path, attach_url, attach_name) -> str:
+        """
+        下载附件，返回替换后的链接，失败时返回空字符串
+        :param file_path:
+        :param attach_url:
+        :param attach_name:
+        :return:
+        """
+        attach_path = self._download_ydnote_url(file_path, attach_url, attach_name)
+        if not attach_path:
+            return ""
+        # 将 attach_path 路径中 attachments 之前的路径去掉，只保留以 attachments 开头的之后的路径
+        if self.is_relative_path:
+            attach_path = attach_path[attach_path.find(ATTACH) :]
+        return attach_path
 
     def _get_new_image_path(self, file_path, image_url) -> str:
         """
@@ -113,7 +177,7 @@ class ImagePull:
         # 如果上传失败，仍下载到本地
         if not error_msg:
             return new_file_url
-        logging.info(error_msg)
+        logging.warning(error_msg)
         image_path = self._download_ydnote_url(file_path, image_url)
         return image_path or image_url
 
@@ -125,31 +189,64 @@ class ImagePull:
         :param attach_name:
         :return:  path
         """
+        file_type = "附件" if attach_name else "图片"
+        # 默认下载附件到 attachments 文件夹，图片到 images 文件夹
+        file_dirname = ATTACH if attach_name else IMAGES
+        with METRICS.timer(f"{file_dirname}.download"):
+            return self._download_to_dir(
+                file_path, url, attach_name, file_type, file_dirname
+            )
+
+    def _download_to_dir(
+        self, file_path, url, attach_name, file_type, file_dirname
+    ) -> str:
+        """_download_ydnote_url 的实现，另外记录耗时"""
+        local_file_dir = self._get_local_file_dir(file_path, file_dirname)
+
+        # 已下载过的 URL 直接使用缓存的内容
+        if self.resource_cache is not None:
+            resource = self.resource_cache.get(url)
+            if resource is not None:
+                os.makedirs(local_file_dir, exist_ok=True)
+                local_file_path = os.path.join(
+                    local_file_dir, resource.file_name
+                ).replace("\\", "/")
+                # 其他线程可能正在写入同一路径（多篇笔记引用同一图片）
+                with path_lock(local_file_path):
+                    self.resource_cache.link_to(resource, local_file_path)
+                METRICS.incr(f"{file_dirname}.cache_hits")
+                logging.debug(
+                    "已将%s「%s」转换为「%s」（缓存）", file_type, url, local_file_path
+                )
+                return local_file_path
+
+        # 上次中断的大文件直接用 Range 请求继续下载，无法续传时重新下载
+        local_file_path = partial_download_path(local_file_dir, url)
+        if local_file_path is not None and self._save(
+            url, file_type, local_file_path, None
+        ):
+            return local_file_path
+
         try:
-            response = self.youdaonote_api.http_get(url)
+            response = self.youdaonote_api.http_get(url, stream=True)
         except requests.exceptions.ProxyError as err:
-            error_msg = "网络错误，「{}」下载失败。错误提示：{}".format(
-                url, format(err)
-            )
-            logging.info(error_msg)
+            logging.warning("网络错误，「%s」下载失败。错误提示：%s", url, err)
             return ""
 
         content_type = response.headers.get("Content-Type")
-        file_type = "附件" if attach_name else "图片"
         if response.status_code != 200 or not content_type:
-            error_msg = "下载「{}」失败！{}可能已失效，可浏览器登录有道云笔记后，查看{}是否能正常加载".format(
-                url, file_type, file_type
+            response.close()
+            logging.warning(
+                "下载「%s」失败！%s可能已失效，可浏览器登录有道云笔记后，查看%s是否能正常加载",
+                url,
+                file_type,
+                file_type,
             )
-            logging.info(error_msg)
             return ""
 
         if attach_name:
-            # 默认下载附件到 attachments 文件夹
-            file_dirname = ATTACH
             file_suffix = attach_name
         else:
-            # 默认下载图片到 images 文件夹
-            file_dirname = IMAGES
             # 后缀 png 和 jpeg 后可能出现 ; `**.png;`, 原因未知
             content_type_arr = content_type.split("/")
             file_suffix = (
@@ -158,20 +255,8 @@ class ImagePull:
                 else "jpg"
             )
 
-        local_file_dir = None
-        # 如果 file_name 中不包含 . 号
-        if file_path.find(".") == -1:
-            local_file_dir = os.path.join(self.root_local_dir, file_dirname).replace(
-                "\\", "/"
-            )
-        else:
-            # 截取字符串 file_path 中文件夹全路径(即实现在具体文件夹目录下再生成图片文件夹路径，而非在根目录生成图片文件夹路径)
-            local_file_dir = os.path.join(
-                file_path[: file_path.rfind("/")], file_dirname
-            ).replace("\\", "/")
-
-        if not os.path.exists(local_file_dir):
-            os.mkdir(local_file_dir)
+        # 并发下载时可能有其他线程同时创建
+        os.makedirs(local_file_dir, exist_ok=True)
         file_basename = os.path.basename(urlparse(url).path)
 
         # 请求后的真实的 URL 中才有东西
@@ -189,20 +274,55 @@ class ImagePull:
         else:
             file_name = "".join([file_basename, file_suffix])
         local_file_path = os.path.join(local_file_dir, file_name).replace("\\", "/")
+        return self._save(url, file_type, local_file_path, response)
 
+    def _save(self, url, file_type, local_file_path, response) -> str:
+        """
+        保存图片/附件并加入缓存
+        :param response: 完整内容的响应，为 None 时续传 local_file_path 未下载完的部分
+        :return: 本地路径，失败或无法续传时为空字符串
+        """
         try:
-            with open(local_file_path, "wb") as f:
-                f.write(response.content)  # response.content 本身就为字节类型
-            logging.info(
-                "已将{}「{}」转换为「{}」".format(file_type, url, local_file_path)
+            # 流式写入后替换，大附件不占用大量内存，中断后下次运行可续传
+            # 同一文件夹下的多篇笔记引用同一 URL 时写入同一路径，逐个写入
+            with path_lock(local_file_path):
+                if response is not None:
+                    size = save_response_resumable(url, response, local_file_path)
+                else:
+                    size = resume_download(self.youdaonote_api, url, local_file_path)
+                    # 为 None 时已由其他线程下载完成，或无法续传，需重新下载
+                    if size is None and not os.path.exists(local_file_path):
+                        return ""
+                if self.resource_cache is not None:
+                    self.resource_cache.add(url, local_file_path)
+            logging.debug(
+                "已将%s「%s」转换为「%s」",
+                file_type,
+                url,
+                local_file_path,
+                extra={"path": local_file_path, "bytes": size},
             )
         except:
-            error_msg = "{} {}有误！".format(url, file_type)
-            logging.info(error_msg)
+            logging.warning("%s %s有误！", url, file_type)
             return ""
 
         return local_file_path
 
+    def _get_local_file_dir(self, file_path, file_dirname) -> str:
+        """
+        图片/附件的本地文件夹
+        :param file_path: 笔记路径
+        :param file_dirname: images 或 attachments
+        :return:
+        """
+        # 如果 file_name 中不包含 . 号
+        if file_path.find(".") == -1:
+            return os.path.join(self.root_local_dir, file_dirname).replace("\\", "/")
+        # 截取字符串 file_path 中文件夹全路径(即实现在具体文件夹目录下再生成图片文件夹路径，而非在根目录生成图片文件夹路径)
+        return os.path.join(file_path[: file_path.rfind("/")], file_dirname).replace(
+            "\\", "/"
+        )
+
     def _set_relative_file_path(self, file_path, file_name, local_file_dir) -> str:
         """
         图片/附件设置为相对地址
@@ -221,8 +341,23 @@ class ImagePull:
 class ImageUpload:
     """
     图片上传到指定图床
+    所有上传共用一个 session，并发上传时复用到图床的连接
     """
 
+    _session: Optional[requests.Session] = None
+    _session_lock = threading.Lock()
+
+    @classmethod
+    def get_session(cls) -> requests.Session:
+        """上传图片使用的 session，首次调用时创建"""
+        with cls._session_lock:
+            if cls._session is None:
+                cls._session = create_session(
+                    CONFIG.pool_maxsize or max(CONFIG.image_workers, 1),
+                    CONFIG.keep_alive,
+                )
+            return cls._session
+
     @staticmethod
     def upload_to_smms(youdaonote_api, image_url, smms_secret_token) -> Tuple[str, str]:
         """
@@ -246,10 +381,15 @@ class ImageUpload:
             "SM.MS 免费版每分钟限额 20 张图片，每小时限额 100 张图片，大小限制 5 M，上传失败！「{}」未转换，"
             "将下载图片到本地".format(image_url)
         )
+        session = ImageUpload.get_session()
         try:
-            res_json = requests.post(
-                upload_api_url, headers=headers, files=files, timeout=5
-            ).json()
+            with METRICS.timer("images.upload"):
+                res_json = session.post(
+                    upload_api_url,
+                    headers=headers,
+                    files=files,
+                    timeout=config_timeout(),
+                ).json()
         except requests.exceptions.ProxyError as err:
             error_msg = "网络错误，上传「{}」到 SM.MS 失败！将下载图片到本地。错误提示：{}".format(
                 image_url, format(err)
@@ -260,11 +400,11 @@ class ImageUpload:
 
         if res_json.get("success"):
             url = res_json["data"]["url"]
-            logging.info("已将图片「{}」转换为「{}」".format(image_url, url))
+            logging.debug("已将图片「%s」转换为「%s」", image_url, url)
             return url, ""
         if res_json.get("code") == "image_repeated":
             url = res_json["images"]
-            logging.info("已将图片「{}」转换为「{}」".format(image_url, url))
+            logging.debug("已将图片「%s」转换为「%s」", image_url, url)
             return url, ""
         if res_json.get("code") == "flood":
             return "", error_msg
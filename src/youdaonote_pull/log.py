@@ -1,27 +1,135 @@
+import atexit
+import json
 import logging
+import logging.handlers
 import os
 import os.path as osp
+import queue
 import sys
 from datetime import datetime
+from typing import Optional
 
 # LOG_FORMAT = "%(asctime)s %(levelname)s %(processName)s-%(threadName)s-%(thread)d %(filename)s:%(lineno)d %(funcName)-10s : %(message)s"
 LOG_FORMAT = "%(asctime)s %(levelname)-10s %(message)s"
 DATE_FORMAT = "%Y-%m-%d %H:%M:%S "
 
 LOG_DIR = "logs"
-if not osp.exists(LOG_DIR):
-    os.mkdir(LOG_DIR)
+LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+# 结构化日志中从 extra 读取的字段，如 logging.info(..., extra={"file_id": ...})
+EXTRA_FIELDS = ("file_id", "action", "path", "bytes", "duration")
 
-LOG_FILE = osp.join(LOG_DIR, f"pull-{datetime.now():%Y%m%d-%H%M%S}.log")
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[logging.handlers.QueueHandler] = None
+# 转换进程的日志队列与其后台线程
+_process_listener: Optional[logging.handlers.QueueListener] = None
 
 
-def init():
-    logging.basicConfig(
-        handlers=[
-            logging.FileHandler(LOG_FILE, "a", encoding="utf-8"),
-            logging.StreamHandler(sys.stdout),
-        ],
-        level=logging.INFO,
-        format=LOG_FORMAT,
-        datefmt=DATE_FORMAT,
+class JsonLinesFormatter(logging.Formatter):
+    """每条日志一行 JSON，包含时间、级别、消息、线程和 EXTRA_FIELDS 中存在的字段"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": datetime.fromtimestamp(record.created).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        for name in EXTRA_FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                data[name] = value
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+def init(level: str = "INFO", json_lines: bool = False) -> str:
+    """
+    输出日志到控制台与 logs/ 下的文件，由命令行入口调用，导入本包时不创建文件
+    日志记录只放入队列，由后台线程格式化并写入，下载线程不等待磁盘与控制台
+    :param level: 日志级别，DEBUG 时输出跳过的文件、每张图片等逐条信息
+    :param json_lines: 为 True 时另外输出 JSON Lines 格式的结构化日志（.jsonl）
+    :return: 日志文件路径
+    """
+    global _listener, _queue_handler
+
+    if not osp.exists(LOG_DIR):
+        os.mkdir(LOG_DIR)
+    log_file = osp.join(LOG_DIR, f"pull-{datetime.now():%Y%m%d-%H%M%S}.log")
+    formatter = logging.Formatter(LOG_FORMAT, DATE_FORMAT)
+    handlers = [
+        logging.FileHandler(log_file, "a", encoding="utf-8"),
+        logging.StreamHandler(sys.stdout),
+    ]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    if json_lines:
+        json_handler = logging.FileHandler(
+            f"{osp.splitext(log_file)[0]}.jsonl", "a", encoding="utf-8"
+        )
+        json_handler.setFormatter(JsonLinesFormatter())
+        handlers.append(json_handler)
+
+    log_queue = queue.SimpleQueue()
+    _queue_handler = logging.handlers.QueueHandler(log_queue)
+    root = logging.getLogger()
+    root.addHandler(_queue_handler)
+    root.setLevel(level.upper())
+    _listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True
     )
+    _listener.start()
+    atexit.register(shutdown)
+    return log_file
+
+
+def process_queue(context):
+    """
+    子进程（转换进程池）的日志队列，其中的日志由主进程的后台线程写入同一组文件
+    :param context: 创建子进程的 multiprocessing 上下文
+    :return: 队列，未调用 init 时为 None（子进程使用默认的日志设置）
+    """
+    global _process_listener
+
+    if _listener is None:
+        return None
+    if _process_listener is None:
+        _process_listener = logging.handlers.QueueListener(
+            context.Queue(), *_listener.handlers, respect_handler_level=True
+        )
+        _process_listener.start()
+    return _process_listener.queue
+
+
+def init_process(log_queue, level: int):
+    """
+    子进程的初始化函数，日志记录放入 process_queue 返回的队列
+    :param log_queue: process_queue 的返回值
+    :param level: 主进程的日志级别
+    """
+    if log_queue is None:
+        return
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
+
+
+def shutdown():
+    """写完队列中剩余的日志，停止后台线程"""
+    global _listener, _queue_handler, _process_listener
+
+    if _process_listener is not None:
+        _process_listener.stop()
+        _process_listener = None
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
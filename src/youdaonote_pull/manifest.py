@@ -0,0 +1,158 @@
+import json
+import logging
+import os
+import os.path as osp
+import threading
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Set
+
+from .config import CONFIG_DIR
+from .download import read_json_lines
+
+"""
+同步清单：记录每个有道云笔记文件 ID 对应的修改时间、本地路径和笔记类型
+笔记未更新时无需下载内容、也无需访问本地文件即可跳过
+同时记录每个目录的修改时间和直接子项，用于跳过未更新的目录
+
+文件为 JSON Lines 格式，第一行为清单范围，之后每行一条记录，后出现的记录覆盖先出现的，
+{"id": ...} 为文件记录，{"dir_id": ...} 为目录记录，带 "deleted": true 表示删除记录。
+运行中只追加写入，中断也不会丢失已完成的记录，运行结束后重写为每个 ID 一行
+"""
+
+MANIFEST_FILE = osp.join(CONFIG_DIR, "manifest.jsonl")
+
+
+@dataclass
+class ManifestEntry:
+    id: str
+    modify_time: float
+    path: str
+    file_type: str  # FileType 名称
+
+
+@dataclass
+class DirManifestEntry:
+    dir_id: str
+    modify_time: float
+    path: str
+    children: List[str]  # 直接子文件 ID
+    subdirs: List[str]  # 直接子目录 ID
+
+
+class SyncManifest:
+    def __init__(self, scope: dict, path: str = MANIFEST_FILE):
+        """
+        :param scope: 清单范围（本地目录、有道云笔记目录），与已有清单不同时重新记录
+        :param path: 清单文件路径
+        """
+        self.path = path
+        self.scope = scope
+        self._entries: Dict[str, ManifestEntry] = {}
+        self._dirs: Dict[str, DirManifestEntry] = {}
+        self._seen: Set[str] = set()
+        self._seen_dirs: Set[str] = set()
+        self._lock = threading.Lock()
+        self._load()
+        os.makedirs(osp.dirname(self.path) or ".", exist_ok=True)
+        self._fp = open(self.path, "a", encoding="utf-8")
+        if self._fp.tell() == 0:
+            self._write_line({"scope": self.scope})
+
+    def _load(self):
+        if not osp.exists(self.path):
+            return
+        # 中断时写了一半的行被丢弃，范围行不完整时按范围变化处理
+        lines = read_json_lines(self.path)
+        if not lines or lines[0].get("scope") != self.scope:
+            logging.info("同步清单范围已变化，将重新记录")
+            os.remove(self.path)
+            return
+        for line in lines[1:]:
+            if "dir_id" in line:
+                if line.get("deleted"):
+                    self._dirs.pop(line["dir_id"], None)
+                else:
+                    self._dirs[line["dir_id"]] = DirManifestEntry(**line)
+            elif line.get("deleted"):
+                self._entries.pop(line["id"], None)
+            else:
+                self._entries[line["id"]] = ManifestEntry(**line)
+
+    def _write_line(self, data: dict):
+        self._fp.write(json.dumps(data, ensure_ascii=False) + "\n")
+        self._fp.flush()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, file_id: str) -> Optional[ManifestEntry]:
+        return self._entries.get(file_id)
+
+    def update(self, entry: ManifestEntry):
+        with self._lock:
+            if self._entries.get(entry.id) == entry:
+                return
+            self._entries[entry.id] = entry
+            self._write_line(asdict(entry))
+
+    def remove(self, file_id: str):
+        with self._lock:
+            if self._entries.pop(file_id, None) is not None:
+                self._write_line({"id": file_id, "deleted": True})
+
+    def get_dir(self, dir_id: str) -> Optional[DirManifestEntry]:
+        return self._dirs.get(dir_id)
+
+    def update_dir(self, entry: DirManifestEntry):
+        with self._lock:
+            if self._dirs.get(entry.dir_id) == entry:
+                return
+            self._dirs[entry.dir_id] = entry
+            self._write_line(asdict(entry))
+
+    def mark_seen(self, file_id: str):
+        """标记本次遍历中在云端出现过的文件"""
+        with self._lock:
+            self._seen.add(file_id)
+
+    def mark_dir_seen(self, dir_id: str, recursive: bool = False):
+        """
+        标记本次遍历中出现过的目录
+        :param recursive: 目录被跳过时为 True，同时标记记录中的全部子项
+        """
+        with self._lock:
+            if not recursive:
+                self._seen_dirs.add(dir_id)
+                return
+            stack = [dir_id]
+            while stack:
+                entry = self._dirs.get(stack.pop())
+                if entry is None or entry.dir_id in self._seen_dirs:
+                    continue
+                self._seen_dirs.add(entry.dir_id)
+                self._seen.update(entry.children)
+                stack.extend(entry.subdirs)
+
+    def missing(self) -> List[ManifestEntry]:
+        """本次遍历中未出现的记录，即云端已删除的文件"""
+        with self._lock:
+            return [e for id, e in self._entries.items() if id not in self._seen]
+
+    def compact(self):
+        """重写清单文件，每个 ID 只保留一行，并去掉本次遍历未出现的目录"""
+        with self._lock:
+            self._dirs = {
+                id: e for id, e in self._dirs.items() if id in self._seen_dirs
+            }
+            self._fp.close()
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as fp:
+                fp.write(json.dumps({"scope": self.scope}, ensure_ascii=False) + "\n")
+                for entry in [*self._entries.values(), *self._dirs.values()]:
+                    fp.write(json.dumps(asdict(entry), ensure_ascii=False) + "\n")
+            os.replace(tmp_path, self.path)
+            self._fp = open(self.path, "a", encoding="utf-8")
+
+    def close(self):
+        with self._lock:
+            self._fp.close()
@@ -0,0 +1,119 @@
+import bisect
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+"""
+运行指标：各阶段的次数、耗时分布，以及文件数、字节数等计数
+运行结束时输出摘要，也可导出为 JSON
+
+    with METRICS.timer("api.dir_list"):
+        ...
+    METRICS.incr("files.skipped")
+"""
+
+# 耗时分布的桶上限（秒），最后一个桶为更长的耗时
+BUCKETS = [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+
+
+class Timer:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets: List[int] = [0] * (len(BUCKETS) + 1)
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+
+    def percentile(self, p: float) -> float:
+        """按桶估算百分位数，返回所在桶的上限，最后一个桶返回最大值"""
+        target = self.count * p
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= target:
+                return BUCKETS[i] if i < len(BUCKETS) else self.max
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "buckets": dict(zip([*map(str, BUCKETS), "inf"], self.buckets)),
+        }
+
+
+class Metrics:
+    def __init__(self):
+        self._timers: Dict[str, Timer] = {}
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            timer = self._timers.get(name)
+            if timer is None:
+                timer = self._timers[name] = Timer()
+            timer.add(seconds)
+
+    @contextmanager
+    def timer(self, name: str):
+        """记录代码块的耗时，出现异常时也记录"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def incr(self, name: str, value: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def reset(self):
+        with self._lock:
+            self._timers.clear()
+            self._counters.clear()
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "timers": {
+                    name: timer.to_dict()
+                    for name, timer in sorted(self._timers.items())
+                },
+                "counters": dict(sorted(self._counters.items())),
+            }
+
+    def summary(self) -> List[str]:
+        """摘要，每项一行"""
+        data = self.to_dict()
+        lines = []
+        for name, t in data["timers"].items():
+            lines.append(
+                f"{name}：{t['count']} 次，共 {t['total']:.2f} 秒，"
+                f"平均 {t['mean'] * 1000:.0f} ms，p95 ≤ {t['p95'] * 1000:.0f} ms，"
+                f"最长 {t['max'] * 1000:.0f} ms"
+            )
+        for name, value in data["counters"].items():
+            if name.startswith("bytes."):
+                lines.append(f"{name}：{value / 1024 / 1024:.2f} MB")
+            else:
+                lines.append(f"{name}：{value}")
+        return lines
+
+    def export_json(self, path: str):
+        with open(path, "w", encoding="utf-8") as fp:
+            json.dump(self.to_dict(), fp, ensure_ascii=False, indent=2)
+
+
+METRICS = Metrics()
@@ -0,0 +1,129 @@
+import cProfile
+import io
+import logging
+import os.path as osp
+import pstats
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Tuple
+
+from .log import LOG_DIR
+
+"""
+性能分析：用 cProfile 分析一次导出，结果写入 logs/
+- profile-*.prof：pstats 格式，可用 `python -m pstats` 或 snakeviz 等工具查看
+- profile-*.txt：按耗时归类的汇总与前 N 个最耗时的函数
+只在 --profile 时导入本模块，未开启时没有额外开销
+"""
+
+# 按文件名与函数名把耗时归类，判断时间花在转换、链接替换还是等待网络上
+CATEGORIES: List[Tuple[str, Tuple[str, ...]]] = [
+    ("markdownify（HTML 转换）", ("markdownify", "bs4", "html/parser", "html.parser")),
+    ("ElementTree（XML 解析）", ("xml/etree", "xml.etree", "pyexpat")),
+    ("正则（链接替换等）", ("/re/", "re.Pattern", "sre_")),
+    ("网络", ("socket", "ssl", "http/client", "urllib3", "selectors", "select")),
+    ("线程等待", ("_thread.lock", "_queue", "threading.py", "concurrent/futures")),
+    ("限速与重试等待", ("time.sleep",)),
+    ("磁盘读写", ("io.BufferedWriter", "io.BufferedReader", "posix", "nt.")),
+]
+OTHER_CATEGORY = "其他"
+
+
+def _category(filename: str, func_name: str) -> str:
+    name = f"{filename} {func_name}".replace("\\", "/")
+    for category, keywords in CATEGORIES:
+        if any(keyword in name for keyword in keywords):
+            return category
+    return OTHER_CATEGORY
+
+
+def summarize_categories(stats: pstats.Stats) -> Dict[str, float]:
+    """
+    按类别汇总各函数自身的耗时（不含调用的子函数）
+    :return: {类别: 秒数}，按耗时降序
+    """
+    totals: Dict[str, float] = {}
+    for (filename, _, func_name), (_, _, tottime, _, _) in stats.stats.items():
+        category = _category(filename, func_name)
+        totals[category] = totals.get(category, 0.0) + tottime
+    return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+
+class _ThreadProfiles:
+    """
+    为每个线程创建一个 cProfile.Profile，结束时合并
+    Python 3.12 起 cProfile 基于 sys.monitoring，同时只能启用一个，且已覆盖所有线程
+    """
+
+    def __init__(self):
+        self.profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+        self._per_thread = sys.version_info < (3, 12)
+
+    def _new_profile(self) -> cProfile.Profile:
+        profile = cProfile.Profile()
+        with self._lock:
+            self.profiles.append(profile)
+        profile.enable()
+        return profile
+
+    def _start_thread(self, *args):
+        # 新线程的第一个事件，替换为该线程自己的 profile
+        sys.setprofile(None)
+        self._new_profile()
+
+    def start(self):
+        if self._per_thread:
+            threading.setprofile(self._start_thread)
+        self._new_profile()
+
+    def stop(self) -> pstats.Stats:
+        if self._per_thread:
+            threading.setprofile(None)
+        # 导出结束时线程池均已关闭，各线程的 profile 不再变化
+        for profile in self.profiles:
+            profile.disable()
+        stats = pstats.Stats(self.profiles[0])
+        for profile in self.profiles[1:]:
+            stats.add(profile)
+        return stats
+
+
+def write_report(stats: pstats.Stats, path: str, top: int):
+    """写入归类汇总与按自身耗时、累计耗时排序的前 top 个函数"""
+    stream = io.StringIO()
+    stream.write("按类别汇总（函数自身耗时，多线程时为各线程之和）：\n")
+    for category, seconds in summarize_categories(stats).items():
+        stream.write(f"  {category}：{seconds:.3f} 秒\n")
+    stats.stream = stream
+    stream.write(f"\n自身耗时最多的 {top} 个函数：\n")
+    stats.sort_stats(pstats.SortKey.TIME).print_stats(top)
+    stream.write(f"\n累计耗时最多的 {top} 个函数：\n")
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top)
+    with open(path, "w", encoding="utf-8") as fp:
+        fp.write(stream.getvalue())
+
+
+@contextmanager
+def profile_run(top: int = 30, log_dir: str = LOG_DIR) -> Iterator[str]:
+    """
+    分析代码块，结束时（包括出错时）写入 .prof 与 .txt 文件
+    :param top: 报告中列出的函数数
+    :param log_dir: 结果保存的文件夹
+    :return: 文件路径（不含后缀）
+    """
+    prefix = osp.join(log_dir, f"profile-{datetime.now():%Y%m%d-%H%M%S}")
+    profiles = _ThreadProfiles()
+    profiles.start()
+    try:
+        yield prefix
+    finally:
+        stats = profiles.stop()
+        stats.dump_stats(f"{prefix}.prof")
+        write_report(stats, f"{prefix}.txt", top)
+        logging.info("性能分析按类别汇总：")
+        for category, seconds in summarize_categories(stats).items():
+            logging.info(f"  {category}：{seconds:.3f} 秒")
+        logging.info(f"性能分析结果已保存到「{prefix}.prof」与「{prefix}.txt」")
@@ -0,0 +1,122 @@
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+"""
+导出进度：预先扫描目录得到需要检查的文件数与总大小，下载时由后台线程定期输出
+已完成的文件数与大小、篇/s、MB/s 和预计剩余时间
+大小为目录列表中的 fileSize（云端文件大小），与转换后写入本地的大小不同
+"""
+
+MB = 1024 * 1024
+
+
+def format_seconds(seconds: float) -> str:
+    """将秒数格式化为「1 小时 2 分 3 秒」"""
+    seconds = int(round(seconds))
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    if hours:
+        return f"{hours} 小时 {minutes} 分 {seconds} 秒"
+    if minutes:
+        return f"{minutes} 分 {seconds} 秒"
+    return f"{seconds} 秒"
+
+
+class Progress:
+    """线程安全的进度统计，扫描时 add 累加总量，每个文件处理完（含跳过、失败）时 advance"""
+
+    def __init__(
+        self,
+        label: str = "",
+        interval: float = 5,
+        clock: Callable[[], float] = time.perf_counter,
+    ):
+        """
+        :param label: 日志中进度前的标签，如本地目录
+        :param interval: 输出进度的间隔秒数
+        :param clock: 计时函数，测试时可替换
+        """
+        self.label = label
+        self.interval = interval
+        self._clock = clock
+        self.total_files = 0
+        self.total_bytes = 0
+        self.done_files = 0
+        self.done_bytes = 0
+        self._start_time: Optional[float] = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, size: int):
+        """扫描到一个需要检查的文件"""
+        with self._lock:
+            self.total_files += 1
+            self.total_bytes += size
+
+    def advance(self, size: int):
+        """一个文件处理完成"""
+        with self._lock:
+            self.done_files += 1
+            self.done_bytes += size
+
+    def eta(self) -> Optional[float]:
+        """
+        预计剩余秒数，有大小信息时按 MB/s 估计，否则按篇/s 估计
+        :return: 尚未完成任何文件时为 None
+        """
+        with self._lock:
+            elapsed = self._elapsed()
+            if self.total_bytes and self.done_bytes:
+                remaining = self.total_bytes - self.done_bytes
+                return max(0.0, remaining * elapsed / self.done_bytes)
+            if self.done_files:
+                remaining = self.total_files - self.done_files
+                return max(0.0, remaining * elapsed / self.done_files)
+            return None
+
+    def _elapsed(self) -> float:
+        if self._start_time is None:
+            return 0.0
+        return self._clock() - self._start_time
+
+    def format(self) -> str:
+        """如「进度：12/100 篇（12%），3.4/120.0 MB，5.2 篇/s，1.3 MB/s，剩余约 1 分 20 秒」"""
+        eta = self.eta()
+        with self._lock:
+            elapsed = max(self._elapsed(), 1e-9)
+            percent = (
+                self.done_files * 100 // self.total_files if self.total_files else 100
+            )
+            line = (
+                f"进度：{self.done_files}/{self.total_files} 篇（{percent}%），"
+                f"{self.done_bytes / MB:.1f}/{self.total_bytes / MB:.1f} MB，"
+                f"{self.done_files / elapsed:.1f} 篇/s，"
+                f"{self.done_bytes / MB / elapsed:.2f} MB/s，"
+            )
+        line += "剩余时间未知" if eta is None else f"剩余约 {format_seconds(eta)}"
+        return f"「{self.label}」{line}" if self.label else line
+
+    def start(self):
+        """开始计时，并启动定期输出进度的后台线程"""
+        self._start_time = self._clock()
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._report, name="progress", daemon=True
+        )
+        self._thread.start()
+
+    def _report(self):
+        while not self._stopped.wait(self.interval):
+            logging.info(self.format())
+
+    def stop(self):
+        """停止后台线程，并输出最终进度，未开始时不输出"""
+        if self._thread is None:
+            return
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+        logging.info(self.format())
@@ -0,0 +1,218 @@
+import random
+import threading
+import time
+from typing import Callable, Optional
+
+from requests.exceptions import ConnectionError, Timeout
+
+"""
+请求限速与重试
+- 令牌桶限制每秒请求数，遇到限流（429、5xx、代理错误）时速率减半，请求成功后逐步恢复
+- 失败的请求按指数退避加随机抖动重试，429 响应优先使用 Retry-After
+- 连续失败达到阈值时熔断，所有请求暂停一段时间；多次熔断后仍未恢复则放弃
+等待时间由方法返回，同步与异步会话各自 sleep
+"""
+
+# 需要重试的状态码：限流与服务端错误
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# 需要重试的异常，ProxyError 是 ConnectionError 的子类
+RETRY_EXCEPTIONS = (ConnectionError, Timeout)
+# 单次重试最长等待秒数
+MAX_BACKOFF = 60.0
+# 不限速时被限流，从此速率开始限速
+THROTTLED_RATE = 5.0
+# 不限速时被限流，恢复到此速率后不再限速
+UNLIMITED_RATE = 50.0
+
+
+class CircuitOpenError(ConnectionError):
+    """多次熔断后服务仍不可用"""
+
+
+class TokenBucket:
+    def __init__(
+        self,
+        rate: float,
+        min_rate: float = 0.5,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        :param rate: 每秒最多请求数，也是恢复时的上限；
+            0 为不限制，被限流后从 THROTTLED_RATE 开始限速，恢复到 UNLIMITED_RATE 后不再限制
+        :param min_rate: 限流时降到的最低速率
+        :param clock: 时间函数，测试时可替换
+        """
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate) if rate else min_rate
+        # 当前速率，0 为不限制
+        self.rate = rate
+        self._clock = clock
+        self._tokens = max(1.0, rate)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        取一个令牌，令牌不足时预支
+        :return: 需要等待的秒数
+        """
+        with self._lock:
+            if not self.rate:
+                return 0.0
+            now = self._clock()
+            capacity = max(1.0, self.rate)
+            elapsed = now - self._updated
+            self._tokens = min(capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def throttle(self):
+        """被限流时速率减半"""
+        with self._lock:
+            if not self.rate:
+                self.rate = THROTTLED_RATE
+                self._tokens = 1.0
+                self._updated = self._clock()
+                return
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def recover(self):
+        """请求成功时逐步恢复速率，约 20 次成功请求恢复到上限"""
+        with self._lock:
+            if not self.rate:
+                return
+            if self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+            else:
+                self.rate += UNLIMITED_RATE / 20
+                if self.rate >= UNLIMITED_RATE:
+                    self.rate = 0
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        threshold: int,
+        cooldown: float,
+        max_trips: int = 5,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        :param threshold: 连续失败多少次后熔断，0 为不熔断
+        :param cooldown: 熔断后暂停的秒数，再次熔断时加倍
+        :param max_trips: 连续熔断多少次后放弃
+        :param clock: 时间函数，测试时可替换
+        """
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_trips = max_trips
+        self.trips = 0
+        self._clock = clock
+        self._failures = 0
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+
+    def wait_time(self) -> float:
+        """
+        熔断中返回剩余的暂停秒数，否则为 0
+        :raise CircuitOpenError: 连续熔断次数超过 max_trips
+        """
+        with self._lock:
+            if self.trips > self.max_trips:
+                raise CircuitOpenError(
+                    f"连续 {self.trips} 次熔断后有道云笔记接口仍不可用"
+                )
+            return max(0.0, self._open_until - self._clock())
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self.trips = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if not self.threshold or self._failures < self.threshold:
+                return
+            self._failures = 0
+            self.trips += 1
+            cooldown = self.cooldown * 2 ** (self.trips - 1)
+            self._open_until = self._clock() + cooldown
+
+
+class RetryPolicy:
+    """
+    YoudaoNoteSession 与 AsyncYoudaoNoteSession 共用的限速、重试与熔断策略
+    """
+
+    def __init__(
+        self,
+        rate_limit: float = 0,
+        max_retries: int = 0,
+        backoff: float = 1.0,
+        breaker_threshold: int = 0,
+        breaker_cooldown: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        :param rate_limit: 每秒最多请求数，0 为不限制
+        :param max_retries: 单个请求最多重试次数
+        :param backoff: 第一次重试的等待秒数，之后每次加倍
+        :param breaker_threshold: 连续失败多少次后熔断，0 为不熔断
+        :param breaker_cooldown: 熔断后暂停的秒数
+        """
+        self.limiter = TokenBucket(rate_limit, clock=clock)
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_cooldown, clock=clock)
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    @classmethod
+    def from_config(cls, config) -> "RetryPolicy":
+        return cls(
+            rate_limit=config.rate_limit,
+            max_retries=config.max_retries,
+            backoff=config.retry_backoff,
+            breaker_threshold=config.circuit_breaker_threshold,
+            breaker_cooldown=config.circuit_breaker_cooldown,
+        )
+
+    def _retry_delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """指数退避加随机抖动（full jitter），有 Retry-After 时至少等待其指定的秒数"""
+        delay = random.uniform(0, min(MAX_BACKOFF, self.backoff * 2**attempt))
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(MAX_BACKOFF, float(retry_after)))
+        return delay
+
+    def on_response(
+        self, attempt: int, status: int, retry_after: Optional[str] = None
+    ) -> Optional[float]:
+        """
+        记录响应结果
+        :param attempt: 已重试次数
+        :param status: 状态码
+        :param retry_after: Retry-After 响应头
+        :return: 需要重试时返回等待秒数，否则为 None
+        """
+        if status not in RETRY_STATUS:
+            self.breaker.record_success()
+            self.limiter.recover()
+            return None
+        self.breaker.record_failure()
+        self.limiter.throttle()
+        if attempt >= self.max_retries:
+            return None
+        return self._retry_delay(attempt, retry_after)
+
+    def on_error(self, attempt: int) -> Optional[float]:
+        """
+        记录可重试的网络异常
+        :return: 需要重试时返回等待秒数，否则为 None（应重新抛出异常）
+        """
+        self.breaker.record_failure()
+        self.limiter.throttle()
+        if attempt >= self.max_retries:
+            return None
+        return self._retry_delay(attempt)
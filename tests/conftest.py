@@ -0,0 +1,112 @@
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Union
+
+import pytest
+
+MODIFY_TIME = 1_600_000_000
+
+
+class FakeResponse:
+    """与 requests.Response 相同的 status_code、url、headers、content、iter_content、close"""
+
+    def __init__(self, content: bytes, url: str = "", headers=None):
+        self.status_code = 200
+        self.url = url
+        self.content = content
+        self.headers = headers or {}
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i : i + chunk_size]
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+    """
+    不发起请求的 YoudaoNoteSession
+    目录树如 {"a.md": b"# a", "sub": {"b.note": b"<?xml ..."}}，dict 为目录，
+    bytes 为文件内容，异常为下载该文件时抛出的异常；ID 为从根目录开始的路径
+    图片 resources 为 {URL: PNG 内容}，由 http_get 返回
+    """
+
+    def __init__(
+        self,
+        tree: Dict[str, Union[dict, bytes, Exception]],
+        cookies_path: str = "",
+        retry_policy=None,
+        resources: Optional[Dict[str, bytes]] = None,
+    ):
+        self.cookies_path = cookies_path
+        self.retry_policy = retry_policy
+        self.resources = resources or {}
+        # 目录 ID 与其子项（fileEntry）的对应，可在测试中修改以模拟云端变化
+        self.dirs: Dict[str, List[dict]] = {}
+        self.files: Dict[str, Union[bytes, Exception]] = {}
+        # 请求记录
+        self.listed: List[str] = []
+        self.downloads = Counter()
+        self.threads = set()
+        self._lock = threading.Lock()
+        self._build("root", tree)
+
+    def _build(self, dir_id: str, tree: dict):
+        entries = []
+        for name, value in tree.items():
+            id = name if dir_id == "root" else f"{dir_id}/{name}"
+            entry = {
+                "id": id,
+                "name": name,
+                "dir": isinstance(value, dict),
+                "modifyTimeForSort": MODIFY_TIME,
+                "createTimeForSort": MODIFY_TIME,
+            }
+            if isinstance(value, dict):
+                self._build(id, value)
+            else:
+                self.files[id] = value
+                entry["fileSize"] = len(value) if isinstance(value, bytes) else 0
+            entries.append(entry)
+        self.dirs[dir_id] = entries
+
+    def entry(self, id: str) -> dict:
+        for entries in self.dirs.values():
+            for entry in entries:
+                if entry["id"] == id:
+                    return entry
+        raise KeyError(id)
+
+    def resize_pool(self, pool_maxsize):
+        pass
+
+    def get_root_dir_info_id(self):
+        return {"fileEntry": {"id": "root"}}
+
+    def iter_dir_entries(self, dir_id):
+        with self._lock:
+            self.listed.append(dir_id)
+        yield from list(self.dirs[dir_id])
+
+    def get_file_by_id(self, file_id, stream=False):
+        with self._lock:
+            self.downloads[file_id] += 1
+            self.threads.add(threading.current_thread().name)
+        content = self.files[file_id]
+        if isinstance(content, Exception):
+            raise content
+        return FakeResponse(content)
+
+    def http_get(self, url, stream=False, headers=None):
+        with self._lock:
+            self.downloads[url] += 1
+        content = self.resources[url]
+        headers = {"Content-Type": "image/png", "Content-Length": str(len(content))}
+        return FakeResponse(content, url, headers)
+
+
+@pytest.fixture
+def fake_session():
+    """创建 FakeSession：fake_session(tree, cookies_path="", retry_policy=None, resources=None)"""
+    return FakeSession
@@ -0,0 +1,283 @@
+import asyncio
+import importlib.util
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from requests.exceptions import HTTPError, Timeout
+
+from youdaonote_pull import api
+from youdaonote_pull.config import CONFIG
+from youdaonote_pull.core import AsyncYoudaoNotePull
+from youdaonote_pull.metrics import METRICS
+from youdaonote_pull.ratelimit import RetryPolicy
+
+# 异步模式为可选功能，未安装 aiohttp 时只跳过异步相关的测试
+requires_aiohttp = pytest.mark.skipif(
+    importlib.util.find_spec("aiohttp") is None, reason="需要安装 aiohttp"
+)
+
+CSTK = "test_cstk"
+DIR_INFO = {
+    "count": 2,
+    "entries": [
+        {"fileEntry": {"id": "test_dir_id", "name": "test_dir", "dir": True}},
+        {"fileEntry": {"id": "test_note_id", "name": "test.note", "dir": False}},
+    ],
+}
+# 分页测试用的大目录
+BIG_DIR = [
+    {"fileEntry": {"id": f"note_{i}", "name": f"{i}.md", "dir": False}}
+    for i in range(5)
+]
+NOTE = b'<?xml version="1.0" encoding="UTF-8"?><note></note>'
+
+
+def _file_entry(id: str, name: str, is_dir: bool = False) -> dict:
+    entry = {"id": id, "name": name, "dir": is_dir}
+    entry.update(modifyTimeForSort=1_600_000_000, createTimeForSort=1_600_000_000)
+    return {"fileEntry": entry}
+
+
+# 导出测试用的目录：test_dir 下有笔记、附件、下载失败的笔记和子目录
+PULL_DIRS = {
+    "test_dir_id": [
+        _file_entry("test_note_id", "test.note"),
+        _file_entry("test_pdf_id", "test.pdf"),
+        _file_entry("broken_note_id", "broken.note"),
+        _file_entry("test_sub_dir_id", "sub", is_dir=True),
+    ],
+    "test_sub_dir_id": [_file_entry("test_sub_note_id", "sub.note")],
+}
+
+
+class FakeYoudaoHandler(BaseHTTPRequestHandler):
+    """模拟有道云笔记的根目录、目录列表、文件下载三个接口"""
+
+    # flaky_note_id 的前几次下载返回 503
+    flaky_failures = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status: int, body: bytes):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self, query: dict) -> bool:
+        cookie = self.headers.get("Cookie", "")
+        return query.get("cstk") == [CSTK] and f"YNOTE_CSTK={CSTK}" in cookie
+
+    @staticmethod
+    def _big_dir_page(query: dict) -> dict:
+        length = int(query["len"][0])
+        ids = [entry["fileEntry"]["id"] for entry in BIG_DIR]
+        start = ids.index(query["lastId"][0]) + 1 if "lastId" in query else 0
+        return {"count": len(BIG_DIR), "entries": BIG_DIR[start : start + length]}
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if not self._authorized(query):
+            return self._reply(403, b"{}")
+        if query.get("method") == ["listPageByParentId"]:
+            if url.path.endswith("/slow_dir_id"):
+                time.sleep(0.5)
+            if url.path.endswith("/big_dir_id"):
+                return self._reply(200, json.dumps(self._big_dir_page(query)).encode())
+            if url.path.endswith("/ignore_last_id_dir_id"):
+                # 忽略 lastId 且不返回 count，每次都是第一页
+                body = {"entries": BIG_DIR[: int(query["len"][0])]}
+                return self._reply(200, json.dumps(body).encode())
+            for dir_id, entries in PULL_DIRS.items():
+                if url.path.endswith(f"/{dir_id}"):
+                    body = {"count": len(entries), "entries": entries}
+                    return self._reply(200, json.dumps(body).encode())
+            return self._reply(200, json.dumps(DIR_INFO).encode())
+        self._reply(404, b"")
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        length = int(self.headers.get("Content-Length", 0))
+        form = parse_qs(self.rfile.read(length).decode())
+        if not self._authorized(query) or form.get("cstk") != [CSTK]:
+            return self._reply(403, b"{}")
+        if query.get("method") == ["getByPath"]:
+            body = {"fileEntry": {"id": "test_root_id", "name": "ROOT"}}
+            return self._reply(200, json.dumps(body).encode())
+        if query.get("method") == ["download"] and form.get("fileId"):
+            file_id = form["fileId"][0]
+            if file_id == "broken_note_id":
+                return self._reply(500, b"")
+            if file_id == "flaky_note_id" and FakeYoudaoHandler.flaky_failures > 0:
+                FakeYoudaoHandler.flaky_failures -= 1
+                return self._reply(503, b"")
+            return self._reply(200, NOTE)
+        self._reply(404, b"")
+
+
+@pytest.fixture
+def fake_server(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeYoudaoHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    for name in ("ROOT_ID_URL", "DIR_MES_URL", "FILE_URL"):
+        url = getattr(api, name).replace("https://note.youdao.com", base)
+        monkeypatch.setattr(api, name, url)
+    yield base
+    server.shutdown()
+
+
+@pytest.fixture
+def cookies_file(tmp_path):
+    path = tmp_path / "cookies.txt"
+    path.write_text(f"YNOTE_CSTK={CSTK}; YNOTE_SESS=test_sess")
+    return str(path)
+
+
+def test_load_cookies_without_cstk(tmp_path):
+    path = tmp_path / "cookies.txt"
+    path.write_text("YNOTE_SESS=test_sess")
+    with pytest.raises(ValueError):
+        api.load_cookies(str(path))
+
+
+@requires_aiohttp
+def test_async_session(fake_server, cookies_file):
+    async def run():
+        async with api.AsyncYoudaoNoteSession(cookies_file, limit=2) as session:
+            root = await session.get_root_dir_info_id()
+            dir_info, note = await asyncio.gather(
+                session.get_dir_info_by_id(root["fileEntry"]["id"]),
+                session.get_file_by_id("test_note_id"),
+            )
+        return root, dir_info, note
+
+    root, dir_info, note = asyncio.run(run())
+    assert root["fileEntry"]["id"] == "test_root_id"
+    assert dir_info == DIR_INFO
+    assert note == NOTE
+
+
+@requires_aiohttp
+def test_sync_and_async_session_agree(fake_server, cookies_file):
+    sync_session = api.YoudaoNoteSession(cookies_file)
+
+    async def run():
+        async with api.AsyncYoudaoNoteSession(cookies_file) as session:
+            return await session.get_dir_info_by_id("test_root_id")
+
+    assert asyncio.run(run()) == sync_session.get_dir_info_by_id("test_root_id")
+
+
+def test_iter_dir_entries_paginates(fake_server, cookies_file):
+    session = api.YoudaoNoteSession(cookies_file)
+    expected = [entry["fileEntry"] for entry in BIG_DIR]
+    assert list(session.iter_dir_entries("big_dir_id", page_size=2)) == expected
+    assert list(session.iter_dir_entries("big_dir_id", page_size=5)) == expected
+
+
+@requires_aiohttp
+def test_async_iter_dir_entries_paginates(fake_server, cookies_file):
+    expected = [entry["fileEntry"] for entry in BIG_DIR]
+
+    async def run():
+        async with api.AsyncYoudaoNoteSession(cookies_file) as session:
+            return [e async for e in session.iter_dir_entries("big_dir_id", 2)]
+
+    assert asyncio.run(run()) == expected
+
+
+def test_iter_dir_entries_stops_on_repeated_page(fake_server, cookies_file):
+    session = api.YoudaoNoteSession(cookies_file)
+    expected = [entry["fileEntry"] for entry in BIG_DIR[:2]]
+    entries = session.iter_dir_entries("ignore_last_id_dir_id", page_size=2)
+    assert list(entries) == expected
+
+
+@requires_aiohttp
+def test_async_iter_dir_entries_stops_on_repeated_page(fake_server, cookies_file):
+    expected = [entry["fileEntry"] for entry in BIG_DIR[:2]]
+
+    async def run():
+        async with api.AsyncYoudaoNoteSession(cookies_file) as session:
+            entries = session.iter_dir_entries("ignore_last_id_dir_id", 2)
+            return [e async for e in entries]
+
+    assert asyncio.run(run()) == expected
+
+
+def test_session_retries_server_errors(fake_server, cookies_file):
+    policy = RetryPolicy(rate_limit=1000, max_retries=2, backoff=0.01)
+    session = api.YoudaoNoteSession(cookies_file, retry_policy=policy)
+    FakeYoudaoHandler.flaky_failures = 2
+    assert session.get_file_by_id("flaky_note_id").content == NOTE
+    # 重试次数用完仍失败时抛出异常
+    FakeYoudaoHandler.flaky_failures = 3
+    with pytest.raises(HTTPError):
+        session.get_file_by_id("flaky_note_id")
+    with pytest.raises(HTTPError):
+        session.get_file_by_id("broken_note_id")
+
+
+@requires_aiohttp
+def test_async_session_retries_server_errors(fake_server, cookies_file):
+    policy = RetryPolicy(rate_limit=1000, max_retries=2, backoff=0.01)
+
+    async def run():
+        async with api.AsyncYoudaoNoteSession(
+            cookies_file, retry_policy=policy
+        ) as session:
+            FakeYoudaoHandler.flaky_failures = 2
+            return await session.get_file_by_id("flaky_note_id")
+
+    assert asyncio.run(run()) == NOTE
+
+
+def test_session_timeout(fake_server, cookies_file):
+    policy = RetryPolicy(max_retries=0)
+    session = api.YoudaoNoteSession(cookies_file, retry_policy=policy, timeout=(1, 0.1))
+    with pytest.raises(Timeout):
+        session.get_dir_info_by_id("slow_dir_id")
+    # 连接池调整后仍可正常请求
+    session.resize_pool(2)
+    assert session.get_dir_info_by_id("test_root_id") == DIR_INFO
+
+
+@requires_aiohttp
+def test_async_pull(fake_server, cookies_file, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(CONFIG, "max_workers", 2)
+    monkeypatch.setattr(CONFIG, "progress", False)
+    METRICS.reset()
+    policy = RetryPolicy(max_retries=0)
+
+    def pull():
+        session = api.YoudaoNoteSession(cookies_file, retry_policy=policy)
+        AsyncYoudaoNotePull(
+            session=session, local_dir="notes", ydnote_dir="test_dir"
+        ).pull_recursively()
+
+    pull()
+    assert (tmp_path / "notes" / "test.md").exists()
+    assert (tmp_path / "notes" / "test.pdf").read_bytes() == NOTE
+    assert (tmp_path / "notes" / "sub" / "sub.md").exists()
+    # 下载失败的笔记不影响其他文件
+    assert not (tmp_path / "notes" / "broken.md").exists()
+    counters = METRICS.to_dict()["counters"]
+    assert counters["files.add"] == 3
+    assert counters["files.failed"] == 1
+
+    # 再次导出时，同步清单中未更新的文件直接跳过
+    METRICS.reset()
+    pull()
+    counters = METRICS.to_dict()["counters"]
+    assert counters["files.skipped"] == 3
+    assert "files.add" not in counters
@@ -0,0 +1,114 @@
+import os
+
+import pytest
+
+from youdaonote_pull import batch, core
+from youdaonote_pull.batch import Account, load_accounts, pull_accounts
+from youdaonote_pull.config import CONFIG
+
+
+@pytest.fixture
+def accounts_dir(tmp_path, monkeypatch, fake_session):
+    monkeypatch.chdir(tmp_path)
+    os.mkdir("config")
+    for name in ("alice", "bob"):
+        with open(os.path.join("config", f"{name}.txt"), "w") as fp:
+            fp.write(name)
+    sessions = []
+
+    def create_session(cookies_path, retry_policy=None):
+        # 根目录下有两篇 MarkDown 笔记，内容包含账号名
+        with open(cookies_path) as fp:
+            account = fp.read()
+        tree = {f"{i}.md": f"# {account}-{i}".encode() for i in range(2)}
+        session = fake_session(tree, cookies_path, retry_policy)
+        session.account = account
+        sessions.append(session)
+        return session
+
+    monkeypatch.setattr(batch, "YoudaoNoteSession", create_session)
+    monkeypatch.setattr(CONFIG, "local_dir", "notes")
+    monkeypatch.setattr(CONFIG, "max_workers", 2)
+    monkeypatch.setattr(CONFIG, "rate_limit", 0)
+    return sessions
+
+
+def test_pull_accounts(accounts_dir):
+    accounts = [
+        Account("alice", "config/alice.txt", rate_limit=2),
+        Account("bob", "config/bob.txt", local_dir="bob-notes"),
+        Account("carol", "config/carol.txt"),
+    ]
+    results = pull_accounts(accounts)
+
+    assert results["alice"] is None and results["bob"] is None
+    # 缺少 cookies 的账号失败，不影响其他账号
+    assert isinstance(results["carol"], FileNotFoundError)
+
+    with open("notes/alice/1.md", encoding="utf-8") as fp:
+        assert fp.read() == "# alice-1"
+    assert os.path.exists("bob-notes/0.md")
+    # 每个账号使用各自的同步清单与限速
+    assert os.path.exists("config/manifest-alice.jsonl")
+    assert os.path.exists("config/manifest-bob.jsonl")
+    sessions = {session.account: session for session in accounts_dir}
+    alice, bob = sessions["alice"], sessions["bob"]
+    assert alice.retry_policy.limiter.rate == 2
+    assert bob.retry_policy.limiter.rate == 0
+    # 所有账号的文件由同一个下载线程池处理
+    assert all(name.startswith("pull") for name in alice.threads | bob.threads)
+
+
+class FakeAsyncSession:
+    """按 cookies 路径找到账号的 FakeSession，返回其目录列表"""
+
+    def __init__(self, sessions, cookies_path, limit=None, retry_policy=None):
+        self.session = next(s for s in sessions if s.cookies_path == cookies_path)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def iter_dir_entries(self, dir_id):
+        for entry in self.session.iter_dir_entries(dir_id):
+            yield entry
+
+
+def test_pull_accounts_async(accounts_dir, monkeypatch):
+    monkeypatch.setattr(
+        core,
+        "AsyncYoudaoNoteSession",
+        lambda *args, **kwargs: FakeAsyncSession(accounts_dir, *args, **kwargs),
+    )
+    accounts = [Account(name, f"config/{name}.txt") for name in ("alice", "bob")]
+    results = pull_accounts(accounts, use_async=True)
+
+    assert results == {"alice": None, "bob": None}
+    with open("notes/bob/0.md", encoding="utf-8") as fp:
+        assert fp.read() == "# bob-0"
+    # 异步模式下，所有账号的文件同样由共享的下载线程池处理
+    threads = set().union(*(session.threads for session in accounts_dir))
+    assert threads and all(name.startswith("pull") for name in threads)
+
+
+def test_load_accounts(tmp_path):
+    path = tmp_path / "accounts.toml"
+    path.write_text(
+        '[[accounts]]\nname = "alice"\ncookies = "a.txt"\n'
+        '[[accounts]]\nname = "bob"\ncookies = "b.txt"\nydnote_dir = "work"\n',
+        encoding="utf-8",
+    )
+    alice, bob = load_accounts(str(path))
+    assert alice == Account("alice", "a.txt")
+    assert bob.ydnote_dir == "work"
+    assert bob.manifest_path == os.path.join("config", "manifest-bob.jsonl")
+
+    path.write_text(
+        '[[accounts]]\nname = "a"\ncookies = "a.txt"\n'
+        '[[accounts]]\nname = "a"\ncookies = "b.txt"\n',
+        encoding="utf-8",
+    )
+    with pytest.raises(ValueError):
+        load_accounts(str(path))
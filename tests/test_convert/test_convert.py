@@ -1,6 +1,11 @@
+import io
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-from youdaonote_pull.convert import YoudaoNoteConvert
+import pytest
+
+from youdaonote_pull.convert import JsonConvert, XmlElementConvert, YoudaoNoteConvert
 
 THIS_DIR = Path(__file__).parent
 
@@ -55,3 +60,85 @@ def test_covert_json_to_markdown_single_line():
         target = fp.read()
     # CRLF => \r\n, LF => \n
     assert line.replace("\r\n", "\n") == target
+
+
+def test_convert_bytes_matches_file():
+    """
+    测试内存中转换与按文件转换结果一致
+    """
+    xml = (THIS_DIR / "test.note").read_bytes()
+    assert YoudaoNoteConvert.xml_to_markdown(
+        xml
+    ) == YoudaoNoteConvert._covert_xml_to_markdown_content(THIS_DIR / "test.note")
+    json_bytes = (THIS_DIR / "test.json").read_bytes()
+    assert YoudaoNoteConvert.json_to_markdown(
+        json_bytes
+    ) == YoudaoNoteConvert._covert_json_to_markdown_content(THIS_DIR / "test.json")
+    assert YoudaoNoteConvert.xml_to_markdown(b"") == ""
+
+
+def test_covert_xml_to_markdown_file(tmp_path):
+    """
+    测试按文件流式转换 xml，写入 .md 并删除原文件
+    """
+    note = tmp_path / "test.note"
+    note.write_bytes((THIS_DIR / "test.note").read_bytes())
+    assert YoudaoNoteConvert.covert_xml_to_markdown(str(note))
+    assert not note.exists()
+    content = (tmp_path / "test.md").read_bytes().decode("utf-8")
+    with open(THIS_DIR / "test.md", encoding="utf-8") as fp:
+        assert content.replace("\r\n", "\n") == fp.read()
+
+
+def test_iter_xml_markdown_blocks_is_incremental():
+    """
+    测试逐块转换：块在笔记解析完成前即可得到，已转换的块从树中移除
+    """
+    para = b"<para><text>line</text></para>"
+    source = io.BytesIO(
+        b'<note xmlns="http://note.youdao.com"><head/><body>'
+        + para * 3
+        + b"<para><text>broken"
+    )
+    blocks = YoudaoNoteConvert.iter_xml_markdown_blocks(source)
+    assert [next(blocks) for _ in range(3)] == ["line"] * 3
+    with pytest.raises(ET.ParseError):
+        next(blocks)
+
+
+def test_register_custom_handlers(monkeypatch):
+    """
+    测试注册自定义块转换函数
+    """
+    monkeypatch.setattr(
+        XmlElementConvert, "_handlers", dict(XmlElementConvert._handlers)
+    )
+    monkeypatch.setattr(XmlElementConvert, "_tag_handlers", {})
+    monkeypatch.setattr(JsonConvert, "_handlers", dict(JsonConvert._handlers))
+
+    @XmlElementConvert.register("{http://note.youdao.com}horizontal-line")
+    def convert_horizontal_line(**kwargs):
+        return "***"
+
+    xml = (
+        b'<note xmlns="http://note.youdao.com"><head/><body>'
+        b"<para><text>a</text></para><horizontal-line/></body></note>"
+    )
+    assert YoudaoNoteConvert.xml_to_markdown(xml) == "a\r\n\r\n***"
+
+    JsonConvert.register("x", lambda converter, content: content["x"])
+    json_bytes = b'{"5": [{"6": "x", "x": "custom"}, {"6": "unknown", "5": []}]}'
+    assert YoudaoNoteConvert.json_to_markdown(json_bytes) == "custom"
+
+
+def test_convert_in_process_pool():
+    """
+    测试转换函数可交给进程池执行
+    """
+    xml = (THIS_DIR / "test.note").read_bytes()
+    json_bytes = (THIS_DIR / "test.json").read_bytes()
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        xml_future = executor.submit(YoudaoNoteConvert.xml_to_markdown, xml)
+        json_future = executor.submit(YoudaoNoteConvert.json_to_markdown, json_bytes)
+        assert xml_future.result() == YoudaoNoteConvert.xml_to_markdown(xml)
+        assert json_future.result() == YoudaoNoteConvert.json_to_markdown(json_bytes)
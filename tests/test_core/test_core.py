@@ -0,0 +1,283 @@
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+import pytest
+from requests.exceptions import HTTPError
+
+from youdaonote_pull import core
+from youdaonote_pull.config import CONFIG
+from youdaonote_pull.core import PullExecutors, YoudaoNotePull
+from youdaonote_pull.metrics import METRICS
+from youdaonote_pull.ratelimit import CircuitOpenError
+
+NOTE = b'<?xml version="1.0" encoding="UTF-8"?><note></note>'
+IMAGE_URL = "https://note.youdao.com/yws/res/1/WEBRESOURCEabc"
+NOTE_WITH_IMAGE = f"![图片]({IMAGE_URL})".encode()
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """在临时目录中导出，同步清单写入其中的 config/"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(CONFIG, "max_workers", 1)
+    monkeypatch.setattr(CONFIG, "progress", False)
+    monkeypatch.setattr(CONFIG, "skip_unchanged_dirs", False)
+    METRICS.reset()
+    return tmp_path
+
+
+def pull(session, **kwargs) -> YoudaoNotePull:
+    youdaonote_pull = YoudaoNotePull(session=session, local_dir="notes", **kwargs)
+    youdaonote_pull.pull_recursively()
+    return youdaonote_pull
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_each_note_downloaded_once(workdir, fake_session, monkeypatch, max_workers):
+    monkeypatch.setattr(CONFIG, "max_workers", max_workers)
+    tree = {
+        "xml.note": NOTE,
+        "json.clip": b'{"5": [{"5": [{"7": [{"8": "json"}]}]}]}',
+        "html.note": b"<div>html</div>",
+        "no-suffix": NOTE,
+        "a.md": b"# a",
+        "a.pdf": b"%PDF",
+    }
+    session = fake_session(tree)
+    pull(session)
+
+    # 判断格式与转换复用同一份内容，每个文件只请求一次
+    assert session.downloads == {id: 1 for id in tree}
+    assert (workdir / "notes" / "json.md").read_text() == "json"
+    assert (workdir / "notes" / "html.note").exists()
+    assert (workdir / "notes" / "no-suffix.md").exists()
+    assert (workdir / "notes" / "a.pdf").read_bytes() == b"%PDF"
+
+
+def image_target(note_path):
+    """笔记中第一个图片链接指向的本地文件"""
+    link = re.search(r"!\[.*?\]\((.*?)\)", note_path.read_text()).group(1)
+    return note_path.parent / link
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_broken_note_does_not_abort(
+    workdir, fake_session, monkeypatch, caplog, max_workers
+):
+    monkeypatch.setattr(CONFIG, "max_workers", max_workers)
+    tree = {
+        "a.md": b"# a",
+        "broken.note": HTTPError("下载文件「broken.note」失败，状态码 500"),
+        "sub": {"b.note": NOTE, "c.md": b"# c"},
+    }
+    session = fake_session(tree)
+    with caplog.at_level(logging.WARNING):
+        pull(session)
+
+    # 其他文件照常导出，失败的文件计入 files.failed 并输出警告
+    assert (workdir / "notes" / "a.md").read_text() == "# a"
+    assert (workdir / "notes" / "sub" / "b.md").exists()
+    assert (workdir / "notes" / "sub" / "c.md").exists()
+    assert not (workdir / "notes" / "broken.md").exists()
+    assert METRICS.to_dict()["counters"]["files.failed"] == 1
+    assert "broken.note" in caplog.text
+
+    # 失败的文件未写入清单，下次导出时重新下载
+    session.files["broken.note"] = NOTE
+    pull(session)
+    assert os.path.exists(workdir / "notes" / "broken.md")
+
+
+def test_unchanged_files_skipped_without_requests(workdir, fake_session, monkeypatch):
+    session = fake_session({"a.md": b"# a", "sub": {"b.note": NOTE}})
+    pull(session)
+    session.downloads.clear()
+
+    checked = []
+    getmtime, exists = os.path.getmtime, os.path.exists
+    with monkeypatch.context() as m:
+        m.setattr(os.path, "getmtime", lambda p: checked.append(p) or getmtime(p))
+        m.setattr(os.path, "exists", lambda p: checked.append(p) or exists(p))
+        pull(session)
+
+    # 按同步清单跳过，不下载内容，也不访问本地笔记文件
+    assert not session.downloads
+    assert not [p for p in checked if str(p).endswith(".md")]
+    assert METRICS.to_dict()["counters"]["files.skipped"] == 2
+
+
+def test_renamed_file_is_moved(workdir, fake_session):
+    session = fake_session({"a.md": b"# a"})
+    pull(session)
+    session.entry("a.md")["name"] = "c.md"
+    pull(session)
+
+    assert (workdir / "notes" / "c.md").read_text() == "# a"
+    assert not (workdir / "notes" / "a.md").exists()
+    assert session.downloads["a.md"] == 1
+
+
+def test_note_moved_to_other_folder_is_pulled_again(workdir, fake_session):
+    session = fake_session(
+        {"a.md": NOTE_WITH_IMAGE, "sub": {}}, resources={IMAGE_URL: b"png"}
+    )
+    pull(session)
+    assert image_target(workdir / "notes" / "a.md").read_bytes() == b"png"
+
+    entry = session.entry("a.md")
+    session.dirs["root"].remove(entry)
+    session.dirs["sub"].append(entry)
+    pull(session)
+
+    # 图片使用相对路径，重新下载后链接指向新目录下的图片
+    moved = workdir / "notes" / "sub" / "a.md"
+    assert image_target(moved).read_bytes() == b"png"
+    assert session.downloads["a.md"] == 2
+    assert (workdir / "notes" / "a.md").exists()
+
+
+def test_deleted_file_is_reported(workdir, fake_session, caplog):
+    session = fake_session({"a.md": b"# a", "b.md": b"# b"})
+    pull(session)
+    session.dirs["root"].remove(session.entry("b.md"))
+    with caplog.at_level(logging.INFO):
+        pull(session)
+
+    assert "云端已删除「notes/b.md」" in caplog.text
+    # 本地文件保留
+    assert (workdir / "notes" / "b.md").exists()
+
+
+def test_unchanged_dir_not_listed_again(workdir, fake_session, monkeypatch):
+    monkeypatch.setattr(CONFIG, "skip_unchanged_dirs", True)
+    session = fake_session({"a.md": b"# a", "sub": {"b.md": b"# b", "deep": {}}})
+    youdaonote_pull = pull(session)
+    assert session.listed == ["root", "sub", "sub/deep"]
+    entry = youdaonote_pull.manifest.get_dir("sub")
+    assert (entry.path, entry.children, entry.subdirs) == (
+        "notes/sub",
+        ["sub/b.md"],
+        ["sub/deep"],
+    )
+
+    session.listed.clear()
+    session.downloads.clear()
+    youdaonote_pull = pull(session)
+    # 目录修改时间未变，整个子树不再请求，子项仍视为在云端出现过
+    assert session.listed == ["root"]
+    assert not session.downloads
+    assert METRICS.to_dict()["counters"]["dirs.skipped"] == 1
+    assert youdaonote_pull.manifest.get("sub/b.md") is not None
+    assert youdaonote_pull.manifest.get_dir("sub/deep") is not None
+
+
+def test_changed_dir_listed_again(workdir, fake_session, monkeypatch):
+    monkeypatch.setattr(CONFIG, "skip_unchanged_dirs", True)
+    session = fake_session({"sub": {"b.md": b"# b", "deep": {"c.md": b"# c"}}})
+    pull(session)
+    session.listed.clear()
+
+    session.entry("sub")["modifyTimeForSort"] += 10
+    youdaonote_pull = pull(session)
+    # 只有修改时间变化的目录重新获取列表，其中未变化的子目录仍跳过
+    assert session.listed == ["root", "sub"]
+    assert youdaonote_pull.manifest.get_dir("sub").modify_time == 1_600_000_010
+
+
+def test_failed_download_keeps_dirs_unrecorded(workdir, fake_session, monkeypatch):
+    monkeypatch.setattr(CONFIG, "skip_unchanged_dirs", True)
+    tree = {
+        "sub": {"ok.md": b"# ok", "deep": {"bad.md": HTTPError("状态码 500")}},
+        "other": {"c.md": b"# c"},
+    }
+    session = fake_session(tree)
+    youdaonote_pull = pull(session)
+    # 失败文件所在目录及其上级目录都不记录，下次重新获取列表
+    assert youdaonote_pull.manifest.get_dir("sub/deep") is None
+    assert youdaonote_pull.manifest.get_dir("sub") is None
+    assert youdaonote_pull.manifest.get_dir("other") is not None
+
+    session.listed.clear()
+    session.files["sub/deep/bad.md"] = b"# bad"
+    youdaonote_pull = pull(session)
+    assert session.listed == ["root", "sub", "sub/deep"]
+    assert session.downloads["sub/deep/bad.md"] == 2
+    assert youdaonote_pull.manifest.get_dir("sub") is not None
+
+
+def test_circuit_open_stops_pull(workdir, fake_session):
+    session = fake_session({"a.md": CircuitOpenError("服务不可用"), "b.md": b"# b"})
+    # 多次熔断后服务仍不可用时终止导出，而不是逐个文件失败
+    with pytest.raises(CircuitOpenError):
+        pull(session)
+
+
+def test_concurrent_pull_sets_file_times(workdir, fake_session, monkeypatch):
+    monkeypatch.setattr(CONFIG, "max_workers", 4)
+    tree = {f"{i}.md": f"# {i}".encode() for i in range(8)}
+    tree["sub"] = {"a.note": NOTE}
+    session = fake_session(tree)
+    pull(session)
+
+    # 文件由线程池中的线程下载，修改时间为有道云笔记的时间
+    assert all(name.startswith("pull") for name in session.threads)
+    for path in [*(f"{i}.md" for i in range(8)), "sub/a.md"]:
+        assert os.path.getmtime(workdir / "notes" / path) == 1_600_000_000
+
+
+def test_concurrent_pull_serializes_same_path(workdir, fake_session, monkeypatch):
+    monkeypatch.setattr(CONFIG, "max_workers", 4)
+    # a.md 与 a.note 的本地路径均为 a.md
+    session = fake_session({"a.md": b"# a", "a.note": NOTE, "b.md": b"# b"})
+    active, overlaps = Counter(), []
+    lock = threading.Lock()
+    save_content = core.save_content
+
+    def slow_save_content(content, file_path):
+        with lock:
+            active[file_path] += 1
+            overlaps.append(active[file_path])
+        time.sleep(0.05)
+        save_content(content, file_path)
+        with lock:
+            active[file_path] -= 1
+
+    monkeypatch.setattr(core, "save_content", slow_save_content)
+    pull(session)
+
+    # 后处理的同名文件可能因本地文件已是最新而跳过，写入 a.md 的不会同时进行
+    assert len(overlaps) >= 2
+    assert max(overlaps) == 1
+
+
+def test_concurrent_pull_stops_after_worker_error(workdir, fake_session, monkeypatch):
+    monkeypatch.setattr(CONFIG, "max_workers", 2)
+
+    class SlowListingSession(fake_session):
+        def iter_dir_entries(self, dir_id):
+            if dir_id != "root":
+                time.sleep(0.05)
+            return super().iter_dir_entries(dir_id)
+
+    tree = {"bad.md": CircuitOpenError("服务不可用")}
+    tree.update({f"d{i}": {"a.md": b"# a"} for i in range(10)})
+    session = SlowListingSession(tree)
+
+    # 线程中未处理的异常在遍历线程中抛出，并且不再提交后续文件
+    with pytest.raises(CircuitOpenError):
+        pull(session)
+    assert len(session.listed) < 11
+    assert sum(session.downloads.values()) < 11
+
+
+def test_convert_processes_with_single_worker_warns(caplog):
+    with caplog.at_level(logging.WARNING):
+        executors = PullExecutors(max_workers=1, image_workers=1, convert_processes=2)
+    executors.shutdown()
+    # 下载线程逐个等待转换结果，转换进程池不能与下载并行
+    assert "convert_processes" in caplog.text
+    assert executors._convert is None
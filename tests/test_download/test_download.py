@@ -0,0 +1,152 @@
+import threading
+import time
+
+import pytest
+
+from youdaonote_pull import download
+from youdaonote_pull.download import (
+    partial_download_path,
+    resume_download,
+    save_content,
+    save_response,
+    save_response_resumable,
+)
+
+URL = "https://note.youdao.com/yws/res/1/WEBRESOURCEabc"
+DATA = b"0123456789" * 3
+
+
+class FakeResponse:
+    def __init__(self, chunks, fail_after=None, status_code=200, headers=None, delay=0):
+        self.chunks = chunks
+        self.fail_after = fail_after
+        self.delay = delay
+        self.closed = False
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def iter_content(self, chunk_size):
+        for index, chunk in enumerate(self.chunks):
+            if index == self.fail_after:
+                raise ConnectionError("连接中断")
+            time.sleep(self.delay)
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+
+def test_save_response(tmp_path):
+    path = tmp_path / "a.pdf"
+    response = FakeResponse([b"a" * 10, b"b" * 5])
+    assert save_response(response, str(path)) == 15
+    assert path.read_bytes() == b"a" * 10 + b"b" * 5
+    assert response.closed
+    assert [p.name for p in tmp_path.iterdir()] == ["a.pdf"]
+
+
+def test_save_response_interrupted_keeps_old_file(tmp_path):
+    path = tmp_path / "a.pdf"
+    path.write_bytes(b"old")
+    response = FakeResponse([b"new", b"new"], fail_after=1)
+    with pytest.raises(ConnectionError):
+        save_response(response, str(path))
+    assert path.read_bytes() == b"old"
+    assert response.closed
+    assert [p.name for p in tmp_path.iterdir()] == ["a.pdf"]
+
+
+def test_save_content_replaces_file(tmp_path):
+    path = tmp_path / "a.md"
+    path.write_bytes(b"old")
+    save_content(b"new", str(path))
+    assert path.read_bytes() == b"new"
+
+
+class FakeRangeApi:
+    """按 Range 请求头返回部分内容，support_range 为 False 时总是返回完整内容"""
+
+    def __init__(self, support_range=True):
+        self.support_range = support_range
+        self.requests = []
+
+    def full_response(self, fail_after=None):
+        headers = {"Content-Length": str(len(DATA)), "ETag": '"v1"'}
+        chunks = [DATA[i : i + 10] for i in range(0, len(DATA), 10)]
+        return FakeResponse(chunks, fail_after=fail_after, headers=headers)
+
+    def http_get(self, url, stream=False, headers=None):
+        self.requests.append(headers)
+        if headers and "Range" in headers and self.support_range:
+            start = int(headers["Range"][len("bytes=") : -1])
+            content_range = f"bytes {start}-{len(DATA) - 1}/{len(DATA)}"
+            return FakeResponse(
+                [DATA[start:]],
+                status_code=206,
+                headers={"Content-Range": content_range},
+            )
+        return self.full_response()
+
+
+@pytest.mark.parametrize("support_range", [True, False])
+def test_resume_download(tmp_path, monkeypatch, support_range):
+    monkeypatch.setattr(download, "RESUMABLE_MIN_SIZE", len(DATA))
+    path = tmp_path / "a.pdf"
+    api = FakeRangeApi(support_range)
+    with pytest.raises(ConnectionError):
+        save_response_resumable(URL, api.full_response(fail_after=2), str(path))
+    assert not path.exists()
+    assert (tmp_path / "a.pdf.part").read_bytes() == DATA[:20]
+    assert partial_download_path(str(tmp_path), URL) == str(path)
+
+    # 续传时直接发送 Range 请求，不再先请求完整内容
+    assert resume_download(api, URL, str(path)) == (10 if support_range else 30)
+    assert path.read_bytes() == DATA
+    assert api.requests == [{"Range": "bytes=20-", "If-Range": '"v1"'}]
+    assert [p.name for p in tmp_path.iterdir()] == ["a.pdf"]
+    assert partial_download_path(str(tmp_path), URL) is None
+
+
+def test_small_file_not_resumable(tmp_path):
+    path = tmp_path / "a.png"
+    api = FakeRangeApi()
+    # 小于 RESUMABLE_MIN_SIZE 的文件中断后不保留，也不写入续传信息
+    with pytest.raises(ConnectionError):
+        save_response_resumable(URL, api.full_response(fail_after=2), str(path))
+    assert list(tmp_path.iterdir()) == []
+
+    save_response_resumable(URL, api.full_response(), str(path))
+    assert path.read_bytes() == DATA
+    assert [p.name for p in tmp_path.iterdir()] == ["a.png"]
+
+
+@pytest.mark.parametrize("resumable", [True, False])
+def test_concurrent_writes_to_same_path(tmp_path, monkeypatch, resumable):
+    """多篇笔记同时下载同一图片到同一路径，全部成功且不残留临时文件"""
+    monkeypatch.setattr(download, "RESUMABLE_MIN_SIZE", len(DATA))
+    path = str(tmp_path / "a.png")
+    headers = {"Content-Length": str(len(DATA))}
+    chunks = [DATA[i : i + 10] for i in range(0, len(DATA), 10)]
+    errors = []
+
+    def write():
+        response = FakeResponse(chunks, headers=headers, delay=0.01)
+        try:
+            if resumable:
+                save_response_resumable(URL, response, path)
+            else:
+                save_response(response, path)
+        except Exception as err:
+            errors.append(err)
+
+    threads = [threading.Thread(target=write) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert (tmp_path / "a.png").read_bytes() == DATA
+    assert [p.name for p in tmp_path.iterdir()] == ["a.png"]
+    # 写入完成后不再保留该路径的锁
+    assert download._path_locks == {}
@@ -0,0 +1,252 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from youdaonote_pull import download
+from youdaonote_pull.cache import ResourceCache
+from youdaonote_pull.image import ImagePull, ImageUpload
+
+PNG = b"\x89PNG fake image"
+
+
+class FakeResponse:
+    def __init__(self, url, content, content_type="image/png"):
+        self.url = url
+        self.content = content
+        self.status_code = 200
+        self.headers = {
+            "Content-Type": content_type,
+            "Content-Length": str(len(content)),
+        }
+
+    def iter_content(self, chunk_size):
+        yield self.content
+
+    def close(self):
+        pass
+
+
+class FakeApi:
+    """按 URL 返回固定内容，并记录请求"""
+
+    def __init__(self, resources: dict):
+        self.resources = resources
+        self.requested = []
+
+    def http_get(self, url, stream=False, headers=None):
+        self.requested.append(url)
+        content = self.resources[url]
+        if "ATTACH" in url:
+            return FakeResponse(url, content, "application/pdf")
+        return FakeResponse(url, content)
+
+
+def write_note(path, *urls):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lines = [f"![]({url})" for url in urls]
+    path.write_text("\n".join(lines), encoding="utf-8")
+    return str(path).replace("\\", "/")
+
+
+def test_resource_cache_hits_and_dedup(tmp_path):
+    url_a = "https://note.youdao.com/yws/res/1/WEBRESOURCEa"
+    url_b = "https://note.youdao.com/yws/res/2/WEBRESOURCEb"
+    api = FakeApi({url_a: PNG, url_b: PNG})
+    cache = ResourceCache(str(tmp_path / ".resources"))
+    image_pull = ImagePull(api, "", False, cache)
+
+    note1 = write_note(tmp_path / "a" / "1.md", url_a)
+    note2 = write_note(tmp_path / "b" / "2.md", url_a, url_b)
+    image_pull.migration_ydnote_url(note1)
+    image_pull.migration_ydnote_url(note2)
+
+    # url_a 第二次引用命中缓存，不再请求
+    assert api.requested == [url_a, url_b]
+    assert (cache.hits, cache.misses, cache.deduplicated) == (1, 2, 1)
+
+    image_a1 = tmp_path / "a" / "images" / "WEBRESOURCEa.png"
+    image_a2 = tmp_path / "b" / "images" / "WEBRESOURCEa.png"
+    image_b = tmp_path / "b" / "images" / "WEBRESOURCEb.png"
+    assert image_a2.read_bytes() == PNG
+    # 内容相同的文件只保存一份
+    assert os.path.samefile(image_a1, image_a2)
+    assert os.path.samefile(image_a1, image_b)
+    assert str(image_b).replace("\\", "/") in (tmp_path / "b" / "2.md").read_text(
+        encoding="utf-8"
+    )
+    cache.close()
+
+    # 重新打开后，URL 仍可命中
+    cache = ResourceCache(str(tmp_path / ".resources"))
+    assert cache.get(url_b).file_name == "WEBRESOURCEb.png"
+    cache.close()
+
+
+def test_resource_cache_drops_torn_index_line(tmp_path):
+    url_a = "https://note.youdao.com/yws/res/1/WEBRESOURCEa"
+    url_b = "https://note.youdao.com/yws/res/2/WEBRESOURCEb"
+    cache_dir = tmp_path / ".resources"
+    image = tmp_path / "a.png"
+    image.write_bytes(PNG)
+    cache = ResourceCache(str(cache_dir))
+    cache.add(url_a, str(image))
+    cache.close()
+    # 追加写入索引时中断，最后一行只写了一半
+    with open(cache_dir / "index.jsonl", "a", encoding="utf-8") as fp:
+        fp.write('{"url": "https://note.youdao.com/yws/res/2/WEBRE')
+
+    cache = ResourceCache(str(cache_dir))
+    assert cache.get(url_a).file_name == "a.png"
+    assert cache.get(url_b) is None
+    cache.add(url_b, str(image))
+    cache.close()
+
+    # 不完整的行已去掉，之后追加的记录可正常读取
+    cache = ResourceCache(str(cache_dir))
+    assert cache.get(url_b).file_name == "a.png"
+    cache.close()
+
+
+def test_migration_rewrites_all_links_in_one_pass(tmp_path):
+    base = "https://note.youdao.com/yws/res/1/WEBRESOURCE"
+    urls = [f"{base}{i}" for i in range(12)]  # WEBRESOURCE1 是 WEBRESOURCE10 的前缀
+    attach_url = "https://note.youdao.com/yws/res/2/ATTACH"
+    resources = {url: f"image {url}".encode() for url in urls}
+    resources[attach_url] = b"%PDF"
+    api = FakeApi(resources)
+    image_pull = ImagePull(api, "", True)
+
+    note = tmp_path / "1.md"
+    lines = [f"![]({url})" for url in urls + urls]
+    lines.append(f"[report.pdf]({attach_url})")
+    note.write_text("\n".join(lines), encoding="utf-8")
+    image_pull.migration_ydnote_url(str(note).replace("\\", "/"))
+
+    # 重复的链接只下载一次
+    assert api.requested == urls + [attach_url]
+    expected = [f"![](images/WEBRESOURCE{i}.png)" for i in range(12)] * 2
+    expected.append("[report.pdf](attachments/ATTACHreport.pdf)")
+    assert note.read_text(encoding="utf-8").split("\n") == expected
+
+
+class InterruptedApi(FakeApi):
+    """第一次请求在传输一半时中断，之后按 Range 请求头返回剩余部分，并记录请求头"""
+
+    def __init__(self, resources: dict):
+        super().__init__(resources)
+        self.headers = []
+
+    def http_get(self, url, stream=False, headers=None):
+        self.headers.append(headers)
+        response = super().http_get(url, stream, headers)
+        if len(self.headers) == 1:
+
+            def iter_content(chunk_size):
+                yield response.content[:10]
+                raise requests.exceptions.ConnectionError("连接中断")
+
+            response.iter_content = iter_content
+        elif headers and "Range" in headers:
+            start = int(headers["Range"][len("bytes=") : -1])
+            size = len(response.content)
+            response.content = response.content[start:]
+            response.status_code = 206
+            response.headers["Content-Range"] = f"bytes {start}-{size - 1}/{size}"
+        return response
+
+
+def test_interrupted_download_resumes_with_range(tmp_path, monkeypatch):
+    monkeypatch.setattr(download, "RESUMABLE_MIN_SIZE", 1)
+    url = "https://note.youdao.com/yws/res/1/WEBRESOURCEa"
+    api = InterruptedApi({url: PNG * 4})
+    image_pull = ImagePull(api, "", True)
+    note = write_note(tmp_path / "1.md", url)
+
+    image_pull.migration_ydnote_url(note)
+    assert (tmp_path / "images" / "WEBRESOURCEa.png.part").read_bytes() == PNG[:10]
+
+    # 再次导出时直接请求剩余部分
+    image_pull.migration_ydnote_url(note)
+    assert api.headers == [None, {"Range": "bytes=10-"}]
+    assert (tmp_path / "images" / "WEBRESOURCEa.png").read_bytes() == PNG * 4
+    assert os.listdir(tmp_path / "images") == ["WEBRESOURCEa.png"]
+    assert (tmp_path / "1.md").read_text(encoding="utf-8") == (
+        "![](images/WEBRESOURCEa.png)"
+    )
+
+
+class SlowApi(FakeApi):
+    """每个请求阻塞，直到有两个请求同时进行；记录最大并发数"""
+
+    def __init__(self, resources: dict):
+        super().__init__(resources)
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+        self.barrier = threading.Barrier(2, timeout=5)
+
+    def http_get(self, url, stream=False, headers=None):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            self.barrier.wait()
+        except threading.BrokenBarrierError:
+            pass
+        try:
+            if url not in self.resources:
+                self.requested.append(url)
+                raise requests.exceptions.ProxyError("fake proxy error")
+            return super().http_get(url, stream, headers)
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+def test_migration_downloads_concurrently(tmp_path):
+    base = "https://note.youdao.com/yws/res/1/WEBRESOURCE"
+    urls = [f"{base}{i}" for i in range(3)]
+    broken_url = "https://note.youdao.com/yws/res/1/BROKEN"
+    api = SlowApi({url: f"image {url}".encode() for url in urls})
+    note = write_note(tmp_path / "1.md", urls[0], broken_url, *urls[1:])
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        ImagePull(api, "", True, executor=executor).migration_ydnote_url(note)
+
+    assert api.max_active == 2
+    assert sorted(api.requested) == sorted(urls + [broken_url])
+    # 下载失败的链接保持原样，其余链接按原顺序替换
+    expected = [f"![](images/WEBRESOURCE{i}.png)" for i in range(3)]
+    expected.insert(1, f"![]({broken_url})")
+    assert (tmp_path / "1.md").read_text(encoding="utf-8").split("\n") == expected
+
+
+class FakeUploadSession:
+    def __init__(self):
+        self.timeouts = []
+
+    def post(self, url, headers=None, files=None, timeout=None):
+        self.timeouts.append(timeout)
+        response = FakeResponse(url, b"")
+        response.json = lambda: {
+            "success": True,
+            "data": {"url": "https://i.sm.ms/a.png"},
+        }
+        return response
+
+
+def test_upload_reuses_session(monkeypatch):
+    url = "https://note.youdao.com/yws/res/1/WEBRESOURCEa"
+    api = FakeApi({url: PNG})
+    session = FakeUploadSession()
+    monkeypatch.setattr(ImageUpload, "_session", session)
+    for _ in range(2):
+        assert ImageUpload.upload_to_smms(api, url, "token") == (
+            "https://i.sm.ms/a.png",
+            "",
+        )
+    assert ImageUpload.get_session() is session
+    # 每次上传都设置了超时
+    assert len(session.timeouts) == 2 and all(session.timeouts)
@@ -0,0 +1,82 @@
+import json
+import logging
+
+import pytest
+
+from youdaonote_pull import log
+from youdaonote_pull.core import PullExecutors
+
+
+@pytest.fixture
+def root_logger():
+    """init 会设置根日志的级别，测试后恢复"""
+    root = logging.getLogger()
+    level = root.level
+    yield root
+    log.shutdown()
+    root.setLevel(level)
+
+
+def test_init_writes_text_and_json_lines(tmp_path, monkeypatch, root_logger):
+    monkeypatch.chdir(tmp_path)
+    log_file = log.init("info", json_lines=True)
+
+    logging.debug("此文件「%s」不更新，跳过", "a.md")
+    logging.info(
+        "%s「%s」",
+        "新增",
+        "b.md",
+        extra={"file_id": "id-b", "action": "add", "bytes": 12, "duration": 0.5},
+    )
+    log.shutdown()
+
+    with open(log_file, encoding="utf-8") as fp:
+        text = fp.read()
+    assert "新增「b.md」" in text
+    # DEBUG 日志未达到级别，不格式化也不写入
+    assert "a.md" not in text
+
+    with open(log_file.replace(".log", ".jsonl"), encoding="utf-8") as fp:
+        records = [json.loads(line) for line in fp]
+    assert len(records) == 1
+    record = records[0]
+    assert record["level"] == "INFO"
+    assert record["message"] == "新增「b.md」"
+    assert record["file_id"] == "id-b"
+    assert record["bytes"] == 12
+    assert "path" not in record
+
+
+def test_logging_does_not_block_on_handlers(tmp_path, monkeypatch, root_logger):
+    monkeypatch.chdir(tmp_path)
+    log.init("INFO")
+    # 记录只放入队列，由后台线程写入
+    queue_handlers = [
+        handler
+        for handler in root_logger.handlers
+        if isinstance(handler, logging.handlers.QueueHandler)
+    ]
+    assert len(queue_handlers) == 1
+    log.shutdown()
+    assert queue_handlers[0] not in root_logger.handlers
+
+
+def test_convert_process_logs_reach_log_file(tmp_path, monkeypatch, root_logger):
+    monkeypatch.chdir(tmp_path)
+    log_file = log.init("INFO")
+    executors = PullExecutors(max_workers=2, image_workers=1, convert_processes=1)
+    # 进程池与日志队列在首次转换时才创建
+    assert executors._convert is None
+    assert log._process_listener is None
+    try:
+        executors.convert.submit(logging.warning, "转换进程中的日志").result()
+        executors.convert.submit(logging.debug, "转换进程中的调试日志").result()
+    finally:
+        executors.shutdown()
+    log.shutdown()
+
+    # 转换进程的日志由主进程写入同一文件，并按主进程的日志级别过滤
+    with open(log_file, encoding="utf-8") as fp:
+        text = fp.read()
+    assert "转换进程中的日志" in text
+    assert "调试日志" not in text
@@ -0,0 +1,102 @@
+from youdaonote_pull.manifest import DirManifestEntry, ManifestEntry, SyncManifest
+
+SCOPE = {"local_dir": "youdaonote", "ydnote_dir": ""}
+
+
+def test_manifest_persists_entries(tmp_path):
+    path = str(tmp_path / "manifest.jsonl")
+    manifest = SyncManifest(SCOPE, path)
+    manifest.update(ManifestEntry("id1", 1.0, "youdaonote/a.md", "XML"))
+    manifest.update(ManifestEntry("id2", 2.0, "youdaonote/b.pdf", "OTHER"))
+    manifest.update(ManifestEntry("id1", 3.0, "youdaonote/a.md", "XML"))
+    manifest.remove("id2")
+    manifest.close()
+
+    manifest = SyncManifest(SCOPE, path)
+    assert len(manifest) == 1
+    assert manifest.get("id1") == ManifestEntry("id1", 3.0, "youdaonote/a.md", "XML")
+    assert manifest.get("id2") is None
+    manifest.close()
+
+
+def test_manifest_missing_and_compact(tmp_path):
+    path = tmp_path / "manifest.jsonl"
+    manifest = SyncManifest(SCOPE, str(path))
+    for i in range(3):
+        manifest.update(ManifestEntry(f"id{i}", 1.0, f"youdaonote/{i}.md", "JSON"))
+    manifest.update(ManifestEntry("id0", 2.0, "youdaonote/0.md", "JSON"))
+    manifest.mark_seen("id0")
+    manifest.mark_seen("id2")
+    assert [e.id for e in manifest.missing()] == ["id1"]
+
+    manifest.remove("id1")
+    manifest.compact()
+    manifest.close()
+    # 范围 + 每个 ID 一行
+    assert len(path.read_text(encoding="utf-8").splitlines()) == 3
+
+
+def test_manifest_scope_changed(tmp_path):
+    path = str(tmp_path / "manifest.jsonl")
+    manifest = SyncManifest(SCOPE, path)
+    manifest.update(ManifestEntry("id1", 1.0, "youdaonote/a.md", "XML"))
+    manifest.close()
+
+    manifest = SyncManifest({"local_dir": "youdaonote", "ydnote_dir": "work"}, path)
+    assert len(manifest) == 0
+    manifest.close()
+
+
+def test_manifest_skipped_dir_marks_subtree_seen(tmp_path):
+    path = str(tmp_path / "manifest.jsonl")
+    manifest = SyncManifest(SCOPE, path)
+    manifest.update(ManifestEntry("id1", 1.0, "youdaonote/a/1.md", "XML"))
+    manifest.update(ManifestEntry("id2", 1.0, "youdaonote/a/b/2.md", "XML"))
+    manifest.update_dir(DirManifestEntry("a", 5.0, "youdaonote/a", ["id1"], ["b"]))
+    manifest.update_dir(DirManifestEntry("b", 5.0, "youdaonote/a/b", ["id2"], []))
+    manifest.update_dir(DirManifestEntry("c", 5.0, "youdaonote/c", [], []))
+    manifest.mark_dir_seen("a", recursive=True)
+    assert manifest.missing() == []
+
+    # 未出现的目录 c 在整理时去掉
+    manifest.compact()
+    manifest.close()
+    manifest = SyncManifest(SCOPE, path)
+    assert manifest.get_dir("b").children == ["id2"]
+    assert manifest.get_dir("c") is None
+    manifest.close()
+
+
+def test_manifest_drops_torn_line(tmp_path):
+    path = tmp_path / "manifest.jsonl"
+    manifest = SyncManifest(SCOPE, str(path))
+    manifest.update(ManifestEntry("id1", 1.0, "youdaonote/a.md", "XML"))
+    manifest.update(ManifestEntry("id2", 2.0, "youdaonote/b.md", "XML"))
+    manifest.close()
+    # 追加写入时中断，最后一行只写了一半
+    with open(path, "a", encoding="utf-8") as fp:
+        fp.write('{"id": "id3", "modify_time": 3.0, "pa')
+
+    manifest = SyncManifest(SCOPE, str(path))
+    assert len(manifest) == 2
+    assert manifest.get("id2") == ManifestEntry("id2", 2.0, "youdaonote/b.md", "XML")
+    manifest.update(ManifestEntry("id3", 3.0, "youdaonote/c.md", "XML"))
+    manifest.close()
+
+    # 不完整的行已去掉，之后追加的记录可正常读取
+    manifest = SyncManifest(SCOPE, str(path))
+    assert len(manifest) == 3
+    manifest.close()
+
+
+def test_manifest_torn_scope_line(tmp_path):
+    path = tmp_path / "manifest.jsonl"
+    path.write_text('{"scope": {"local_', encoding="utf-8")
+    manifest = SyncManifest(SCOPE, str(path))
+    assert len(manifest) == 0
+    manifest.update(ManifestEntry("id1", 1.0, "youdaonote/a.md", "XML"))
+    manifest.close()
+
+    manifest = SyncManifest(SCOPE, str(path))
+    assert manifest.get("id1") is not None
+    manifest.close()
@@ -0,0 +1,60 @@
+import json
+import threading
+
+from youdaonote_pull.metrics import Metrics
+
+
+def test_timer_histogram():
+    metrics = Metrics()
+    for seconds in (0.005, 0.02, 0.02, 0.3, 50):
+        metrics.record("api.dir_list", seconds)
+    timer = metrics.to_dict()["timers"]["api.dir_list"]
+    assert timer["count"] == 5
+    assert timer["max"] == 50
+    assert timer["buckets"]["0.01"] == 1
+    assert timer["buckets"]["0.05"] == 2
+    assert timer["buckets"]["inf"] == 1
+    assert timer["p50"] == 0.05
+    assert timer["p95"] == 50
+
+    with metrics.timer("convert.xml"):
+        pass
+    assert metrics.to_dict()["timers"]["convert.xml"]["count"] == 1
+
+
+def test_counters_thread_safe():
+    metrics = Metrics()
+
+    def work():
+        for _ in range(1000):
+            metrics.incr("api.requests")
+            metrics.incr("bytes.downloaded", 1024)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert metrics.to_dict()["counters"] == {
+        "api.requests": 4000,
+        "bytes.downloaded": 4096000,
+    }
+
+
+def test_summary_and_export(tmp_path):
+    metrics = Metrics()
+    metrics.record("api.note_download", 0.2)
+    metrics.incr("files.skipped", 3)
+    metrics.incr("bytes.downloaded", 2 * 1024 * 1024)
+    lines = metrics.summary()
+    assert lines[0].startswith("api.note_download：1 次")
+    assert "bytes.downloaded：2.00 MB" in lines
+    assert "files.skipped：3" in lines
+
+    path = tmp_path / "metrics.json"
+    metrics.export_json(str(path))
+    data = json.loads(path.read_text(encoding="utf-8"))
+    assert data["counters"]["files.skipped"] == 3
+
+    metrics.reset()
+    assert metrics.summary() == []
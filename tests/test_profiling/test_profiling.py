@@ -0,0 +1,43 @@
+import pstats
+import re
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+
+from youdaonote_pull.profiling import OTHER_CATEGORY, _category, profile_run
+
+
+def parse_xml():
+    for _ in range(200):
+        ET.fromstring("<note><para>text</para></note>")
+
+
+def replace_links():
+    pattern = re.compile(r"!\[.*?\]\((.*?note\.youdao\.com.*?)\)")
+    for _ in range(200):
+        pattern.sub("images/a.png", "![](https://note.youdao.com/a.png)")
+
+
+def test_profile_run_covers_worker_threads(tmp_path):
+    with profile_run(top=5, log_dir=str(tmp_path)) as prefix:
+        replace_links()
+        # 线程池中的线程同样被分析
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            executor.submit(parse_xml).result()
+
+    stats = pstats.Stats(f"{prefix}.prof")
+    func_names = {func_name for _, _, func_name in stats.stats}
+    assert "parse_xml" in func_names
+    assert "replace_links" in func_names
+
+    report = open(f"{prefix}.txt", encoding="utf-8").read()
+    assert "ElementTree（XML 解析）" in report
+    assert "正则（链接替换等）" in report
+
+
+def test_category():
+    assert _category("~", "<method 'recv_into' of '_socket.socket' objects>") == "网络"
+    assert (
+        _category("/lib/markdownify/__init__.py", "convert")
+        == "markdownify（HTML 转换）"
+    )
+    assert _category("core.py", "_pull_file") == OTHER_CATEGORY
@@ -0,0 +1,74 @@
+import logging
+
+import pytest
+
+from youdaonote_pull.config import CONFIG
+from youdaonote_pull.core import YoudaoNotePull
+from youdaonote_pull.progress import MB, Progress, format_seconds
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_progress_rate_and_eta():
+    clock = FakeClock()
+    progress = Progress(interval=3600, clock=clock)
+    for size in (MB, MB, 2 * MB):
+        progress.add(size)
+    assert progress.eta() is None
+
+    progress.start()
+    clock.now += 10
+    progress.advance(MB)
+    # 10 秒完成 1 MB，剩余 3 MB
+    assert progress.eta() == pytest.approx(30)
+    line = progress.format()
+    assert "1/3 篇（33%）" in line
+    assert "1.0/4.0 MB" in line
+    assert "0.10 MB/s" in line
+    assert "剩余约 30 秒" in line
+    progress.stop()
+
+
+def test_progress_eta_without_sizes():
+    clock = FakeClock()
+    progress = Progress(clock=clock)
+    for _ in range(4):
+        progress.add(0)
+    progress._start_time = clock.now
+    clock.now += 2
+    progress.advance(0)
+    # 没有大小信息时按篇数估计
+    assert progress.eta() == pytest.approx(6)
+
+
+def test_format_seconds():
+    assert format_seconds(5) == "5 秒"
+    assert format_seconds(80) == "1 分 20 秒"
+    assert format_seconds(3725) == "1 小时 2 分 5 秒"
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_pull_with_progress(tmp_path, monkeypatch, caplog, fake_session, max_workers):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(CONFIG, "progress", True)
+    monkeypatch.setattr(CONFIG, "max_workers", max_workers)
+    tree = {"0.md": b"# 0", "1.md": b"# 1", "sub": {"0.md": b"# 0", "1.md": b"# 1"}}
+    session = fake_session(tree)
+    pull = YoudaoNotePull(session=session, local_dir="notes")
+
+    with caplog.at_level(logging.INFO):
+        pull.pull_recursively()
+
+    # 扫描结果直接作为下载任务，每个目录只请求一次
+    assert sorted(session.listed) == ["root", "sub"]
+    assert (tmp_path / "notes" / "sub" / "1.md").read_text() == "# 1"
+    assert pull.progress.total_files == pull.progress.done_files == 4
+    assert pull.progress.done_bytes == 12
+    assert "共 4 个文件需要检查" in caplog.text
+    assert "4/4 篇（100%）" in caplog.text
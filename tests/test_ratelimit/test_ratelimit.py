@@ -0,0 +1,79 @@
+import pytest
+
+from youdaonote_pull.ratelimit import (
+    THROTTLED_RATE,
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryPolicy,
+    TokenBucket,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_limits_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(2, clock=clock)
+    # 桶中初始有 2 个令牌，之后每个令牌需等待 0.5 秒
+    assert [bucket.reserve() for _ in range(4)] == [0, 0, 0.5, 1.0]
+    clock.now = 2.0
+    assert bucket.reserve() == 0
+
+
+def test_token_bucket_adapts_to_throttling():
+    clock = FakeClock()
+    bucket = TokenBucket(8, clock=clock)
+    bucket.throttle()
+    bucket.throttle()
+    assert bucket.rate == 2
+    for _ in range(100):
+        bucket.recover()
+    assert bucket.rate == 8
+
+    # 不限速时被限流才开始限速，恢复后不再限速
+    unlimited = TokenBucket(0, clock=clock)
+    assert unlimited.reserve() == 0
+    unlimited.throttle()
+    assert unlimited.rate == THROTTLED_RATE
+    for _ in range(100):
+        unlimited.recover()
+    assert unlimited.rate == 0
+
+
+def test_circuit_breaker_opens_and_gives_up():
+    clock = FakeClock()
+    breaker = CircuitBreaker(threshold=3, cooldown=10, max_trips=2, clock=clock)
+    for _ in range(3):
+        breaker.record_failure()
+    assert breaker.wait_time() == 10
+    clock.now = 10
+    assert breaker.wait_time() == 0
+
+    # 恢复后再次连续失败，暂停时间加倍
+    for _ in range(3):
+        breaker.record_failure()
+    assert breaker.wait_time() == 20
+    for _ in range(3):
+        breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        breaker.wait_time()
+
+    breaker.record_success()
+    assert breaker.trips == 0
+
+
+def test_retry_policy():
+    policy = RetryPolicy(max_retries=2, backoff=1)
+    assert policy.on_response(0, 200) is None
+    assert 0 <= policy.on_response(0, 503) <= 1
+    assert 0 <= policy.on_response(1, 429) <= 2
+    # Retry-After 优先
+    assert policy.on_response(1, 429, "5") == 5
+    assert policy.on_response(2, 503) is None
+    assert policy.on_error(2) is None
@@ -0,0 +1,34 @@
+import os
+import subprocess
+import sys
+
+import youdaonote_pull
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(youdaonote_pull.__file__)))
+
+
+def run_python(*args, cwd):
+    env = dict(os.environ, PYTHONPATH=SRC_DIR)
+    return subprocess.run(
+        [sys.executable, *args], cwd=cwd, env=env, capture_output=True, text=True
+    )
+
+
+def test_import_has_no_side_effects(tmp_path):
+    code = (
+        "import sys, youdaonote_pull.cli\n"
+        "heavy = {'requests', 'asyncio', 'mashumaro', 'rtoml', 'win32_setctime'}\n"
+        "print(sorted(heavy & set(sys.modules)))"
+    )
+    proc = run_python("-c", code, cwd=tmp_path)
+    assert proc.returncode == 0, proc.stderr
+    assert proc.stdout.strip() == "[]"
+    # 不创建 config/、logs/，也不读取 cookies
+    assert os.listdir(tmp_path) == []
+
+
+def test_help_without_cookies(tmp_path):
+    proc = run_python("-m", "youdaonote_pull", "--help", cwd=tmp_path)
+    assert proc.returncode == 0, proc.stderr
+    assert "--max-workers" in proc.stdout
+    assert os.listdir(tmp_path) == []